@@ -9,7 +9,7 @@ from datetime import datetime, timedelta
 
 from django.conf import settings
 from django.db import connections, transaction
-from django.db.models import Q, F, Avg
+from django.db.models import Q, F
 
 import cronjobs
 import multidb
@@ -21,12 +21,13 @@ import waffle
 
 import amo
 from amo.decorators import write
-from amo.utils import chunked
+from amo.utils import chunked, update_in_bulk
 from addons import search
-from addons.models import Addon, AppSupport, FrozenAddon, Persona
+from addons.models import (Addon, AppSupport, FrozenAddon, Persona,
+                           UpdateIndexChange)
 from files.models import File
 from lib.es.utils import raise_if_reindex_in_progress
-from stats.models import ThemeUserCount, UpdateCount
+from stats.models import ThemeUserCount
 
 log = logging.getLogger('z.cron')
 task_log = logging.getLogger('z.task')
@@ -345,28 +346,45 @@ def deliver_hotness():
     b = avg(users three weeks before this week)
     hotness = (a-b) / b if a > 1000 and b > 1 else 0
     """
-    frozen = set(f.id for f in FrozenAddon.objects.all())
-    all_ids = list((Addon.objects.exclude(type=amo.ADDON_PERSONA)
-                   .exclude(type=amo.ADDON_WEBAPP)
-                   .values_list('id', flat=True)))
+    from .tasks import index_addons
+    frozen = set(FrozenAddon.objects.values_list('addon', flat=True))
     now = datetime.now()
-    one_week = now - timedelta(days=7)
-    four_weeks = now - timedelta(days=28)
-    for ids in chunked(all_ids, 300):
-        addons = Addon.objects.no_cache().filter(id__in=ids).no_transforms()
-        ids = [a.id for a in addons if a.id not in frozen]
-        qs = (UpdateCount.objects.filter(addon__in=ids)
-              .values_list('addon').annotate(Avg('count')))
-        thisweek = dict(qs.filter(date__gte=one_week))
-        threeweek = dict(qs.filter(date__range=(four_weeks, one_week)))
-        for addon in addons:
-            this, three = thisweek.get(addon.id, 0), threeweek.get(addon.id, 0)
-            if this > 1000 and three > 1:
-                addon.update(hotness=(this - three) / float(three))
-            else:
-                addon.update(hotness=0)
-        # Let the database catch its breath.
-        time.sleep(10)
+    one_week = (now - timedelta(days=7)).date()
+    four_weeks = (now - timedelta(days=28)).date()
+
+    # Both averages come out of a single pass over the last four weeks.
+    cursor = connections[multidb.get_slave()].cursor()
+    cursor.execute("""
+        SELECT addon_id,
+               AVG(CASE WHEN date >= %s THEN count END),
+               AVG(CASE WHEN date BETWEEN %s AND %s THEN count END)
+        FROM update_counts
+        WHERE date >= %s
+        GROUP BY addon_id""", [one_week, four_weeks, one_week, four_weeks])
+    averages = dict((addon, (float(this or 0), float(three or 0)))
+                    for addon, this, three in cursor.fetchall()
+                    if addon not in frozen)
+
+    # Only write the values that changed.
+    updates = {}
+    for addon, hotness in (Addon.objects.no_cache()
+                           .exclude(type=amo.ADDON_PERSONA)
+                           .exclude(type=amo.ADDON_WEBAPP)
+                           .values_list('id', 'hotness')):
+        this, three = averages.get(addon, (0, 0))
+        if this > 1000 and three > 1:
+            value = (this - three) / three
+        else:
+            value = 0
+        if value != hotness:
+            updates[addon] = {'hotness': value}
+
+    for ids in chunked(updates.keys(), 300):
+        update_in_bulk(Addon, dict((id_, updates[id_]) for id_ in ids))
+        # All our updates were sql, so invalidate and reindex manually.
+        Addon.objects.invalidate(
+            *Addon.objects.no_cache().filter(id__in=ids).no_transforms())
+        index_addons.delay(ids)
 
 
 @cronjobs.register
@@ -398,7 +416,7 @@ def recs():
     except Exception:
         log.error('Could not call ps', exc_info=True)
 
-    sim = recommend.similarity  # Locals are faster.
+    index = recommend.SimilarityIndex(addons)
     sims, start, timers = {}, [time.time()], {'calc': [], 'sql': []}
 
     def write_recs():
@@ -413,12 +431,10 @@ def recs():
         timers['sql'].append(time.time() - calc)
         start[0] = time.time()
 
-    for idx, (addon, collections) in enumerate(addons.iteritems(), 1):
-        xs = [(other, sim(collections, cs))
-              for other, cs in addons.iteritems()]
-        # Sort by similarity and keep the top N.
-        others = sorted(xs, key=operator.itemgetter(1), reverse=True)
-        sims[addon] = [(k, v) for k, v in others[:11] if k != addon]
+    for idx, addon in enumerate(addons, 1):
+        # Keep the top N by similarity.
+        others = index.most_similar(addon, 11)
+        sims[addon] = [(k, v) for k, v in others if k != addon]
 
         if idx % 50 == 0:
             write_recs()
@@ -456,7 +472,7 @@ def _group_addons(qs):
         # recommendations to exactly what's in those collections.
         cs = [c[1] for c in collections]
         if len(cs) > 3:
-            # array.array() lets us calculate similarities much faster.
+            # array.array() keeps all those ids compact in memory.
             addons[addon] = array.array('l', cs)
     # Don't generate recs for frozen add-ons.
     for addon in FrozenAddon.objects.values_list('addon', flat=True):
@@ -490,3 +506,13 @@ def reindex_addons(index=None, aliased=True, addon_type=None):
     ts = [tasks.index_addons.subtask(args=[chunk], kwargs=dict(index=index))
           for chunk in chunked(sorted(list(ids)), 150)]
     TaskSet(ts).apply_async()
+
+
+@cronjobs.register
+def cleanup_update_index_changes():
+    """
+    Remove old entries of the log the update service follows to evict its
+    cached responses; by then they have expired anyway.
+    """
+    cutoff = datetime.now() - timedelta(days=1)
+    UpdateIndexChange.objects.filter(created__lt=cutoff).delete()
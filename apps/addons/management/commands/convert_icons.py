@@ -11,7 +11,7 @@ from addons.models import Addon
 import amo
 from amo.decorators import write
 from amo.storage_utils import walk_storage
-from amo.utils import resize_image, chunked
+from amo.utils import resize_images, chunked
 
 extensions = ['.png', '.jpg', '.gif']
 sizes = amo.ADDON_ICON_SIZES
@@ -35,11 +35,14 @@ def convert(directory, delete=False):
                 print 'Icon %s is empty, ignoring.' % old
                 continue
 
+            targets = []
             for size, size_suffix in zip(sizes, size_suffixes):
                 new = '%s%s%s' % (pre, size_suffix, '.png')
                 if os.path.exists(new):
                     continue
-                resize_image(old, new, (size, size), remove_src=False)
+                targets.append((new, (size, size)))
+            if targets:
+                resize_images(old, targets, remove_src=False)
 
             if ext != '.png':
                 pks.append(os.path.basename(pre))
@@ -31,9 +31,10 @@ from access import acl
 from amo.decorators import use_master, write
 from amo.fields import DecimalCharField
 from amo.helpers import absolutify, shared_url
-from amo.utils import (attach_trans_dict, cache_ns_key, chunked, find_language,
-                       JSONEncoder, send_mail, slugify, sorted_groupby, timer,
-                       to_language, urlparams)
+from amo.utils import (attach_trans_dict, cache_ns_key, chunked,
+                       clear_trans_memo, find_language, JSONEncoder,
+                       send_mail, slugify, sorted_groupby, timer, to_language,
+                       urlparams)
 from amo.urlresolvers import get_outgoing_url, reverse
 from files.models import File
 from market.models import AddonPremium, Price
@@ -46,7 +47,7 @@ from translations.fields import (LinkifiedField, PurifiedField, save_signal,
 from translations.query import order_by_translation
 from users.models import UserForeignKey, UserProfile
 from versions.compare import version_int
-from versions.models import Version
+from versions.models import ApplicationsVersions, Version
 
 from . import query, signals
 
@@ -1453,6 +1454,7 @@ class Addon(amo.models.OnChangeMixin, amo.models.ModelBase):
             qs = Translation.objects.filter(id__in=filter(None, ids),
                                             locale=locale)
             qs.update(localized_string=None, localized_string_clean=None)
+        clear_trans_memo()
 
     def app_perf_results(self):
         """Generator of (AppVersion, [list of perf results contexts]).
@@ -2538,6 +2540,103 @@ models.signals.post_delete.connect(update_incompatible_versions,
                                    dispatch_uid='cor_update_incompatible')
 
 
+class UpdateIndexState(amo.models.ModelBase):
+    """
+    Generation counter for the in-memory index kept by the update service.
+
+    Bumped whenever data the update service looks at changes, so that the
+    services workers know to rebuild their index.
+    """
+    generation = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'update_index_state'
+
+    @classmethod
+    def bump(cls):
+        cls.objects.update(generation=models.F('generation') + 1,
+                           modified=datetime.now())
+
+
+class UpdateIndexChange(models.Model):
+    """
+    Log of add-ons whose update data changed, so that the update service can
+    evict just their cached responses. Old rows are removed by a cron.
+    """
+    # Not a foreign key: deleted add-ons are logged too.
+    addon_id = models.PositiveIntegerField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'update_index_changes'
+
+
+def update_index_addon_id(instance):
+    if isinstance(instance, Addon):
+        return instance.id
+    if isinstance(instance, Version):
+        return instance.addon_id
+    try:
+        return instance.version.addon_id
+    except ObjectDoesNotExist:
+        return None
+
+
+# The attributes of each model that the update index reads. Saving a row
+# without changing any of them leaves the index as it is.
+UPDATE_INDEX_FIELDS = {
+    Addon: ('guid', 'type', 'status', 'premium_type', 'disabled_by_user'),
+    Version: ('addon_id', 'version', 'releasenotes_id'),
+    File: ('version_id', 'platform_id', 'status', 'strict_compatibility',
+           'binary_components', 'hash', 'filename', 'datestatuschanged'),
+    ApplicationsVersions: ('application_id', 'version_id', 'min_id',
+                           'max_id'),
+    IncompatibleVersions: ('version_id', 'app_id', 'min_app_version',
+                           'max_app_version', 'min_app_version_int',
+                           'max_app_version_int'),
+}
+
+
+def update_index_values(sender, instance):
+    return tuple(instance.__dict__.get(f) for f in UPDATE_INDEX_FIELDS[sender])
+
+
+def update_index_enabled():
+    return settings.UPDATE_INDEX_ENABLED or settings.UPDATE_CACHE_ENABLED
+
+
+def snapshot_update_index(sender, instance, **kw):
+    # Loading models happens everywhere, only pay for this when it's used.
+    if update_index_enabled():
+        instance._update_index_values = update_index_values(sender,
+                                                            instance)
+
+
+def bump_update_index(sender, instance, **kw):
+    if kw.get('raw') or not update_index_enabled():
+        return
+    if kw.get('signal') is models.signals.post_save:
+        values = update_index_values(sender, instance)
+        old = getattr(instance, '_update_index_values', None)
+        instance._update_index_values = values
+        if not kw['created'] and values == old:
+            return
+    UpdateIndexState.bump()
+    addon_id = update_index_addon_id(instance)
+    if addon_id:
+        UpdateIndexChange.objects.create(addon_id=addon_id)
+
+
+for _sender in UPDATE_INDEX_FIELDS:
+    _uid = 'update_index_%s' % _sender._meta.db_table
+    models.signals.post_init.connect(snapshot_update_index, sender=_sender,
+                                     dispatch_uid=_uid)
+    models.signals.post_save.connect(bump_update_index, sender=_sender,
+                                     dispatch_uid=_uid)
+    models.signals.post_delete.connect(bump_update_index, sender=_sender,
+                                       dispatch_uid=_uid)
+
+
 # webapps.models imports addons.models to get Addon, so we need to keep the
 # Webapp import down here.
 from mkt.webapps.models import Webapp
@@ -10,7 +10,7 @@ from django.conf import settings
 import amo
 import amo.tests
 from addons import cron
-from addons.models import Addon, AppSupport
+from addons.models import Addon, AppSupport, FrozenAddon
 from django.core.management.base import CommandError
 from files.models import File, Platform
 from lib.es.utils import flag_reindexing_amo, unflag_reindexing_amo
@@ -250,6 +250,45 @@ class AvgDailyUserCountTestCase(amo.tests.TestCase):
         eq_(addon.average_daily_users, 1234)
 
 
+class TestDeliverHotness(amo.tests.TestCase):
+    fixtures = ['base/addon_3615']
+
+    def setUp(self):
+        self.addon = Addon.objects.get(pk=3615)
+        today = datetime.date.today()
+        for days, count in ((1, 3000), (3, 3000), (10, 1000), (20, 2000)):
+            UpdateCount.objects.create(
+                addon=self.addon, count=count,
+                date=today - datetime.timedelta(days=days))
+
+    @mock.patch('addons.tasks.index_addons.delay')
+    def test_hotness(self, index_addons):
+        cron.deliver_hotness()
+        eq_(Addon.objects.get(pk=3615).hotness, 1.0)
+        index_addons.assert_called_with([3615])
+
+    @mock.patch('addons.tasks.index_addons.delay')
+    def test_unchanged(self, index_addons):
+        self.addon.update(hotness=1.0)
+        index_addons.reset_mock()
+        cron.deliver_hotness()
+        assert not index_addons.called
+
+    @mock.patch('addons.tasks.index_addons.delay')
+    def test_not_enough_users(self, index_addons):
+        self.addon.update(hotness=22)
+        UpdateCount.objects.filter(count=3000).update(count=900)
+        cron.deliver_hotness()
+        eq_(Addon.objects.get(pk=3615).hotness, 0)
+
+    @mock.patch('addons.tasks.index_addons.delay')
+    def test_frozen(self, index_addons):
+        FrozenAddon.objects.create(addon=self.addon)
+        self.addon.update(hotness=22)
+        cron.deliver_hotness()
+        eq_(Addon.objects.get(pk=3615).hotness, 0)
+
+
 class TestReindex(amo.tests.ESTestCase):
 
     @classmethod
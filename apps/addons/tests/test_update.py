@@ -1,18 +1,23 @@
 # -*- coding: utf-8 -*-
+import json
 from datetime import datetime, timedelta
+from StringIO import StringIO
 from email import utils
 
+from django.conf import settings
 from django.db import connection
 
+import mock
 from nose.tools import eq_
 
 import amo
 import amo.tests
 from addons.models import (Addon, CompatOverride, CompatOverrideRange,
-                           IncompatibleVersions)
+                           IncompatibleVersions, UpdateIndexChange,
+                           UpdateIndexState)
 from applications.models import Application, AppVersion
 from files.models import File
-from services import update
+from services import update, update_index, utils as services_utils
 import settings_local
 from versions.models import ApplicationsVersions, Version
 
@@ -135,14 +140,18 @@ class TestLookup(amo.tests.TestCase):
         # Allow version to be optional.
         if args[0]:
             data['version'] = args[0]
-        up = update.Update(data)
-        up.cursor = connection.cursor()
+        up = self.make_update(data)
         assert up.is_valid()
         up.data['version_int'] = args[1]
         up.get_update()
         return (up.data['row'].get('version_id'),
                 up.data['row'].get('file_id'))
 
+    def make_update(self, data):
+        up = update.Update(data)
+        up.cursor = connection.cursor()
+        return up
+
     def change_status(self, version, status):
         version = Version.objects.get(pk=version)
         file = version.files.all()[0]
@@ -429,15 +438,19 @@ class TestDefaultToCompat(amo.tests.TestCase):
             for file in version.files.all():
                 file.update(**kw)
 
+    def make_update(self, data):
+        up = update.Update(data)
+        up.cursor = connection.cursor()
+        return up
+
     def get(self, **kw):
-        up = update.Update({
+        up = self.make_update({
             'reqVersion': 1,
             'id': self.addon.guid,
             'version': kw.get('item_version', '1.0'),
             'appID': self.app.guid,
             'appVersion': kw.get('app_version', '3.0'),
         })
-        up.cursor = connection.cursor()
         assert up.is_valid()
         up.compat_mode = kw.get('compat_mode', 'strict')
         up.get_update()
@@ -563,6 +576,127 @@ class TestDefaultToCompat(amo.tests.TestCase):
         self.check(self.expected)
 
 
+def make_indexed_update(data):
+    index = update_index.UpdateIndex().load(connection.cursor())
+    return update.Update(data, index=index)
+
+
+class TestLookupIndex(TestLookup):
+    """Same lookups as `TestLookup`, answered from the in-memory index."""
+
+    def make_update(self, data):
+        return make_indexed_update(data)
+
+
+class TestDefaultToCompatIndex(TestDefaultToCompat):
+    """Same lookups as `TestDefaultToCompat`, from the in-memory index."""
+
+    def make_update(self, data):
+        return make_indexed_update(data)
+
+
+class TestUpdateIndex(amo.tests.TestCase):
+    fixtures = ['base/addon_3615',
+                'base/platforms']
+
+    def setUp(self):
+        self.good_data = {
+            'id': '{2fa4ed95-0317-4c6a-a74c-5f3e3912c1f9}',
+            'version': '2.0.58',
+            'reqVersion': 1,
+            'appID': '{ec8030f7-c20a-464f-9b0e-13a3a9e97384}',
+            'appVersion': '3.7a1pre',
+        }
+        self.index = update_index.UpdateIndex().load(connection.cursor())
+
+    def test_no_queries(self):
+        up = update.Update(self.good_data, index=self.index)
+        with self.assertNumQueries(0):
+            assert up.get_rdf()
+        eq_(up.data['row']['file_id'], 67442)
+
+    def test_same_row(self):
+        up = update.Update(self.good_data)
+        up.cursor = connection.cursor()
+        assert up.is_valid()
+        assert up.get_update()
+        indexed = update.Update(self.good_data, index=self.index)
+        assert indexed.is_valid()
+        assert indexed.get_update()
+        eq_(indexed.data['row'], up.data['row'])
+
+    def test_guid_case_insensitive(self):
+        data = self.good_data.copy()
+        data['id'] = data['id'].upper()
+        up = update.Update(data, index=self.index)
+        assert up.is_valid()
+        eq_(up.data['id'], 3615)
+
+    def test_bad_guid(self):
+        data = self.good_data.copy()
+        data['id'] = 'garbage'
+        up = update.Update(data, index=self.index)
+        eq_(up.get_rdf(), up.get_bad_rdf())
+
+    @mock.patch.object(settings, 'UPDATE_INDEX_ENABLED', True)
+    def test_bump_generation(self):
+        state = UpdateIndexState.objects.create()
+        addon = Addon.objects.get(pk=3615)
+        addon.status = amo.STATUS_UNREVIEWED
+        addon.save()
+        eq_(UpdateIndexState.objects.get(pk=state.pk).generation, 1)
+
+    @mock.patch.object(settings, 'UPDATE_INDEX_ENABLED', True)
+    def test_bump_logs_change(self):
+        UpdateIndexState.objects.create()
+        File.objects.get(pk=67442).update(hash='sha256:abc')
+        eq_(list(UpdateIndexChange.objects.values_list('addon_id',
+                                                       flat=True)),
+            [3615])
+
+    @mock.patch.object(settings, 'UPDATE_INDEX_ENABLED', True)
+    def test_bump_only_on_index_changes(self):
+        state = UpdateIndexState.objects.create()
+        addon = Addon.objects.get(pk=3615)
+        addon.update(hotness=1.5, weekly_downloads=10)
+        File.objects.get(pk=67442).save()
+        eq_(UpdateIndexState.objects.get(pk=state.pk).generation, 0)
+        eq_(UpdateIndexChange.objects.count(), 0)
+
+        addon.update(status=amo.STATUS_UNREVIEWED)
+        eq_(UpdateIndexState.objects.get(pk=state.pk).generation, 1)
+        addon.save()
+        eq_(UpdateIndexState.objects.get(pk=state.pk).generation, 1)
+
+    @mock.patch.object(settings, 'UPDATE_INDEX_ENABLED', True)
+    def test_bump_on_delete(self):
+        state = UpdateIndexState.objects.create()
+        IncompatibleVersions.objects.create(
+            version_id=81551, app_id=amo.FIREFOX.id)
+        eq_(UpdateIndexState.objects.get(pk=state.pk).generation, 1)
+        IncompatibleVersions.objects.all().delete()
+        eq_(UpdateIndexState.objects.get(pk=state.pk).generation, 2)
+
+    def test_bump_disabled(self):
+        state = UpdateIndexState.objects.create()
+        addon = Addon.objects.get(pk=3615)
+        assert not hasattr(addon, '_update_index_values')
+        addon.update(status=amo.STATUS_UNREVIEWED)
+        eq_(UpdateIndexState.objects.get(pk=state.pk).generation, 0)
+
+    def test_loader_rebuilds_on_new_generation(self):
+        state = UpdateIndexState.objects.create()
+        loader = update_index.UpdateIndexLoader(
+            lambda: mock.Mock(cursor=connection.cursor), check_interval=0)
+        index = loader.get()
+        eq_(index.generation, 0)
+        eq_(loader.get(), index)
+
+        state.update(generation=1)
+        eq_(loader.get().generation, 1)
+        assert loader.get() is not index
+
+
 class TestResponse(amo.tests.TestCase):
     fixtures = ['base/addon_3615',
                 'base/platforms',
@@ -793,3 +927,228 @@ class TestResponse(amo.tests.TestCase):
         data['appVersion'] = '5.0.1'
         upd = self.get(data)
         eq_(upd.get_rdf(), upd.get_no_updates_rdf())
+
+
+class TestBatchUpdate(amo.tests.TestCase):
+    fixtures = ['base/addon_3615',
+                'base/platforms',
+                'base/seamonkey']
+
+    def setUp(self):
+        self.data = {
+            'reqVersion': '1',
+            'appID': '{ec8030f7-c20a-464f-9b0e-13a3a9e97384}',
+            'appVersion': '3.7a1pre',
+        }
+        self.items = [
+            {'id': '{2fa4ed95-0317-4c6a-a74c-5f3e3912c1f9}',
+             'version': '2.0.58'},
+            {'id': '{2fa4ed95-0317-4c6a-a74c-5f3e3912c1f9}',
+             'version': '2.0.58', 'appOS': amo.PLATFORM_WIN.api_name},
+            {'id': 'garbage', 'version': '1.0'},
+        ]
+
+    def get(self, items, compat_mode='strict'):
+        batch = update.BatchUpdate(self.data, items, compat_mode)
+        batch.cursor = connection.cursor()
+        return batch
+
+    def single(self, item):
+        data = dict(self.data)
+        data.update(item)
+        up = update.Update(data)
+        up.cursor = connection.cursor()
+        return up
+
+    def test_matches_single(self):
+        for compat_mode in ('strict', 'normal', 'ignore'):
+            batch = self.get(self.items, compat_mode)
+            bodies = batch.get_rdf()[1:-1]
+            eq_(len(bodies), len(self.items))
+            for item, body in zip(self.items, bodies):
+                single = self.single(item)
+                single.compat_mode = compat_mode
+                eq_(body, single.get_rdf_body())
+
+    def test_rdf(self):
+        rdf = ''.join(self.get(self.items).get_rdf())
+        assert rdf.startswith(update.rdf_header)
+        assert rdf.endswith(update.rdf_footer)
+        eq_(rdf.count('<em:updateLink>'), 2)
+
+    def test_bad_rdf(self):
+        eq_(''.join(self.get([]).get_rdf()), update.bad_rdf)
+
+    def test_num_queries(self):
+        with self.assertNumQueries(4):
+            self.get(self.items[:1]).get_rdf()
+        with self.assertNumQueries(4):
+            self.get(self.items).get_rdf()
+
+    def test_json(self):
+        result = json.loads(self.get(self.items).get_json())['addons']
+        eq_(len(result), 3)
+        eq_(result[0]['id'], self.items[0]['id'])
+        assert result[0]['updates'][0]['update_link']
+        assert result[0]['updates'][0]['update_hash'].startswith(
+            'sha256:3808b13e')
+        eq_(result[2], {'id': 'garbage', 'valid': False})
+
+    def test_full_index(self):
+        index = update_index.UpdateIndex().load(connection.cursor())
+        batch = update.BatchUpdate(self.data, self.items, index=index)
+        with self.assertNumQueries(0):
+            eq_(batch.get_rdf(), self.get(self.items).get_rdf())
+
+    def request(self, body, query=''):
+        body = json.dumps(body)
+        environ = {'REQUEST_METHOD': 'POST', 'QUERY_STRING': query,
+                   'CONTENT_LENGTH': str(len(body)),
+                   'wsgi.input': StringIO(body)}
+        start_response = mock.Mock()
+        return update.batch_application(environ, start_response), \
+            start_response
+
+    @mock.patch('services.update.BatchUpdate.load_index')
+    def test_application(self, load_index):
+        load_index.return_value = update_index.UpdateIndex().load(
+            connection.cursor())
+        body = dict(self.data, items=self.items)
+        output, start_response = self.request(body)
+        eq_(start_response.call_args[0][0], '200 OK')
+        eq_(''.join(output), ''.join(self.get(self.items).get_rdf()))
+
+        output, start_response = self.request(body, 'format=json')
+        headers = dict(start_response.call_args[0][1])
+        eq_(headers['Content-Type'], 'application/json')
+        eq_(len(json.loads(output[0])['addons']), 3)
+
+    def test_application_bad_request(self):
+        output, start_response = self.request({'items': 'nope'})
+        eq_(start_response.call_args[0][0], '400 Bad Request')
+
+        for body in (None, 1, 'items', ['items']):
+            output, start_response = self.request(body)
+            eq_(start_response.call_args[0][0], '400 Bad Request')
+
+        items = self.items[:1] * (update.MAX_BATCH_SIZE + 1)
+        output, start_response = self.request(dict(self.data, items=items))
+        eq_(start_response.call_args[0][0], '400 Bad Request')
+
+    def test_application_not_strings(self):
+        for item in ({'id': 3615, 'version': '2.0.58'},
+                     {'id': self.items[0]['id'], 'version': 2.0},
+                     {'id': self.items[0]['id'], 'version': '2.0.58',
+                      'appOS': ['WINNT']}):
+            body = dict(self.data, items=[self.items[0], item])
+            output, start_response = self.request(body)
+            eq_(start_response.call_args[0][0], '400 Bad Request')
+
+        for field, value in (('appVersion', 3.7), ('reqVersion', 1),
+                             ('appID', None)):
+            body = dict(self.data, items=self.items)
+            body[field] = value
+            output, start_response = self.request(body)
+            eq_(start_response.call_args[0][0], '400 Bad Request')
+
+
+class TestLRUCache(amo.tests.TestCase):
+
+    def setUp(self):
+        self.cache = services_utils.LRUCache(size=2, ttl=60)
+
+    def test_get_set(self):
+        eq_(self.cache.get('a'), None)
+        self.cache.set('a', 1)
+        eq_(self.cache.get('a'), 1)
+        eq_((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_evicts_least_recently_used(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        eq_(self.cache.get('b'), None)
+        eq_(self.cache.get('a'), 1)
+        eq_(len(self.cache), 2)
+
+    @mock.patch('services.utils.time')
+    def test_expires(self, time):
+        time.return_value = 100
+        self.cache.set('a', 1)
+        time.return_value = 161
+        eq_(self.cache.get('a'), None)
+        eq_(len(self.cache), 0)
+
+    def test_delete_tag(self):
+        self.cache.set('a', 1, tags=['x'])
+        self.cache.set('b', 2, tags=['y'])
+        self.cache.delete_tag('x')
+        eq_(self.cache.get('a'), None)
+        eq_(self.cache.get('b'), 2)
+        eq_(self.cache.tags, {'y': set(['b'])})
+
+
+class TestResponseCache(amo.tests.TestCase):
+    fixtures = ['base/addon_3615',
+                'base/platforms']
+
+    def setUp(self):
+        self.query = ('id={2fa4ed95-0317-4c6a-a74c-5f3e3912c1f9}'
+                      '&version=2.0.58&reqVersion=1&appVersion=3.7a1pre'
+                      '&appID={ec8030f7-c20a-464f-9b0e-13a3a9e97384}')
+        update.response_cache.clear()
+        patcher = mock.patch.object(settings_local, 'UPDATE_CACHE_ENABLED',
+                                    True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(update, 'mypool')
+        self.pool = patcher.start()
+        self.pool.connect.return_value = mock.Mock(cursor=connection.cursor)
+        self.addCleanup(patcher.stop)
+        update.change_watcher.last_id = None
+        update.change_watcher.checked = 0
+        update.change_watcher.interval = 0
+        update.change_watcher.connect = self.pool.connect
+
+    def request(self, query=None, **environ):
+        environ['QUERY_STRING'] = query or self.query
+        start_response = mock.Mock()
+        output = update.application(environ, start_response)
+        return output, start_response.call_args[0]
+
+    def test_cache_hit(self):
+        output, (status, headers) = self.request()
+        eq_(status, '200 OK')
+        eq_(update.response_cache.misses, 1)
+
+        with self.assertNumQueries(1):
+            # Only polling update_index_changes.
+            cached, (status, headers) = self.request()
+        eq_(cached, output)
+        eq_(update.response_cache.hits, 1)
+
+    def test_normalized_key(self):
+        self.request()
+        self.request(self.query.replace('{2fa4ed95', '{2FA4ED95'))
+        eq_(update.response_cache.hits, 1)
+
+    def test_evicts_changed_addons(self):
+        self.request()
+        UpdateIndexChange.objects.create(addon_id=3615)
+        self.request()
+        eq_(update.response_cache.hits, 0)
+        eq_(update.response_cache.misses, 2)
+
+    def test_etag(self):
+        output, (status, headers) = self.request()
+        etag = dict(headers)['ETag']
+        eq_(etag, update.get_etag(output[0]))
+
+        output, (status, headers) = self.request(HTTP_IF_NONE_MATCH=etag)
+        eq_(status, '304 Not Modified')
+        eq_(output, [])
+        assert 'Content-Length' not in dict(headers)
+
+        output, (status, headers) = self.request(HTTP_IF_NONE_MATCH='"x"')
+        eq_(status, '200 OK')
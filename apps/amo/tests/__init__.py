@@ -45,6 +45,7 @@ from addons.models import (Addon, Category, Persona,
                            update_search_index as addon_update_search_index)
 from addons.tasks import unindex_addons
 from amo.urlresolvers import get_url_prefix, Prefixer, reverse, set_url_prefix
+from amo.utils import clear_trans_memo
 from applications.models import Application, AppVersion
 from bandwagon.models import Collection
 from files.helpers import copyfileobj
@@ -278,6 +279,7 @@ class TestCase(MockEsMixin, RedisTest, test_utils.TestCase):
     def _pre_setup(self):
         super(TestCase, self)._pre_setup()
         cache.clear()
+        clear_trans_memo()
         # Override django-cache-machine caching.base.TIMEOUT because it's
         # computed too early, before settings_test.py is imported.
         caching.base.TIMEOUT = settings.CACHE_COUNT_TIMEOUT
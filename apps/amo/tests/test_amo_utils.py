@@ -10,10 +10,12 @@ from django.utils import translation
 
 import mock
 from nose.tools import eq_, assert_raises, raises
+from PIL import Image
 
 from amo.utils import (cache_ns_key, escape_all, find_language,
                        LocalFileStorage, no_translation, resize_image,
-                       rm_local_tmp_dir, slugify, slug_validator, to_language)
+                       resize_images, rm_local_tmp_dir, slugify,
+                       slug_validator, to_language)
 from product_details import product_details
 
 u = u'Ελληνικά'
@@ -71,6 +73,27 @@ def test_resize_transparency():
             os.remove(dest)
 
 
+@mock.patch('amo.utils.Image.open', wraps=Image.open)
+def test_resize_images(open_):
+    src = os.path.join(settings.ROOT, 'apps', 'amo', 'tests',
+                       'images', 'transparent.png')
+    expected = src.replace('.png', '-expected.png')
+    dests = [tempfile.mkstemp(dir=settings.TMP_PATH)[1] for i in range(2)]
+    try:
+        sizes = resize_images(src, zip(dests, [(32, 32), None]),
+                              remove_src=False, locally=True)
+        # The image was only decoded once.
+        eq_(open_.call_count, 1)
+        eq_(sizes, [(32, 32), Image.open(src).size])
+        with open(dests[0]) as dfh:
+            with open(expected) as efh:
+                assert dfh.read() == efh.read()
+    finally:
+        for dest in dests:
+            if os.path.exists(dest):
+                os.remove(dest)
+
+
 def test_to_language():
     tests = (('en-us', 'en-US'),
              ('en_US', 'en-US'),
@@ -4,8 +4,9 @@ from nose.tools import eq_, ok_
 
 
 import amo
-from amo.utils import attach_trans_dict
+from amo.utils import attach_trans_dict, clear_trans_memo, update_in_bulk
 from addons.models import Addon
+from translations.models import Translation
 
 
 class TestAttachTransDict(amo.tests.TestCase):
@@ -80,3 +81,39 @@ class TestAttachTransDict(amo.tests.TestCase):
                  ('es', 'Spanish 2 Name'),
                  ('fr', 'French 2 Name')]))
 
+    def test_memo(self):
+        addon = Addon.objects.get(pk=3615)
+        attach_trans_dict(Addon, [addon])
+        with self.assertNumQueries(0):
+            attach_trans_dict(Addon, [addon])
+        eq_(addon.translations[addon.name_id],
+            [('en-us', unicode(addon.name))])
+
+        # Saving a translation forgets what was loaded.
+        addon.name = 'New Name'
+        addon.save()
+        attach_trans_dict(Addon, [addon])
+        eq_(addon.translations[addon.name_id], [('en-us', 'New Name')])
+
+    def test_purified_without_clean_string(self):
+        addon = Addon.objects.get(pk=3615)
+        addon.description = u'<script>alert(42)</script>!'
+        addon.save()
+        Translation.objects.filter(id=addon.description_id).update(
+            localized_string_clean=None)
+        clear_trans_memo()
+        attach_trans_dict(Addon, [addon])
+        eq_(addon.translations[addon.description_id],
+            [('en-us', u'&lt;script&gt;alert(42)&lt;/script&gt;!')])
+
+
+class TestUpdateInBulk(amo.tests.TestCase):
+    fixtures = ['base/addon_3615']
+
+    def test_db_column(self):
+        # weekly_downloads is stored in the `weeklydownloads` column.
+        update_in_bulk(Addon, {3615: {'weekly_downloads': 42,
+                                      'hotness': 1.5}})
+        addon = Addon.objects.no_cache().get(pk=3615)
+        eq_(addon.weekly_downloads, 42)
+        eq_(addon.hotness, 1.5)
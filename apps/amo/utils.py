@@ -12,6 +12,7 @@ import os
 import random
 import re
 import shutil
+import threading
 import time
 import unicodedata
 import urllib
@@ -27,7 +28,9 @@ from django.core.cache import cache
 from django.core.files.storage import (FileSystemStorage,
                                        default_storage as storage)
 from django.core.serializers import json
+from django.core.signals import request_finished
 from django.core.validators import validate_slug, ValidationError
+from django.db import connection, models
 from django.forms.fields import Field
 from django.http import HttpRequest
 from django.template import Context, loader
@@ -42,6 +45,7 @@ import jinja2
 import pyes.exceptions as pyes
 import pytz
 from babel import Locale
+from celery.signals import task_postrun
 from cef import log_cef as _log_cef
 from django_statsd.clients import statsd
 from easy_thumbnails import processors
@@ -52,7 +56,8 @@ from PIL import Image, ImageFile, PngImagePlugin
 import amo.search
 from amo import ADDON_ICON_SIZES
 from amo.urlresolvers import linkify_with_outgoing, reverse
-from translations.models import Translation
+from translations.models import (LinkifiedTranslation, PurifiedTranslation,
+                                 Translation)
 from users.models import UserNotification
 from users.utils import UnsubscribeCode
 
@@ -338,6 +343,39 @@ def chunked(seq, n):
         yield rv
 
 
+def update_in_bulk(model, updates):
+    """
+    Updates many rows of `model` in a single UPDATE. `updates` maps primary
+    keys to a dict of the fields to set on that row.
+
+    This skips the save signals and cache invalidation, so callers have to
+    take care of those themselves.
+    """
+    if not updates:
+        return
+
+    qn = connection.ops.quote_name
+    opts = model._meta
+    pk_column = qn(opts.pk.column)
+    fields = sorted(set(f for row in updates.values() for f in row))
+    sets, params = [], []
+    for field in fields:
+        cases = []
+        for pk, row in updates.items():
+            if field in row:
+                cases.append('WHEN %s THEN %s')
+                params.extend([pk, row[field]])
+        column = qn(opts.get_field(field).column)
+        sets.append('{0} = CASE {1} {2} ELSE {0} END'.format(
+            column, pk_column, ' '.join(cases)))
+    params.extend(updates.keys())
+
+    cursor = connection.cursor()
+    cursor.execute('UPDATE %s SET %s WHERE %s IN (%s)' % (
+        qn(opts.db_table), ', '.join(sets), pk_column,
+        ', '.join(['%s'] * len(updates))), params)
+
+
 def urlencode(items):
     """A Unicode-safe URLencoder."""
     try:
@@ -500,24 +538,42 @@ def resize_image(src, dst, size=None, remove_src=True, locally=False):
     with local files it's up to you to ensure that all directories
     exist leading up to the dst filename.
     """
-    if src == dst:
-        raise Exception("src and dst can't be the same: %s" % src)
+    return resize_images(src, [(dst, size)], remove_src=remove_src,
+                         locally=locally)[0]
+
+
+def resize_images(src, targets, remove_src=True, locally=False):
+    """Resizes an image from src to each of the (dst, size) in targets.
+    Returns the width and height of each of them.
+
+    The image is only read and decoded once, however many sizes are needed.
+    See resize_image() for locally.
+    """
+    for dst, size in targets:
+        if src == dst:
+            raise Exception("src and dst can't be the same: %s" % src)
 
     open_ = open if locally else storage.open
     delete = os.unlink if locally else storage.delete
 
-    with open_(src, 'rb') as fp:
-        im = Image.open(fp)
-        im = im.convert('RGBA')
-        if size:
-            im = processors.scale_and_crop(im, size)
-    with open_(dst, 'wb') as fp:
-        im.save(fp, 'png')
+    with statsd.timer('amo.resize_image.decode'):
+        with open_(src, 'rb') as fp:
+            im = Image.open(fp)
+            im = im.convert('RGBA')
+
+    sizes = []
+    for dst, size in targets:
+        with statsd.timer('amo.resize_image.scale'):
+            resized = processors.scale_and_crop(im, size) if size else im
+        with statsd.timer('amo.resize_image.save'):
+            with open_(dst, 'wb') as fp:
+                resized.save(fp, 'png')
+        sizes.append(resized.size)
 
     if remove_src:
         delete(src)
 
-    return im.size
+    return sizes
 
 
 def remove_icons(destination):
@@ -977,26 +1033,60 @@ def smart_decode(s):
         return unicode(s, errors='replace')
 
 
+_trans_memo = threading.local()
+
+
+def clear_trans_memo(**kw):
+    """Forgets the translations `attach_trans_dict` loaded so far."""
+    _trans_memo.translations = {}
+
+
+# The memo only lives as long as the request or the task, and any change
+# to a translation clears it.
+request_finished.connect(clear_trans_memo, dispatch_uid='clear_trans_memo')
+task_postrun.connect(clear_trans_memo, dispatch_uid='clear_trans_memo')
+for _model in (Translation, PurifiedTranslation, LinkifiedTranslation):
+    for _signal in (models.signals.post_save, models.signals.post_delete):
+        _signal.connect(clear_trans_memo, sender=_model,
+                        dispatch_uid='clear_trans_memo')
+
+
 def attach_trans_dict(model, objs):
     """Put all translations into a translations dict."""
     # Get the ids of all the translations we need to fetch.
     fields = model._meta.translated_fields
-    ids = [getattr(obj, f.attname) for f in fields
-           for obj in objs if getattr(obj, f.attname, None) is not None]
+    ids = set(getattr(obj, f.attname) for f in fields
+              for obj in objs if getattr(obj, f.attname, None) is not None)
 
-    # Get translations in a dict, ids will be the keys. It's important to
+    # Fetch the (locale, string, clean string) of the translations we
+    # haven't seen yet in this request as plain tuples. It's important to
     # consume the result of sorted_groupby, which is an iterator.
-    qs = Translation.objects.filter(id__in=ids, localized_string__isnull=False)
-    all_translations = dict((k, list(v)) for k, v in
-                            sorted_groupby(qs, lambda trans: trans.id))
-
-    def get_locale_and_string(translation, new_class):
-        """Convert the translation to new_class (making PurifiedTranslations
-           and LinkifiedTranslations work) and return locale / string tuple."""
-        converted_translation = new_class()
-        converted_translation.__dict__ = translation.__dict__
-        return (converted_translation.locale.lower(),
-                unicode(converted_translation))
+    if not hasattr(_trans_memo, 'translations'):
+        clear_trans_memo()
+    all_translations = _trans_memo.translations
+    missing = ids.difference(all_translations)
+    if missing:
+        qs = (Translation.objects.filter(id__in=missing,
+                                         localized_string__isnull=False)
+              .values_list('id', 'locale', 'localized_string',
+                           'localized_string_clean'))
+        all_translations.update(dict.fromkeys(missing))
+        all_translations.update((k, [row[1:] for row in v]) for k, v in
+                                sorted_groupby(qs, operator.itemgetter(0)))
+
+    def get_locale_and_string(row, new_class):
+        """Return the locale / string tuple, the way new_class (making
+           PurifiedTranslations and LinkifiedTranslations work) shows it."""
+        locale, string, clean = row
+        if not issubclass(new_class, PurifiedTranslation):
+            return locale.lower(), string and unicode(string) or ''
+        if not clean:
+            # Only translations saved without their cleaned up HTML need
+            # the whole model, see the clean_translations command.
+            translation = new_class(locale=locale, localized_string=string)
+            translation.clean()
+            clean = translation.localized_string_clean
+        return locale.lower(), unicode(clean)
 
     # Build and attach translations for each field on each object.
     for obj in objs:
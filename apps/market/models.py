@@ -20,6 +20,7 @@ from constants.payments import (CARRIER_CHOICES, PAYMENT_METHOD_ALL,
                                 PAYMENT_METHOD_CHOICES, PROVIDER_BANGO,
                                 PROVIDER_CHOICES)
 from lib.constants import ALL_CURRENCIES
+from lib.crypto.receipt import invalidate_verified
 from mkt.constants import apps
 from mkt.constants.regions import RESTOFWORLD, REGIONS_CHOICES_ID_DICT as RID
 from stats.models import Contribution
@@ -236,6 +237,19 @@ class AddonPurchase(amo.models.ModelBase):
         return u'%s: %s' % (self.addon, self.user)
 
 
+@receiver(models.signals.post_save, sender=AddonPurchase,
+          dispatch_uid='addon_purchase_verified_receipts')
+@receiver(models.signals.post_delete, sender=AddonPurchase,
+          dispatch_uid='addon_purchase_verified_receipts')
+def purchase_changed(sender, instance, **kw):
+    """Refunds and chargebacks must not be hidden by cached verifications."""
+    if not kw.get('raw'):
+        from mkt.webapps.models import Installed  # Circular import
+        invalidate_verified(instance.addon_id, Installed.objects.filter(
+            addon=instance.addon_id, user=instance.user_id).values_list(
+                'uuid', flat=True))
+
+
 @write
 @receiver(models.signals.post_save, sender=Contribution,
           dispatch_uid='create_addon_purchase')
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import get_models
+
+from amo.utils import chunked
+from translations.fields import LinkifiedField, PurifiedField
+from translations.models import Translation
+from translations.tasks import clean_translations
+
+
+class Command(BaseCommand):
+    """
+    Stores the cleaned up HTML of the translations of every `PurifiedField`
+    and `LinkifiedField` that doesn't have it yet, so that showing them
+    never has to clean them up on the fly.
+    """
+    help = 'Store the cleaned up HTML of purified and linkified translations.'
+
+    def handle(self, *args, **kw):
+        cursor = connection.cursor()
+        seen = set()
+        for model in get_models():
+            for field in model._meta.fields:
+                if not isinstance(field, (PurifiedField, LinkifiedField)):
+                    continue
+                # Proxies share the table, and so the translations.
+                column = (model._meta.db_table, field.column)
+                if column in seen:
+                    continue
+                seen.add(column)
+
+                cursor.execute(self.missing_sql(*column))
+                ids = [row[0] for row in cursor.fetchall()]
+                linkified = isinstance(field, LinkifiedField)
+                for chunk in chunked(ids, 100):
+                    clean_translations.delay(chunk, linkified=linkified)
+                self.stdout.write('Cleaning %s translations of %s.%s.\n'
+                                  % (len(ids), model.__name__, field.name))
+
+    def missing_sql(self, table, column):
+        """The ids of the translations in `column` without cleaned HTML."""
+        qn = connection.ops.quote_name
+        return """
+            SELECT DISTINCT t.id FROM %(translations)s t
+            INNER JOIN %(table)s m ON m.%(column)s = t.id
+            WHERE (t.localized_string_clean IS NULL OR
+                   t.localized_string_clean = '') AND
+                  t.localized_string IS NOT NULL
+            ORDER BY t.id""" % {'translations': qn(Translation._meta.db_table),
+                                'table': qn(table), 'column': qn(column)}
@@ -0,0 +1,39 @@
+import logging
+
+from django.db.models import Q
+
+from celeryutils import task
+
+from amo.decorators import write
+from amo.utils import update_in_bulk
+from translations.models import (LinkifiedTranslation, PurifiedTranslation,
+                                 Translation)
+
+
+log = logging.getLogger('z.task')
+
+
+@task
+@write
+def clean_translations(ids, linkified=False, **kw):
+    """
+    Stores the cleaned up HTML of the purified (or linkified) translations
+    with `ids`, so that it isn't computed every time they're shown.
+    """
+    log.info('[%s@%s] Cleaning translations starting at id: %s...'
+             % (len(ids), clean_translations.rate_limit, ids[0]))
+    model = LinkifiedTranslation if linkified else PurifiedTranslation
+    translations = list(model.objects.no_cache()
+                        .filter(Q(localized_string_clean=None) |
+                                Q(localized_string_clean=''), id__in=ids)
+                        .exclude(localized_string=None))
+    for trans in translations:
+        # Only the cleaned up HTML is stored, the string is left as is.
+        string = trans.localized_string
+        trans.clean()
+        trans.localized_string = string
+    update_in_bulk(Translation, dict(
+        (t.autoid, {'localized_string_clean': t.localized_string_clean})
+        for t in translations))
+    # All our updates were sql, so invalidate manually.
+    Translation.objects.invalidate(*translations)
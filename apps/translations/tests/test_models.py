@@ -3,6 +3,7 @@ from contextlib import nested
 
 import django
 from django.conf import settings
+from django.core.management import call_command
 from django.db import connections, reset_queries
 from django.test.utils import override_settings
 from django.utils import translation
@@ -20,6 +21,7 @@ from translations import widgets
 from translations.query import order_by_translation
 from translations.models import (LinkifiedTranslation, PurifiedTranslation,
                                  Translation, TranslationSequence)
+from translations.tasks import clean_translations
 
 
 def ids(qs):
@@ -314,6 +316,31 @@ class TranslationTestCase(TestCase):
             'http://yyy.com</a>&lt;/i&gt;')
         eq_(m.linkified.localized_string, s)
 
+    @patch('translations.tasks.clean_translations.delay')
+    def test_clean_translations(self, delay):
+        s = '<a id=xx href="http://xxx.com">yay</a> <i>http://yyy.com</i>'
+        m = FancyModel.objects.create(purified=s, linkified=s)
+        Translation.objects.update(localized_string_clean=None)
+        delay.side_effect = clean_translations
+
+        call_command('clean_translations')
+        m = FancyModel.objects.get(id=m.id)
+        eq_(m.purified.localized_string_clean,
+            '<a href="http://xxx.com" rel="nofollow">yay</a> '
+            '<i><a href="http://yyy.com" rel="nofollow">'
+            'http://yyy.com</a></i>')
+        eq_(m.purified.localized_string, s)
+        eq_(m.linkified.localized_string_clean,
+            '<a href="http://xxx.com" rel="nofollow">yay</a> '
+            '&lt;i&gt;<a href="http://yyy.com" rel="nofollow">'
+            'http://yyy.com</a>&lt;/i&gt;')
+        eq_(m.linkified.localized_string, s)
+
+        # Showing them doesn't clean them up again.
+        with patch('translations.models.bleach.clean') as clean:
+            unicode(m.purified), unicode(m.linkified)
+        assert not clean.called
+
     def test_purified_field_str(self):
         m = FancyModel.objects.get(id=1)
         eq_(u'%s' % m.purified,
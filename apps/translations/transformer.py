@@ -14,6 +14,9 @@ no_locale_join = """LEFT OUTER JOIN translations {t}
 
 trans_fields = [f.name for f in Translation._meta.fields]
 
+# The queries built by build_query(), see get_query().
+_queries = {}
+
 
 def build_query(model, connection):
     qn = connection.ops.quote_name
@@ -61,6 +64,21 @@ def build_query(model, connection):
     return s, params
 
 
+def get_query(model, connection):
+    """
+    Returns build_query(model, connection), only building it once per model,
+    database, language and fallback locale.
+    """
+    fallback = getattr(model, 'get_fallback', None)
+    fallback = fallback() if fallback else settings.LANGUAGE_CODE
+    if isinstance(fallback, models.Field):
+        fallback = fallback.column
+    key = (model, connection.alias, translation.get_language(), fallback)
+    if key not in _queries:
+        _queries[key] = build_query(model, connection)
+    return _queries[key]
+
+
 def get_trans(items):
     if not items:
         return
@@ -70,7 +88,7 @@ def get_trans(items):
     # make sure we are re-using the same one.
     dbname = router.db_for_read(model)
     connection = connections[dbname]
-    sql, params = build_query(model, connection)
+    sql, params = get_query(model, connection)
     item_dict = dict((item.pk, item) for item in items)
     ids = ','.join(map(str, item_dict.keys()))
 
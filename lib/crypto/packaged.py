@@ -1,16 +1,22 @@
+import copy
+import hashlib
 import json
 import os
 import shutil
+import struct
 import tempfile
+import zipfile
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.storage import default_storage as storage
 
 from base64 import b64decode
 from celeryutils import task
 import commonware.log
 from django_statsd.clients import statsd
-from signing_clients.apps import JarExtractor
+from signing_clients.apps import (directory_re, file_key, JarExtractor,
+                                  Section)
 import requests
 
 import amo
@@ -18,75 +24,166 @@ from versions.models import Version
 
 log = commonware.log.getLogger('z.crypto')
 
+# How long we wait before queueing another `presign` for the same version.
+PRESIGN_QUEUED_TIMEOUT = 60 * 10
+
 
 class SigningError(Exception):
     pass
 
 
-def sign_app(src, dest, ids, reviewer=False):
-    tempname = tempfile.mktemp()
-    try:
-        return _sign_app(src, dest, ids, reviewer, tempname)
-    finally:
-        os.unlink(tempname)
+class StreamingJarExtractor(JarExtractor):
+    """
+    A `JarExtractor` that digests the entries of the archive a chunk at a
+    time, and copies their compressed data into the signed archive as is
+    rather than inflating and deflating all of them again.
+    """
+    chunk_size = 64 * 1024
+
+    def __init__(self, fileobj, ids=None, omit_signature_sections=False):
+        self.inpath = fileobj
+        self.outpath = None
+        self.ids = ids
+        self.omit_sections = omit_signature_sections
+        self._manifest = None
+        self._sig = None
+        self._digests = []
+
+        self.zin = zipfile.ZipFile(fileobj, 'r')
+        for info in sorted(self.zin.filelist, key=file_key):
+            if not directory_re.search(info.filename):
+                self._digests.append(
+                    self._section(info.filename, self._read(info)))
+        if ids:
+            self._digests.append(self._section('META-INF/ids.json', [ids]))
+
+    def _read(self, info):
+        fp = self.zin.open(info)
+        chunk = fp.read(self.chunk_size)
+        while chunk:
+            yield chunk
+            chunk = fp.read(self.chunk_size)
+
+    def _section(self, name, chunks):
+        md5, sha1 = hashlib.md5(), hashlib.sha1()
+        for chunk in chunks:
+            md5.update(chunk)
+            sha1.update(chunk)
+        digests = {'md5': md5.digest(), 'sha1': sha1.digest()}
+        return Section(name, algos=tuple(digests.keys()), digests=digests)
 
+    def _copy(self, info, zout):
+        fp = self.zin.fp
+        fp.seek(info.header_offset)
+        header = struct.unpack(zipfile.structFileHeader,
+                               fp.read(zipfile.sizeFileHeader))
+        fp.seek(header[zipfile._FH_FILENAME_LENGTH] +
+                header[zipfile._FH_EXTRA_FIELD_LENGTH], 1)
 
-def _sign_app(src, dest, ids, reviewer, tempname):
+        copied = copy.copy(info)
+        # The sizes and CRC are known, they go in the header rather than in
+        # a data descriptor after the data.
+        copied.flag_bits &= ~0x08
+        copied.header_offset = zout.fp.tell()
+        zout.fp.write(copied.FileHeader())
+
+        remaining = info.compress_size
+        while remaining:
+            chunk = fp.read(min(self.chunk_size, remaining))
+            if not chunk:
+                raise zipfile.BadZipfile('Truncated entry: %s' %
+                                         info.filename)
+            zout.fp.write(chunk)
+            remaining -= len(chunk)
+
+        zout.filelist.append(copied)
+        zout.NameToInfo[copied.filename] = copied
+
+    def make_signed(self, signature, outfile):
+        zout = zipfile.ZipFile(outfile, 'w', zipfile.ZIP_DEFLATED)
+        # zigbert.rsa has to be the first file in the archive.
+        zout.writestr('META-INF/zigbert.rsa', signature)
+        for info in self.zin.infolist():
+            self._copy(info, zout)
+        zout.writestr('META-INF/manifest.mf', str(self.manifest))
+        zout.writestr('META-INF/zigbert.sf', str(self.signatures))
+        if self.ids is not None:
+            zout.writestr('META-INF/ids.json', self.ids)
+        zout.close()
+
+
+def sign_app(src, dest, ids, reviewer=False):
     """
     Generate a manifest and signature and send signature to signing server to
     be signed.
     """
     active_endpoint = _get_endpoint(reviewer)
     timeout = settings.SIGNED_APPS_SERVER_TIMEOUT
+    omit = settings.SIGNED_APPS_OMIT_PER_FILE_SIGS
 
     if not active_endpoint:
         _no_sign(src, dest)
         return
 
-    # Extract necessary info from the archive
-    try:
-        jar = JarExtractor(
-            storage.open(src, 'r'), tempname,
-            ids,
-            omit_signature_sections=settings.SIGNED_APPS_OMIT_PER_FILE_SIGS)
-    except:
-        log.error('Archive extraction failed. Bad archive?', exc_info=True)
-        raise SigningError('Archive extraction failed. Bad archive?')
+    with storage.open(src, 'r') as srcf:
+        # Extract necessary info from the archive
+        try:
+            jar = StreamingJarExtractor(
+                srcf, ids, omit_signature_sections=omit)
+        except:
+            log.error('Archive extraction failed. Bad archive?', exc_info=True)
+            raise SigningError('Archive extraction failed. Bad archive?')
 
-    log.info('App signature contents: %s' % jar.signatures)
+        log.info('App signature contents: %s' % jar.signatures)
 
-    log.info('Calling service: %s' % active_endpoint)
-    try:
-        with statsd.timer('services.sign.app'):
-            response = requests.post(active_endpoint, timeout=timeout,
-                                     files={'file': ('zigbert.sf',
-                                                     str(jar.signatures))})
-    except requests.exceptions.HTTPError, error:
-        # Will occur when a 3xx or greater code is returned.
-        log.error('Posting to app signing failed: %s, %s' % (
-            error.response.status, error))
-        raise SigningError('Posting to app signing failed: %s, %s' % (
-            error.response.status, error))
-
-    except:
-        # Will occur when some other error occurs.
-        log.error('Posting to app signing failed', exc_info=True)
-        raise SigningError('Posting to app signing failed')
-
-    if response.status_code != 200:
-        log.error('Posting to app signing failed: %s' % response.reason)
-        raise SigningError('Posting to app signing failed: %s'
-                           % response.reason)
-
-    pkcs7 = b64decode(json.loads(response.content)['zigbert.rsa'])
+        log.info('Calling service: %s' % active_endpoint)
+        try:
+            with statsd.timer('services.sign.app'):
+                response = requests.post(active_endpoint, timeout=timeout,
+                                         files={'file': ('zigbert.sf',
+                                                         str(jar.signatures))})
+        except requests.exceptions.HTTPError, error:
+            # Will occur when a 3xx or greater code is returned.
+            log.error('Posting to app signing failed: %s, %s' % (
+                error.response.status, error))
+            raise SigningError('Posting to app signing failed: %s, %s' % (
+                error.response.status, error))
+
+        except:
+            # Will occur when some other error occurs.
+            log.error('Posting to app signing failed', exc_info=True)
+            raise SigningError('Posting to app signing failed')
+
+        if response.status_code != 200:
+            log.error('Posting to app signing failed: %s' % response.reason)
+            raise SigningError('Posting to app signing failed: %s'
+                               % response.reason)
+
+        pkcs7 = b64decode(json.loads(response.content)['zigbert.rsa'])
+        try:
+            _write_signed(jar, pkcs7, dest)
+        except:
+            log.error('App signing failed', exc_info=True)
+            raise SigningError('App signing failed')
+
+
+def _write_signed(jar, pkcs7, dest):
+    # Written next to `dest` and then moved in place, so that the signed
+    # package is never copied around and nobody downloads half of it.
+    dest_dir = os.path.dirname(dest)
+    if not os.path.exists(dest_dir):
+        os.makedirs(dest_dir)
+    fd, tempname = tempfile.mkstemp(dir=dest_dir, prefix='.signing-')
     try:
-        jar.make_signed(pkcs7)
-    except:
-        log.error('App signing failed', exc_info=True)
-        raise SigningError('App signing failed')
-    with storage.open(dest, 'w') as destf:
-        tempf = open(tempname)
-        shutil.copyfileobj(tempf, destf)
+        with os.fdopen(fd, 'wb') as fp:
+            jar.make_signed(pkcs7, fp)
+        # mkstemp() makes the file only readable by us, but the web server
+        # has to read it too to serve it.
+        os.chmod(tempname, settings.FILE_UPLOAD_PERMISSIONS or 0644)
+        os.rename(tempname, dest)
+    finally:
+        if os.path.exists(tempname):
+            os.unlink(tempname)
 
 
 def _get_endpoint(reviewer=False):
@@ -162,3 +259,26 @@ def sign(version_id, reviewer=False, resign=False, **kw):
             raise
     log.info('[Webapp:%s] Signing complete.' % app.id)
     return path
+
+
+@task(max_retries=5, default_retry_delay=60)
+def presign(version_id, **kw):
+    """
+    Signs a version ahead of its first download, retrying for a while if the
+    signing server fails.
+    """
+    try:
+        return sign(version_id)
+    except SigningError, exc:
+        presign.retry(args=[version_id], exc=exc)
+
+
+def queue_presign(version_id):
+    """
+    Queues `presign` for a version, unless it was already queued lately.
+    Returns whether it was queued.
+    """
+    if not cache.add('presign:%s' % version_id, 1, PRESIGN_QUEUED_TIMEOUT):
+        return False
+    presign.delay(version_id)
+    return True
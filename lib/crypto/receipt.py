@@ -1,12 +1,15 @@
 import json
-import urllib2
+import uuid
+from hashlib import sha256
 
 from django.conf import settings
+from django.core.cache import cache
 from django_statsd.clients import statsd
 
 import commonware.log
 
 import jwt
+import requests
 
 
 log = commonware.log.getLogger('z.crypto')
@@ -16,6 +19,20 @@ class SigningError(Exception):
     pass
 
 
+_session = None
+
+
+def get_session():
+    """
+    The `requests` session used to talk to the signing service, shared by
+    the whole process so connections are kept alive between receipts.
+    """
+    global _session
+    if _session is None:
+        _session = requests.Session()
+    return _session
+
+
 def sign(receipt):
     """
     Send the receipt to the signing service.
@@ -34,30 +51,49 @@ def sign(receipt):
     log.info('Receipt contents: %s' % receipt_json)
     headers = {'Content-Type': 'application/json'}
     data = receipt if isinstance(receipt, basestring) else receipt_json
-    request = urllib2.Request(destination, data, headers)
 
     try:
         with statsd.timer('services.sign.receipt'):
-            response = urllib2.urlopen(request, timeout=timeout)
-    except urllib2.HTTPError, error:
-        # Will occur when a 3xx or greater code is returned
-        msg = error.read().strip()
-        log.error('Posting to receipt signing failed: %s, %s'
-                  % (error.code, msg))
-        raise SigningError('Posting to receipt signing failed: %s, %s'
-                           % (error.code, msg))
+            response = get_session().post(destination, data=data,
+                                          headers=headers, timeout=timeout)
     except:
-        # Will occur when some other error occurs.
+        # Will occur when the service can't be reached or doesn't answer.
         log.error('Posting to receipt signing failed', exc_info=True)
+        statsd.incr('services.sign.receipt.error')
         raise SigningError('Posting receipt signing failed')
 
-    if response.getcode() != 200:
-        log.error('Posting to signing failed: %s'
-                  % (response.getcode()))
-        raise SigningError('Posting to signing failed: %s'
-                           % (response.getcode()))
+    if response.status_code != 200:
+        msg = response.content.strip()
+        log.error('Posting to receipt signing failed: %s, %s'
+                  % (response.status_code, msg))
+        statsd.incr('services.sign.receipt.error')
+        raise SigningError('Posting to receipt signing failed: %s, %s'
+                           % (response.status_code, msg))
+
+    return json.loads(response.content)['receipt']
+
+
+def verified_key(receipt):
+    """Cache key of the verification of `receipt`, see services.verify."""
+    return 'receipt:verified:%s' % sha256(receipt).hexdigest()
+
+
+def purchase_key(addon_id, install_uuid):
+    """
+    Cache key holding a token which changes whenever the purchase or install
+    behind the receipts of `addon_id` with the user `install_uuid` does, so
+    cached verifications can be dropped. Both come from the receipt itself,
+    so the token can be read before anything is looked up in the db.
+    """
+    return 'receipt:purchase:%s:%s' % (addon_id, install_uuid)
+
 
-    return json.loads(response.read())['receipt']
+def invalidate_verified(addon_id, install_uuids):
+    """Makes cached verifications of receipts for the installs stale."""
+    token = uuid.uuid4().hex
+    cache.set_many(dict((purchase_key(addon_id, install_uuid), token)
+                        for install_uuid in install_uuids),
+                   settings.WEBAPPS_RECEIPT_VERIFY_CACHE_TTL)
 
 
 def decode(receipt):
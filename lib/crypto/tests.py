@@ -2,17 +2,21 @@
 import json
 import os
 import shutil
+import stat
 import zipfile
+from cStringIO import StringIO
 
 from django.conf import settings  # For mocking.
 from django.core.files.storage import default_storage as storage
 
 import jwt
 import mock
+import requests
 from nose.tools import eq_, raises
+from signing_clients.apps import JarExtractor
 
 import amo.tests
-from lib.crypto import packaged
+from lib.crypto import packaged, receipt
 from lib.crypto.receipt import crack, sign, SigningError
 from mkt.webapps.models import Webapp
 from versions.models import Version
@@ -36,39 +40,50 @@ def mock_sign(version_id, reviewer=False):
     return path
 
 
-@mock.patch('lib.crypto.receipt.urllib2.urlopen')
+@mock.patch('lib.crypto.receipt.requests.Session.post')
 @mock.patch.object(settings, 'SIGNING_SERVER', 'http://localhost')
 class TestReceipt(amo.tests.TestCase):
 
-    def test_called(self, urlopen):
-        urlopen.return_value = self.get_response(200)
+    def test_called(self, post):
+        post.return_value = self.get_response(200)
         sign('my-receipt')
-        eq_(urlopen.call_args[0][0].data, 'my-receipt')
+        eq_(post.call_args[1]['data'], 'my-receipt')
 
-    def test_some_unicode(self, urlopen):
-        urlopen.return_value = self.get_response(200)
+    def test_some_unicode(self, post):
+        post.return_value = self.get_response(200)
         sign({'name': u'Вагиф Сәмәдоғлу'})
 
     def get_response(self, code):
         response = mock.Mock()
-        response.getcode = mock.Mock()
-        response.getcode.return_value = code
-        response.read.return_value = json.dumps({'receipt': ''})
+        response.status_code = code
+        response.content = json.dumps({'receipt': ''})
         return response
 
     @raises(SigningError)
-    def test_error(self, urlopen):
-        urlopen.return_value = self.get_response(403)
+    def test_error(self, post):
+        post.return_value = self.get_response(403)
         sign('x')
 
-    def test_good(self, urlopen):
-        urlopen.return_value = self.get_response(200)
+    @raises(SigningError)
+    def test_unreachable(self, post):
+        post.side_effect = requests.exceptions.ConnectionError
+        sign('x')
+
+    def test_good(self, post):
+        post.return_value = self.get_response(200)
         sign('x')
 
     @raises(SigningError)
-    def test_other(self, urlopen):
-        urlopen.return_value = self.get_response(206)
+    def test_other(self, post):
+        post.return_value = self.get_response(206)
+        sign('x')
+
+    def test_session_reused(self, post):
+        post.return_value = self.get_response(200)
         sign('x')
+        sign('y')
+        eq_(post.call_count, 2)
+        assert receipt.get_session() is receipt.get_session()
 
 
 class TestCrack(amo.tests.TestCase):
@@ -141,6 +156,19 @@ class TestPackaged(PackagedApp, amo.tests.TestCase):
         packaged.sign(self.version.pk, resign=True)
         assert sign_app.called
 
+    @mock.patch('lib.crypto.packaged.sign')
+    def test_presign_retries(self, sign):
+        sign.side_effect = packaged.SigningError
+        with mock.patch.object(packaged.presign, 'retry') as retry:
+            packaged.presign(self.version.pk)
+        eq_(retry.call_args[1]['args'], [self.version.pk])
+
+    @mock.patch('lib.crypto.packaged.presign')
+    def test_queue_presign(self, presign):
+        assert packaged.queue_presign(self.version.pk)
+        assert not packaged.queue_presign(self.version.pk)
+        presign.delay.assert_called_once_with(self.version.pk)
+
     @raises(ValueError)
     def test_server_active(self):
         with self.settings(SIGNED_APPS_SERVER_ACTIVE=True):
@@ -188,3 +216,41 @@ class TestPackaged(PackagedApp, amo.tests.TestCase):
         zf = zipfile.ZipFile(self.file.signed_file_path, mode='r')
         ids_data = zf.read('META-INF/ids.json')
         eq_(sorted(json.loads(ids_data).keys()), ['id', 'version'])
+
+    @mock.patch.object(packaged, '_get_endpoint', lambda _: '/fake/url/')
+    @mock.patch('requests.post')
+    def test_signed_file_readable(self, post):
+        post().status_code = 200
+        post().content = '{"zigbert.rsa": ""}'
+        packaged.sign(self.version.pk)
+        mode = os.stat(self.file.signed_file_path).st_mode
+        eq_(stat.S_IMODE(mode), 0644)
+
+
+class TestStreamingJarExtractor(amo.tests.TestCase, amo.tests.AMOPaths):
+
+    def setUp(self):
+        self.path = self.packaged_app_path('mozball.zip')
+        self.ids = json.dumps({'id': 'some-guid', 'version': 1})
+        self.jar = packaged.StreamingJarExtractor(
+            open(self.path), self.ids, omit_signature_sections=True)
+
+    def test_same_signatures(self):
+        jar = JarExtractor(open(self.path), None, self.ids,
+                           omit_signature_sections=True)
+        eq_(str(self.jar.manifest), str(jar.manifest))
+        eq_(str(self.jar.signatures), str(jar.signatures))
+
+    def test_make_signed(self):
+        signed = StringIO()
+        self.jar.make_signed('signature', signed)
+        zf = zipfile.ZipFile(signed)
+        src = zipfile.ZipFile(self.path)
+        eq_(zf.testzip(), None)
+        eq_(zf.namelist()[0], 'META-INF/zigbert.rsa')
+        eq_(zf.read('META-INF/zigbert.rsa'), 'signature')
+        eq_(zf.read('META-INF/ids.json'), self.ids)
+        eq_(zf.read('META-INF/zigbert.sf'), str(self.jar.signatures))
+        for info in src.infolist():
+            eq_(zf.getinfo(info.filename).compress_size, info.compress_size)
+            eq_(zf.read(info.filename), src.read(info.filename))
@@ -13,16 +13,18 @@ import time
 from optparse import make_option
 
 import pyelasticsearch
-from celery import task
+from celery import chain, chord, task
 
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 
 from amo.utils import chunked, timestamp_index
 from addons.models import Webapp  # To avoid circular import.
+from lib.es.models import Reindexing, ReindexingChunk
 from lib.es.utils import (flag_reindexing_mkt, is_reindexing_mkt,
                           unflag_reindexing_mkt)
 
+from mkt.search.utils import invalidate_search_cache
 from mkt.webapps.models import WebappIndexer
 
 
@@ -49,6 +51,10 @@ ES = pyelasticsearch.ElasticSearch(ES_URL)
 job = 'lib.es.management.commands.reindex_mkt.run_indexing'
 time_limits = settings.CELERY_TIME_LIMITS[job]
 
+# Our ES doc sizes are about 5k in size. Chunking by 100 sends ~500kb of data
+# to ES at a time.
+CHUNK_SIZE = 100
+
 
 @task
 def delete_index(old_index):
@@ -92,34 +98,52 @@ def index_webapp(ids, **kw):
     qs = Webapp.indexing_transformer(Webapp.with_deleted.no_cache()
                                      .filter(id__in=ids))
 
-    docs = []
-    for obj in qs:
-        try:
-            docs.append(WebappIndexer.extract_document(obj.id, obj=obj))
-        except Exception as e:
-            sys.stdout.write('Failed to index obj: {0}. {1}'.format(obj.id, e))
+    try:
+        docs = WebappIndexer.extract_documents(ids, objs=qs)
+    except Exception:
+        # Go through the apps one by one to skip the ones that fail.
+        docs = []
+        for obj in qs:
+            try:
+                docs.append(WebappIndexer.extract_document(obj.id, obj=obj))
+            except Exception as e:
+                sys.stdout.write(
+                    'Failed to index obj: {0}. {1}'.format(obj.id, e))
 
     WebappIndexer.bulk_index(docs, es=ES, index=index)
 
 
+# The chord waits on the results of the chunks, so they can't be ignored.
+@task(acks_late=True, ignore_result=False)
+def index_chunk(ids, index):
+    """Index a chunk of apps, and remember it's done in case we resume."""
+    index_webapp(ids, index=index)
+    ReindexingChunk.objects.record(index, ids)
+
+
 @task(time_limit=time_limits['hard'], soft_time_limit=time_limits['soft'])
-def run_indexing(index):
+def run_indexing(index, callback=None):
     """Index the objects.
 
     - index: name of the index
+    - callback: if given, the chunks are indexed in parallel and `callback`
+      is run once they are all done.
 
-    Note: Our ES doc sizes are about 5k in size. Chunking by 100 sends ~500kb
-    of data to ES at a time.
-
-    TODO: Use celery chords here to parallelize these indexing chunks. This
-          requires celery 3 (bug 825938).
+    Chunks already indexed by an earlier, interrupted run are skipped.
 
     """
     sys.stdout.write('Indexing apps into index: %s' % index)
 
-    qs = WebappIndexer.get_indexable()
-    for chunk in chunked(list(qs), 100):
-        index_webapp(chunk, index=index)
+    ids = ReindexingChunk.objects.remaining(
+        index, list(WebappIndexer.get_indexable()))
+    chunks = list(chunked(ids, CHUNK_SIZE))
+    if callback is None:
+        for chunk in chunks:
+            index_chunk(chunk, index)
+    elif chunks:
+        chord([index_chunk.si(chunk, index) for chunk in chunks])(callback)
+    else:
+        callback.apply_async()
 
 
 @task
@@ -146,7 +170,8 @@ def update_alias(new_index, old_index, alias, settings):
 
         1. Optimize (which also does a refresh and a flush by default).
         2. Update settings to reset number of replicas.
-        3. Point the alias to this new index.
+        3. Point the alias to this new index, and drop the search results
+           cached for the old one.
 
     """
     sys.stdout.write('Optimizing, updating settings and aliases.')
@@ -166,6 +191,7 @@ def update_alias(new_index, old_index, alias, settings):
             {'remove': {'index': old_index, 'alias': alias}}
         )
     ES.update_aliases(dict(actions=actions))
+    invalidate_search_cache()
 
 
 @task
@@ -185,6 +211,13 @@ class Command(BaseCommand):
                     help=('Bypass the database flag that says '
                           'another indexation is ongoing'),
                     default=False),
+        make_option('--parallel', action='store_true',
+                    help='Index chunks of apps in parallel on the workers',
+                    default=False),
+        make_option('--resume', action='store_true',
+                    help=('Resume the ongoing indexation, skipping the '
+                          'chunks already indexed'),
+                    default=False),
     )
 
     def handle(self, *args, **kwargs):
@@ -199,21 +232,31 @@ class Command(BaseCommand):
 
         force = kwargs.get('force', False)
         prefix = kwargs.get('prefix', '')
+        parallel = kwargs.get('parallel', False)
+        resume = kwargs.get('resume', False)
 
-        if is_reindexing_mkt() and not force:
-            raise CommandError('Indexation already occuring - use --force to '
-                               'bypass')
-        elif force:
-            unflag_database()
+        if resume:
+            try:
+                reindexing = Reindexing.objects.get(site='mkt')
+            except Reindexing.DoesNotExist:
+                raise CommandError('No indexation to resume')
+            old_index = reindexing.old_index
+            new_index = reindexing.new_index
+        else:
+            if is_reindexing_mkt() and not force:
+                raise CommandError('Indexation already occuring - use --force '
+                                   'to bypass')
+            elif force:
+                unflag_database()
 
-        # The list of indexes that is currently aliased by `ALIAS`.
-        try:
-            aliases = ES.aliases(ALIAS).keys()
-        except pyelasticsearch.exceptions.ElasticHttpNotFoundError:
-            aliases = []
-        old_index = aliases[0] if aliases else None
-        # Create a new index, using the index name with a timestamp.
-        new_index = timestamp_index(prefix + ALIAS)
+            # The list of indexes that is currently aliased by `ALIAS`.
+            try:
+                aliases = ES.aliases(ALIAS).keys()
+            except pyelasticsearch.exceptions.ElasticHttpNotFoundError:
+                aliases = []
+            old_index = aliases[0] if aliases else None
+            # Create a new index, using the index name with a timestamp.
+            new_index = timestamp_index(prefix + ALIAS)
 
         # See how the index is currently configured.
         if old_index:
@@ -229,41 +272,48 @@ class Command(BaseCommand):
                              settings.ES_DEFAULT_NUM_REPLICAS)
         num_shards = s.get('number_of_shards', settings.ES_DEFAULT_NUM_SHARDS)
 
-        # Flag the database.
-        chain = flag_database.si(new_index, old_index, ALIAS)
-
-        # Create the index and mapping.
-        #
-        # Note: We set num_replicas=0 here to decrease load while re-indexing.
-        # In a later step we increase it which results in a more efficient bulk
-        # copy in Elasticsearch.
-        # For ES < 0.90 we manually enable compression.
-        chain |= create_index.si(new_index, ALIAS, {
-            'analysis': WebappIndexer.get_analysis(),
-            'number_of_replicas': 0, 'number_of_shards': num_shards,
-            'store.compress.tv': True, 'store.compress.stored': True,
-            'refresh_interval': '-1'})
-
-        # Index all the things!
-        chain |= run_indexing.si(new_index)
+        tasks = []
+        if not resume:
+            # Flag the database.
+            tasks.append(flag_database.si(new_index, old_index, ALIAS))
+
+            # Create the index and mapping.
+            #
+            # Note: We set num_replicas=0 here to decrease load while
+            # re-indexing. In a later step we increase it which results in a
+            # more efficient bulk copy in Elasticsearch.
+            # For ES < 0.90 we manually enable compression.
+            tasks.append(create_index.si(new_index, ALIAS, {
+                'analysis': WebappIndexer.get_analysis(),
+                'number_of_replicas': 0, 'number_of_shards': num_shards,
+                'store.compress.tv': True, 'store.compress.stored': True,
+                'refresh_interval': '-1'}))
 
         # After indexing we optimize the index, adjust settings, and point the
         # alias to the new index.
-        chain |= update_alias.si(new_index, old_index, ALIAS, {
-            'number_of_replicas': num_replicas, 'refresh_interval': '5s'})
+        finish = [update_alias.si(new_index, old_index, ALIAS, {
+            'number_of_replicas': num_replicas, 'refresh_interval': '5s'})]
 
         # Unflag the database.
-        chain |= unflag_database.si()
+        finish.append(unflag_database.si())
 
         # Delete the old index, if any.
         if old_index:
-            chain |= delete_index.si(old_index)
+            finish.append(delete_index.si(old_index))
 
-        chain |= output_summary.si()
+        finish.append(output_summary.si())
+
+        # Index all the things! In parallel, the rest of the tasks can only
+        # run once every chunk is done, so they are chained after the chord.
+        if parallel:
+            tasks.append(run_indexing.si(new_index, callback=chain(*finish)))
+        else:
+            tasks.append(run_indexing.si(new_index))
+            tasks.extend(finish)
 
         self.stdout.write('\nNew index and indexing tasks all queued up.\n')
         os.environ['FORCE_INDEXING'] = '1'
         try:
-            chain.apply_async()
+            chain(*tasks).apply_async()
         finally:
             del os.environ['FORCE_INDEXING']
@@ -25,7 +25,11 @@ class ReindexingManager(models.Manager):
 
     def _unflag_reindexing(self, site):
         """Unflag the database for a reindex on the given site."""
-        self.filter(site=site).delete()
+        reindexing = self.filter(site=site)
+        ReindexingChunk.objects.filter(
+            index__in=list(reindexing.values_list('new_index', flat=True))
+        ).delete()
+        reindexing.delete()
 
     def unflag_reindexing_amo(self):
         """Unflag the database for an AMO reindex."""
@@ -77,3 +81,30 @@ class Reindexing(models.Model):
 
     class Meta:
         db_table = 'zadmin_reindexing'
+
+
+class ReindexingChunkManager(models.Manager):
+    """Keeps track of the chunks of objects indexed during a reindex."""
+
+    def record(self, index, ids):
+        """Record that the objects in `ids` are now in `index`."""
+        return self.create(index=index, first_id=min(ids), last_id=max(ids))
+
+    def remaining(self, index, ids):
+        """Return the ids not in any chunk already indexed in `index`."""
+        done = list(self.filter(index=index)
+                    .values_list('first_id', 'last_id'))
+        return [id_ for id_ in ids
+                if not any(first <= id_ <= last for first, last in done)]
+
+
+class ReindexingChunk(models.Model):
+    index = models.CharField(max_length=255, db_index=True)
+    first_id = models.PositiveIntegerField()
+    last_id = models.PositiveIntegerField()
+    created = models.DateTimeField(default=timezone.now)
+
+    objects = ReindexingChunkManager()
+
+    class Meta:
+        db_table = 'zadmin_reindexing_chunks'
@@ -2,7 +2,7 @@ import mock
 from nose.tools import eq_
 
 import amo.tests
-from lib.es.models import Reindexing
+from lib.es.models import Reindexing, ReindexingChunk
 
 
 class TestReindexManager(amo.tests.TestCase):
@@ -102,3 +102,27 @@ class TestReindexManager(amo.tests.TestCase):
 
         # Doesn't clash on other sites.
         assert Reindexing.objects.get_indices('other') == ['other']
+
+
+class TestReindexingChunkManager(amo.tests.TestCase):
+
+    def test_remaining(self):
+        ids = range(1, 11)
+        eq_(ReindexingChunk.objects.remaining('foo', ids), ids)
+
+        ReindexingChunk.objects.record('foo', [3, 2, 4])
+        ReindexingChunk.objects.record('foo', [8, 7])
+        eq_(ReindexingChunk.objects.remaining('foo', ids), [1, 5, 6, 9, 10])
+
+        # Chunks of another index don't count.
+        eq_(ReindexingChunk.objects.remaining('bar', ids), ids)
+
+    def test_unflag_reindexing_clears_chunks(self):
+        Reindexing.objects.create(site='foo', new_index='bar', old_index='baz',
+                                  alias='quux')
+        ReindexingChunk.objects.record('bar', [1, 2])
+        ReindexingChunk.objects.record('other', [1, 2])
+
+        Reindexing.objects._unflag_reindexing('foo')
+        eq_(list(ReindexingChunk.objects.values_list('index', flat=True)),
+            ['other'])
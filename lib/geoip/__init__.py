@@ -1,4 +1,9 @@
+import collections
 import logging
+import mmap
+import socket
+import struct
+import threading
 
 import requests
 from django_statsd.clients import statsd
@@ -25,22 +30,133 @@ def is_public(ip):
     return True
 
 
+# A country database starts with this header, followed by the number of
+# ranges in it, then the sorted first addresses of every range, their last
+# addresses and finally their two-letter country codes.
+DB_MAGIC = 'ZGEO'
+DB_HEADER = struct.Struct('!4sI')
+
+
+def ip_to_int(ip):
+    """Returns an IPv4 address as an integer, or None if it isn't one."""
+    try:
+        return struct.unpack('!I', socket.inet_aton(ip))[0]
+    except (socket.error, TypeError):
+        return None
+
+
+def build_database(ranges, path):
+    """
+    Writes a country database to `path` from `ranges`, an iterable of
+    `(first, last, country_code)` tuples where `first` and `last` are the
+    integer addresses a range starts and ends with.
+    """
+    ranges = sorted((int(first), int(last), code.upper())
+                    for first, last, code in ranges)
+    with open(path, 'wb') as fp:
+        fp.write(DB_HEADER.pack(DB_MAGIC, len(ranges)))
+        for index in (0, 1):
+            fp.write(struct.pack('!%sI' % len(ranges),
+                                 *[r[index] for r in ranges]))
+        fp.write(''.join(r[2][:2].ljust(2) for r in ranges))
+
+
+class CountryDatabase(object):
+    """
+    Resolves IPv4 addresses to country codes from a database made by
+    `build_database`.
+
+    The file is memory-mapped and binary searched in place, and the results
+    of the last `cache_size` lookups are kept around.
+    """
+
+    def __init__(self, path, cache_size=10000):
+        with open(path, 'rb') as fp:
+            self.data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.size = DB_HEADER.unpack_from(self.data)
+        if magic != DB_MAGIC:
+            raise ValueError('%s is not a country database.' % path)
+        self.starts = DB_HEADER.size
+        self.ends = self.starts + 4 * self.size
+        self.codes = self.ends + 4 * self.size
+
+        self.cache_size = cache_size
+        self.cache = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def _int_at(self, offset, index):
+        return struct.unpack_from('!I', self.data, offset + 4 * index)[0]
+
+    def find(self, address):
+        """Returns the country code for the integer `address`, or None."""
+        lo, hi = 0, self.size
+        # Find the last range starting at or before the address.
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._int_at(self.starts, mid) <= address:
+                lo = mid + 1
+            else:
+                hi = mid
+        index = lo - 1
+        if index < 0 or self._int_at(self.ends, index) < address:
+            return None
+        offset = self.codes + 2 * index
+        return self.data[offset:offset + 2].strip() or None
+
+    def lookup(self, ip):
+        """Returns the lowercased country code of `ip`, or None."""
+        with self.lock:
+            if ip in self.cache:
+                # Move it to the end, as the most recently used.
+                code = self.cache[ip] = self.cache.pop(ip)
+                return code
+
+        address = ip_to_int(ip)
+        code = self.find(address) if address is not None else None
+        code = code.lower() if code else None
+
+        with self.lock:
+            self.cache[ip] = code
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return code
+
+
 class GeoIP:
-    """Call to geodude server to resolve an IP to Geo Info block."""
+    """
+    Resolve an IP to Geo Info block, from a local country database when
+    `GEOIP_DB_PATH` is set or by calling the geodude server otherwise.
+    """
 
     def __init__(self, settings):
         self.timeout = float(getattr(settings, 'GEOIP_DEFAULT_TIMEOUT', .2))
         self.url = getattr(settings, 'GEOIP_URL', '')
         self.default_val = getattr(settings, 'GEOIP_DEFAULT_VAL',
                                    regions.RESTOFWORLD.slug).lower()
+        self.db = None
+        db_path = getattr(settings, 'GEOIP_DB_PATH', '')
+        if db_path:
+            try:
+                self.db = CountryDatabase(
+                    db_path, int(getattr(settings, 'GEOIP_CACHE_SIZE',
+                                         10000)))
+            except (IOError, ValueError) as e:
+                log.error('Could not load GeoIP database {0}: {1}'
+                          .format(db_path, e))
 
     def lookup(self, address):
         """Resolve an IP address to a block of geo information.
 
-        If a given address is unresolvable or the geoip server is not defined,
-        return the default as defined by the settings, or "restofworld".
+        If a given address is unresolvable or neither the geoip database nor
+        server are defined, return the default as defined by the settings, or
+        "restofworld".
 
         """
+        if self.db and ip_to_int(address) is not None and is_public(address):
+            code = self.db.lookup(address)
+            statsd.incr('z.geoip.db.%s' % ('success' if code else 'miss'))
+            return code or self.default_val
+
         if self.url and is_public(address):
             with statsd.timer('z.geoip'):
                 res = None
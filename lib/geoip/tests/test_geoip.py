@@ -1,3 +1,5 @@
+import os
+import tempfile
 from random import randint
 
 import mock
@@ -6,12 +8,14 @@ from nose.tools import eq_
 
 import amo.tests
 
-from lib.geoip import GeoIP
+from lib.geoip import build_database, CountryDatabase, GeoIP, ip_to_int
 
 
-def generate_settings(url='', default='restofworld', timeout=0.2):
+def generate_settings(url='', default='restofworld', timeout=0.2,
+                      db_path=''):
     return mock.Mock(GEOIP_URL=url, GEOIP_DEFAULT_VAL=default,
-                     GEOIP_DEFAULT_TIMEOUT=timeout)
+                     GEOIP_DEFAULT_TIMEOUT=timeout, GEOIP_DB_PATH=db_path,
+                     GEOIP_CACHE_SIZE=2)
 
 
 class GeoIPTest(amo.tests.TestCase):
@@ -86,3 +90,64 @@ class GeoIPTest(amo.tests.TestCase):
             result = geoip.lookup(ip)
             assert not mock_post.called
             eq_(result, 'restofworld')
+
+
+class TestCountryDatabase(amo.tests.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        build_database([
+            (ip_to_int('2.0.0.0'), ip_to_int('2.0.0.255'), 'BR'),
+            (ip_to_int('1.0.0.0'), ip_to_int('1.0.0.255'), 'us'),
+            (ip_to_int('3.0.0.0'), ip_to_int('3.255.255.255'), 'DE'),
+        ], self.path)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_lookup(self):
+        db = CountryDatabase(self.path)
+        eq_(db.lookup('1.0.0.0'), 'us')
+        eq_(db.lookup('1.0.0.255'), 'us')
+        eq_(db.lookup('2.0.0.12'), 'br')
+        eq_(db.lookup('3.4.5.6'), 'de')
+
+    def test_lookup_missing(self):
+        db = CountryDatabase(self.path)
+        eq_(db.lookup('0.255.255.255'), None)
+        eq_(db.lookup('2.0.1.0'), None)
+        eq_(db.lookup('4.0.0.0'), None)
+        eq_(db.lookup('not.an.ip'), None)
+
+    def test_cache(self):
+        db = CountryDatabase(self.path, cache_size=2)
+        with mock.patch.object(db, 'find', wraps=db.find) as find:
+            db.lookup('1.0.0.1')
+            db.lookup('2.0.0.1')
+            db.lookup('1.0.0.1')
+            eq_(find.call_count, 2)
+            # 2.0.0.1 is the least recently used, so it goes first.
+            db.lookup('3.0.0.1')
+            eq_(db.cache.keys(), ['1.0.0.1', '3.0.0.1'])
+
+    def test_not_a_database(self):
+        with open(self.path, 'wb') as fp:
+            fp.write('nope' * 4)
+        with self.assertRaises(ValueError):
+            CountryDatabase(self.path)
+
+    @mock.patch('requests.post')
+    def test_geoip_uses_database(self, mock_post):
+        geoip = GeoIP(generate_settings(url='localhost', db_path=self.path))
+        eq_(geoip.lookup('2.0.0.1'), 'br')
+        eq_(geoip.lookup('4.0.0.1'), 'restofworld')
+        eq_(geoip.lookup('10.0.0.1'), 'restofworld')
+        assert not mock_post.called
+
+    def test_geoip_bad_database(self):
+        os.remove(self.path)
+        geoip = GeoIP(generate_settings(db_path=self.path))
+        eq_(geoip.db, None)
+        eq_(geoip.lookup('2.0.0.1'), 'restofworld')
+        open(self.path, 'w').close()
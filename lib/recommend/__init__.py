@@ -4,6 +4,9 @@ items.
 
 Check the function docs, they expect specific preconditions.
 """
+import collections
+import heapq
+import itertools
 
 # Placeholders for the fast functions implemented in C.
 
@@ -16,6 +19,47 @@ def similarity(xs, ys):
     return 1. / (1. + symmetric_diff_count(xs, ys))
 
 
+class SimilarityIndex(object):
+    """
+    Finds the most similar items of a dict of {key: [ids]}, as measured by
+    `similarity()`, without comparing every pair of items.
+
+    `len(set(xs).symmetric_difference(ys))` is `len(xs) + len(ys)` minus
+    twice the ids they share, so the ids shared with every other item are
+    counted through an {id: [key]} inverted index. The only other items
+    that can make the cut are the shortest ones.
+    """
+
+    def __init__(self, items):
+        self.sets = dict((key, frozenset(ids)) for key, ids in items.items())
+        # Ties are broken the way sorting all of `items` would.
+        self.order = dict((key, i) for i, key in enumerate(items))
+        self.index = collections.defaultdict(list)
+        for key in items:
+            for id_ in self.sets[key]:
+                self.index[id_].append(key)
+        self.by_length = sorted(items, key=lambda k: len(self.sets[k]))
+
+    def most_similar(self, key, n):
+        """
+        Returns the `n` [(other_key, similarity)] most similar to `key`,
+        `key` included, the same as sorting all of them by similarity.
+        """
+        shared = collections.defaultdict(int)
+        for id_ in self.sets[key]:
+            for other in self.index[id_]:
+                shared[other] += 1
+        # At least `n` items sharing nothing with `key` are in there.
+        candidates = set(shared)
+        candidates.update(itertools.islice(self.by_length, len(shared) + n))
+
+        size = len(self.sets[key])
+        scores = ((other, 1. / (1 + size + len(self.sets[other]) -
+                                2 * shared.get(other, 0)))
+                  for other in sorted(candidates, key=self.order.get))
+        return heapq.nlargest(n, scores, key=lambda x: x[1])
+
+
 try:
     from _recommend import symmetric_diff_count, similarity
 except ImportError:
@@ -31,3 +31,15 @@ def test_symmetric_diff_count():
 # The algorithm is in flux so this is minimal coverage.
 def test_similarity():
     eq_(1/2., recommend.similarity([1], [1, 2]))
+
+
+def test_most_similar():
+    items = {1: [1, 2, 3], 2: [1, 2], 3: [4], 4: [3, 4, 5], 5: [6, 7, 8, 9]}
+    index = recommend.SimilarityIndex(items)
+    for key, xs in items.items():
+        # Same as comparing with every item, ties included.
+        expected = sorted([(other, recommend.similarity(xs, ys))
+                           for other, ys in items.items()],
+                          key=lambda x: x[1], reverse=True)[:3]
+        eq_(index.most_similar(key, 3), expected)
+    eq_(index.most_similar(1, 2), [(1, 1.), (2, 1/2.)])
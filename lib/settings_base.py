@@ -103,6 +103,20 @@ SERVICES_DATABASE = {
     'HOST': '',
 }
 
+# Answer update pings from an in-memory index in each services worker rather
+# than querying SERVICES_DATABASE for every request.
+UPDATE_INDEX_ENABLED = False
+# Seconds between checks of update_index_state for a new index generation.
+UPDATE_INDEX_CHECK_INTERVAL = 30
+# Rebuild the index at least this often (in seconds), even if nothing changed.
+UPDATE_INDEX_MAX_AGE = 60 * 60
+# Cache rendered update responses in each services worker. Entries of add-ons
+# which changed are evicted every UPDATE_INDEX_CHECK_INTERVAL seconds.
+UPDATE_CACHE_ENABLED = False
+# The most responses kept per worker, and for how long (in seconds).
+UPDATE_CACHE_SIZE = 50000
+UPDATE_CACHE_TTL = 60 * 5
+
 DATABASE_ROUTERS = ('multidb.PinningMasterSlaveRouter',)
 
 # For use django-mysql-pool backend.
@@ -253,6 +267,9 @@ SIGNED_APPS_REVIEWER_SERVER = ''
 SIGNED_APPS_SERVER_TIMEOUT = 10
 # Send the more terse manifest signatures to the app signing server.
 SIGNED_APPS_OMIT_PER_FILE_SIGS = True
+# Packages are signed by the `signing` queue before anyone downloads them;
+# downloads arriving first are told to try again after this many seconds.
+SIGNED_APPS_RETRY_AFTER = 30
 
 # Absolute path to a writable directory shared by all servers. No trailing
 # slash.
@@ -1073,6 +1090,7 @@ CELERY_ROUTES = {
     'bandwagon.tasks.unindex_collections': {'queue': 'priority'},
     'lib.crypto.packaged.sign': {'queue': 'priority'},
     'mkt.inapp_pay.tasks.fetch_product_image': {'queue': 'priority'},
+    'mkt.webapps.tasks.flush_indexing_queue': {'queue': 'priority'},
     'mkt.webapps.tasks.index_webapps': {'queue': 'priority'},
     'mkt.webapps.tasks.unindex_webapps': {'queue': 'priority'},
     'stats.tasks.update_monolith_stats': {'queue': 'priority'},
@@ -1390,6 +1408,16 @@ ES_DEFAULT_NUM_REPLICAS = 2
 ES_DEFAULT_NUM_SHARDS = 5
 ES_USE_PLUGINS = False
 
+# Queue the apps changed on save and index them in bulk, at most every
+# ES_INDEXING_QUEUE_WINDOW seconds, instead of indexing each one in its own
+# task.
+ES_INDEXING_QUEUE_ENABLED = False
+ES_INDEXING_QUEUE_WINDOW = 5
+
+# How long the search API caches the results of a given query, in seconds.
+# Flipping the index alias invalidates them all. 0 disables the cache.
+ES_SEARCH_CACHE_TIMEOUT = 60
+
 # Default AMO user id to use for tasks.
 TASK_USER_ID = 4757633
 
@@ -1433,6 +1461,17 @@ WEBAPPS_RECEIPT_KEY = ''
 WEBAPPS_RECEIPT_EXPIRY_SECONDS = 60 * 60 * 24 * 182
 # Send a new receipt back when it expires.
 WEBAPPS_RECEIPT_EXPIRED_SEND = False
+# Cache receipts which passed verification, both per receipt verifier process
+# and in the shared cache, so repeat verifications skip crypto and the db.
+WEBAPPS_RECEIPT_VERIFY_CACHE = False
+# How many verifications each process keeps, and for how long (in seconds).
+WEBAPPS_RECEIPT_VERIFY_CACHE_SIZE = 10000
+WEBAPPS_RECEIPT_VERIFY_CACHE_TTL = 60 * 60
+# Threads decoding receipts in each receipt verifier process, for batches.
+WEBAPPS_RECEIPT_VERIFY_POOL_SIZE = 4
+# How long (in seconds) a receipt we signed is handed out again for the same
+# install, e.g. when the install is retried. 0 to sign a new one every time.
+WEBAPPS_RECEIPT_SIGNED_CACHE_TTL = 60
 
 CSRF_FAILURE_VIEW = 'amo.views.csrf_failure'
 
@@ -1583,6 +1622,11 @@ API_THROTTLE = True
 # Cache timeout on the /search/featured API.
 CACHE_SEARCH_FEATURED_API_TIMEOUT = 60 * 60  # 1 hour.
 
+# Cache timeout on the responses to anonymous GETs of the app, collection,
+# featured and category APIs. They are purged earlier when the objects in
+# them change, see mkt.api.cache. Set to 0 to disable the cache.
+API_ANONYMOUS_CACHE_TIMEOUT = 60 * 5  # 5 min.
+
 # Whitelist IP addresses of the allowed clients that can post email
 # through the API.
 WHITELISTED_CLIENTS_EMAIL_API = []
@@ -0,0 +1,9 @@
+CREATE TABLE `update_index_state` (
+    `id` integer AUTO_INCREMENT NOT NULL PRIMARY KEY,
+    `created` datetime NOT NULL,
+    `modified` datetime NOT NULL,
+    `generation` integer UNSIGNED NOT NULL DEFAULT 0
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+
+INSERT INTO `update_index_state` (`created`, `modified`, `generation`)
+    VALUES (NOW(), NOW(), 0);
@@ -0,0 +1,9 @@
+CREATE TABLE `zadmin_reindexing_chunks` (
+  `id` int(11) NOT NULL AUTO_INCREMENT,
+  `index` varchar(255) NOT NULL,
+  `first_id` int(11) unsigned NOT NULL,
+  `last_id` int(11) unsigned NOT NULL,
+  `created` datetime NOT NULL,
+  PRIMARY KEY (`id`),
+  KEY `zadmin_reindexing_chunks_index` (`index`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
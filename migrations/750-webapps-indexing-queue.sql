@@ -0,0 +1,5 @@
+CREATE TABLE `webapps_indexing_queue` (
+    `id` integer AUTO_INCREMENT NOT NULL PRIMARY KEY,
+    `addon_id` integer UNSIGNED NOT NULL,
+    `created` datetime NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
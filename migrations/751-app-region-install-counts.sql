@@ -0,0 +1,19 @@
+CREATE TABLE `app_region_install_counts` (
+    `id` integer AUTO_INCREMENT NOT NULL PRIMARY KEY,
+    `addon_id` integer UNSIGNED NOT NULL,
+    `region` integer UNSIGNED NOT NULL,
+    `installs` integer UNSIGNED NOT NULL,
+    UNIQUE (`addon_id`, `region`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+
+ALTER TABLE `app_region_install_counts`
+    ADD CONSTRAINT `app_region_install_counts_addon_id`
+    FOREIGN KEY (`addon_id`) REFERENCES `addons` (`id`) ON DELETE CASCADE;
+
+INSERT INTO `app_region_install_counts` (`addon_id`, `region`, `installs`)
+    SELECT `users_install`.`addon_id`, `client_data`.`region`, COUNT(*)
+    FROM `users_install`
+    INNER JOIN `client_data`
+        ON `client_data`.`id` = `users_install`.`client_data_id`
+    WHERE `client_data`.`region` IS NOT NULL
+    GROUP BY `users_install`.`addon_id`, `client_data`.`region`;
@@ -0,0 +1,13 @@
+import commonware.log
+import cronjobs
+
+from mkt.regions.utils import save_user_regions
+
+cron_log = commonware.log.getLogger('mkt.account.cron')
+
+
+@cronjobs.register
+def update_user_regions():
+    """Save the regions users were last seen in by the RegionMiddleware."""
+    count = save_user_regions()
+    cron_log.info('Updated the region of %s users.' % count)
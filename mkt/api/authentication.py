@@ -14,7 +14,7 @@ from access.middleware import ACLMiddleware
 from users.models import UserProfile
 from mkt.api.middleware import APIPinningMiddleware
 
-from mkt.api.models import Access, Token, ACCESS_TOKEN
+from mkt.api.models import get_access_token, get_consumer
 from mkt.api.oauth import OAuthServer
 
 log = commonware.log.getLogger('z.api')
@@ -64,10 +64,8 @@ class RestOAuthAuthentication(BaseAuthentication):
                 log.error(u'Cannot find APIAccess token with that key: %s'
                           % oauth.attempted_key)
                 return None
-            uid = Token.objects.filter(
-                token_type=ACCESS_TOKEN,
-                key=oauth_request.resource_owner_key).values_list(
-                    'user_id', flat=True)[0]
+            uid = get_access_token(oauth_request.resource_owner_key,
+                                   oauth_request.client_key)['user_id']
             request.amo_user = UserProfile.objects.select_related(
                 'user').get(pk=uid)
             request.user = request.amo_user.user
@@ -86,9 +84,7 @@ class RestOAuthAuthentication(BaseAuthentication):
                 log.error(u'Cannot find APIAccess token with that key: %s'
                           % oauth.attempted_key)
                 return None
-            uid = Access.objects.filter(
-                key=oauth_request.client_key).values_list(
-                    'user_id', flat=True)[0]
+            uid = get_consumer(oauth_request.client_key)['user_id']
             request.amo_user = UserProfile.objects.select_related(
                 'user').get(pk=uid)
             request.user = request.amo_user.user
@@ -109,7 +105,7 @@ class RestOAuthAuthentication(BaseAuthentication):
 
         # But you cannot have one of these roles.
         denied_groups = set(['Admins'])
-        roles = set(request.amo_user.groups.values_list('name', flat=True))
+        roles = set(g.name for g in getattr(request, 'groups', ()))
         if roles and roles.intersection(denied_groups):
             log.info(u'Attempt to use API with denied role, user: %s'
                      % request.amo_user.pk)
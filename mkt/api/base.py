@@ -11,6 +11,9 @@ from rest_framework.routers import Route, SimpleRouter
 from rest_framework.response import Response
 from rest_framework.urlpatterns import format_suffix_patterns
 
+from mkt.api.cache import (build_response, get_response, is_cacheable,
+                           response_key, store_response)
+
 
 log = commonware.log.getLogger('z.api')
 
@@ -157,6 +160,44 @@ class CORSMixin(object):
             request, response, *args, **kwargs)
 
 
+class CacheMixin(object):
+    """
+    Mixin caching the successful responses to anonymous GET requests for
+    `API_ANONYMOUS_CACHE_TIMEOUT` seconds, or until one of the tags returned
+    by `get_cache_tags()` is purged, see `mkt.api.cache`. Clients sending
+    back the ETag of a cached response get a 304.
+
+    By default responses are tagged with `cache_tag`, and `<cache_tag>:<id>`
+    for the object or each of the objects they contain.
+    """
+    cache_tag = None
+
+    def dispatch(self, request, *args, **kwargs):
+        key = None
+        if is_cacheable(request):
+            key = response_key(request)
+            entry = get_response(key)
+            if entry is not None:
+                request.CORS = getattr(self, 'cors_allowed_methods', None)
+                return build_response(request, entry)
+
+        response = super(CacheMixin, self).dispatch(request, *args, **kwargs)
+        if key and response.status_code == 200:
+            tags = self.get_cache_tags(response.data)
+            response.add_post_render_callback(
+                lambda r: store_response(key, r, tags))
+        return response
+
+    def get_cache_tags(self, data):
+        tag = self.cache_tag
+        if isinstance(data, dict) and 'objects' in data:
+            data = data['objects']
+        if isinstance(data, dict):
+            data = [data]
+        return [tag] + ['%s:%s' % (tag, obj['id']) for obj in data
+                        if isinstance(obj, dict) and 'id' in obj]
+
+
 def cors_api_view(methods):
     def decorator(f):
         @api_view(methods)
@@ -0,0 +1,118 @@
+"""
+Server-side cache for the responses to anonymous API GET requests, used by
+`mkt.api.base.CacheMixin`.
+
+Cached responses are tagged with surrogate keys like `webapp:337141` or
+`collection`, and remember the version every one of their tags had when
+they were stored. `purge_cache_tags()` gives tags a new version, which makes
+all the responses tagged with them stale at once.
+"""
+import hashlib
+import urllib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils import translation
+
+import mkt.carriers
+import mkt.regions
+
+
+RESPONSE_KEY = 'api:response:%s'
+TAG_KEY = 'api:response-tag:%s'
+
+# Headers that only make sense for the request they were sent with.
+UNCACHED_HEADERS = ('set-cookie',)
+
+
+def is_cacheable(request):
+    """
+    Whether the response to `request` can come from the cache: only GETs
+    carrying none of the credentials the API authentication classes look at.
+    """
+    return bool(settings.API_ANONYMOUS_CACHE_TIMEOUT and
+                request.method == 'GET' and
+                not request.META.get('HTTP_AUTHORIZATION') and
+                '_user' not in request.GET and
+                'oauth_token' not in request.META.get('QUERY_STRING', ''))
+
+
+def response_key(request):
+    """
+    The cache key for the response to `request`: its path and query string,
+    along with everything the middlewares figured out from the request and
+    that views look at, i.e. region, carrier, language and device.
+    """
+    query = sorted((k, v.encode('utf-8')) for k, values in
+                   request.GET.lists() for v in values)
+    devices = [d for d in ('MOBILE', 'TABLET', 'GAIA')
+               if getattr(request, d, False)]
+    parts = (request.path, urllib.urlencode(query),
+             mkt.regions.get_region().slug, mkt.carriers.get_carrier() or '',
+             translation.get_language() or '', ','.join(devices))
+    return RESPONSE_KEY % hashlib.md5(
+        u'\n'.join(map(unicode, parts)).encode('utf-8')).hexdigest()
+
+
+def tag_versions(tags):
+    """Returns the current version of each of `tags`, creating missing ones."""
+    keys = dict((TAG_KEY % tag, tag) for tag in tags)
+    versions = cache.get_many(keys.keys())
+    for key in set(keys) - set(versions):
+        # Another process may be creating the same tag, only keep one.
+        cache.add(key, uuid.uuid4().hex, 0)
+        versions[key] = cache.get(key)
+    return dict((keys[key], version) for key, version in versions.items())
+
+
+def purge_cache_tags(*tags):
+    """Makes all the cached responses tagged with any of `tags` stale."""
+    if tags:
+        cache.set_many(dict((TAG_KEY % tag, uuid.uuid4().hex)
+                            for tag in tags), 0)
+
+
+def get_response(key):
+    """Returns the entry cached under `key`, if it's still fresh."""
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    versions = cache.get_many([TAG_KEY % tag for tag in entry['tags']])
+    for tag, version in entry['tags'].items():
+        if versions.get(TAG_KEY % tag) != version:
+            return None
+    return entry
+
+
+def store_response(key, response, tags):
+    """
+    Caches the rendered `response` under `key`, tagged with `tags`, and sets
+    its ETag.
+    """
+    etag = '"%s"' % hashlib.md5(response.content).hexdigest()
+    response['ETag'] = etag
+    headers = [(name, value) for name, value in response.items()
+               if name.lower() not in UNCACHED_HEADERS]
+    cache.set(key, {'content': response.content,
+                    'status': response.status_code,
+                    'headers': headers,
+                    'etag': etag,
+                    'tags': tag_versions(tags)},
+              settings.API_ANONYMOUS_CACHE_TIMEOUT)
+
+
+def build_response(request, entry):
+    """
+    Builds the response for a cached `entry`, or a 304 if the client already
+    has it.
+    """
+    if entry['etag'] in request.META.get('HTTP_IF_NONE_MATCH', ''):
+        response = HttpResponseNotModified()
+        response['ETag'] = entry['etag']
+        return response
+    response = HttpResponse(entry['content'], status=entry['status'])
+    for name, value in entry['headers']:
+        response[name] = value
+    return response
@@ -1,7 +1,10 @@
+import hashlib
 import os
 import time
 
+from django.core.cache import cache
 from django.db import models
+from django.dispatch import receiver
 
 from aesfield.field import AESField
 
@@ -12,6 +15,10 @@ REQUEST_TOKEN = 0
 ACCESS_TOKEN = 1
 TOKEN_TYPES = ((REQUEST_TOKEN, u'Request'), (ACCESS_TOKEN, u'Access'))
 
+# How long the credentials looked up for OAuth requests are kept in the
+# cache. They are dropped as soon as they change or are revoked anyway.
+CREDENTIALS_TIMEOUT = 60 * 60
+
 
 class Access(ModelBase):
     key = models.CharField(max_length=255, unique=True)
@@ -63,3 +70,80 @@ class Nonce(ModelBase):
 
 def generate():
     return os.urandom(64).encode('hex')
+
+
+def credentials_key(prefix, key):
+    return 'oauth:%s:%s' % (prefix, hashlib.sha1(key.encode('utf8'))
+                                           .hexdigest())
+
+
+def get_consumer(key):
+    """
+    Returns a dict with the `secret` and `user_id` of the consumer with that
+    key, or None if there's no such consumer.
+    """
+    cache_key = credentials_key('access', key)
+    consumer = cache.get(cache_key)
+    if consumer is None:
+        try:
+            access = Access.objects.no_cache().get(key=key)
+        except Access.DoesNotExist:
+            return None
+        # OAuthlib needs unicode objects, django-aesfield returns a string.
+        consumer = {'secret': access.secret.decode('utf8'),
+                    'user_id': access.user_id}
+        cache.set(cache_key, consumer, CREDENTIALS_TIMEOUT)
+    return consumer
+
+
+def get_access_token(key, client_key):
+    """
+    Returns a dict with the `secret` and `user_id` of the access token with
+    that key given to the consumer `client_key`, or None if there's no such
+    token.
+    """
+    cache_key = credentials_key('token', key)
+    token = cache.get(cache_key)
+    if token is None:
+        try:
+            t = (Token.objects.no_cache().select_related('creds')
+                 .filter(token_type=ACCESS_TOKEN, key=key)[0])
+        except IndexError:
+            return None
+        token = {'secret': t.secret, 'user_id': t.user_id,
+                 'client_key': t.creds.key}
+        cache.set(cache_key, token, CREDENTIALS_TIMEOUT)
+    if token['client_key'] != client_key:
+        return None
+    return token
+
+
+@receiver(models.signals.post_save, sender=Access,
+          dispatch_uid='access_changed')
+@receiver(models.signals.post_delete, sender=Access,
+          dispatch_uid='access_deleted')
+def invalidate_consumer(sender, instance, **kw):
+    cache.delete(credentials_key('access', instance.key))
+
+
+@receiver(models.signals.post_save, sender=Token,
+          dispatch_uid='token_changed')
+@receiver(models.signals.post_delete, sender=Token,
+          dispatch_uid='token_deleted')
+def invalidate_token(sender, instance, **kw):
+    cache.delete(credentials_key('token', instance.key))
+
+
+def check_nonce(client_key, timestamp, nonce, token, lifetime):
+    """
+    Returns whether this is the first time the nonce has been used with that
+    timestamp and credentials, remembering it until the timestamp is more
+    than `lifetime` seconds old and would be refused anyway.
+    """
+    timeout = int(int(timestamp) + lifetime - time.time())
+    if timeout <= 0 or timeout > lifetime * 2:
+        # Too old or too far in the future to tell.
+        return False
+    key = credentials_key('nonce', u':'.join(
+        [client_key, timestamp, nonce, token or u'']))
+    return cache.add(key, 1, timeout)
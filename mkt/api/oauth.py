@@ -11,7 +11,9 @@ from oauthlib.common import safe_string_equals
 
 from amo.decorators import login_required
 from amo.utils import urlparams
-from mkt.api.models import Access, Nonce, Token, REQUEST_TOKEN, ACCESS_TOKEN
+from mkt.api.models import (Access, check_nonce, get_access_token,
+                            get_consumer, Token, ACCESS_TOKEN,
+                            REQUEST_TOKEN)
 
 DUMMY_CLIENT_KEY = u'DummyOAuthClientKeyString'
 DUMMY_TOKEN = u'DummyOAuthToken'
@@ -31,17 +33,14 @@ class OAuthServer(oauth1.Server):
 
     def validate_client_key(self, key):
         self.attempted_key = key
-        return Access.objects.filter(key=key).exists()
+        return get_consumer(key) is not None
 
     def get_client_secret(self, key):
         # This method returns a dummy secret on failure so that auth
         # success and failure take a codepath with the same run time,
         # to prevent timing attacks.
-        try:
-            # OAuthlib needs unicode objects, django-aesfield returns a string.
-            return Access.objects.get(key=key).secret.decode('utf8')
-        except Access.DoesNotExist:
-            return DUMMY_SECRET
+        consumer = get_consumer(key)
+        return consumer['secret'] if consumer else DUMMY_SECRET
 
     @property
     def dummy_client(self):
@@ -57,12 +56,9 @@ class OAuthServer(oauth1.Server):
 
     def validate_timestamp_and_nonce(self, client_key, timestamp, nonce,
                                      request_token=None, access_token=None):
-        n, created = Nonce.objects.safer_get_or_create(
-            defaults={'client_key': client_key},
-            nonce=nonce, timestamp=timestamp,
-            request_token=request_token,
-            access_token=access_token)
-        return created
+        return check_nonce(client_key, timestamp, nonce,
+                           request_token or access_token,
+                           self.timestamp_lifetime)
 
     def validate_requested_realm(self, client_key, realm):
         return True
@@ -82,11 +78,7 @@ class OAuthServer(oauth1.Server):
                                     key=request_token).exists()
 
     def validate_access_token(self, client_key, access_token):
-        # This method must take the same amount of time/db lookups for
-        # success and failure to prevent timing attacks.
-        return Token.objects.filter(token_type=ACCESS_TOKEN,
-                                    creds__key=client_key,
-                                    key=access_token).exists()
+        return get_access_token(access_token, client_key) is not None
 
     def validate_verifier(self, client_key, request_token, verifier):
         # This method must take the same amount of time/db lookups for
@@ -109,15 +101,8 @@ class OAuthServer(oauth1.Server):
             return DUMMY_SECRET
 
     def get_access_token_secret(self, client_key, request_token):
-        # This method must take the same amount of time/db lookups for
-        # success and failure to prevent timing attacks.
-        try:
-            t = Token.objects.get(key=request_token, creds__key=client_key,
-                                  token_type=ACCESS_TOKEN)
-        except Token.DoesNotExist:
-            return DUMMY_SECRET
-
-        return t.secret
+        token = get_access_token(request_token, client_key)
+        return token['secret'] if token else DUMMY_SECRET
 
 
 @csrf_view_exempt
@@ -26,8 +26,8 @@ from market.models import Price, PriceCurrency
 
 from mkt.api.authentication import RestOAuthAuthentication
 from mkt.api.authorization import AllowAppOwner, GroupPermission
-from mkt.api.base import (cors_api_view, CORSMixin, MarketplaceView,
-                          SlugOrIdMixin)
+from mkt.api.base import (CacheMixin, cors_api_view, CORSMixin,
+                          MarketplaceView, SlugOrIdMixin)
 from mkt.api.fields import SlugChoiceField
 from mkt.api.serializers import CarrierSerializer, RegionSerializer
 from mkt.carriers import CARRIER_MAP, CARRIERS
@@ -64,12 +64,14 @@ class CategorySerializer(ModelSerializer):
 
 
 class CategoryViewSet(ListModelMixin, RetrieveModelMixin, CORSMixin,
-                      SlugOrIdMixin, MarketplaceView, GenericViewSet):
+                      CacheMixin, SlugOrIdMixin, MarketplaceView,
+                      GenericViewSet):
     model = Category
     serializer_class = CategorySerializer
     permission_classes = (AllowAny,)
     cors_allowed_methods = ('get',)
     slug_field = 'slug'
+    cache_tag = 'category'
 
     def get_queryset(self):
         qs = Category.objects.filter(type=amo.ADDON_WEBAPP,
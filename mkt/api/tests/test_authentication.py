@@ -60,6 +60,17 @@ class TestRestOAuthAuthentication(TestCase):
             Request(self.call(client=OAuthClient(c)))))
         ok_(not this_thread_is_pinned())
 
+    def test_replay(self):
+        req = self.call()
+        ok_(self.auth.authenticate(Request(req)))
+        ok_(not self.auth.authenticate(Request(req)))
+
+    def test_revoked(self):
+        ok_(self.auth.authenticate(Request(self.call())))
+        client = OAuthClient(self.access)
+        self.access.delete()
+        ok_(not self.auth.authenticate(Request(self.call(client=client))))
+
     def test_request_admin(self):
         self.add_group_user(self.profile, 'Admins')
         ok_(not self.auth.authenticate(Request(self.call())))
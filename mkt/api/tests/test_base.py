@@ -1,9 +1,10 @@
 import urllib
 
 from django import forms
+from django.test.utils import override_settings
 
 from mock import patch
-from nose.tools import eq_
+from nose.tools import eq_, ok_
 
 from rest_framework.decorators import (authentication_classes,
                                        permission_classes)
@@ -17,7 +18,9 @@ from amo.urlresolvers import reverse
 
 from mkt.api.base import cors_api_view, SubRouterWithFormat
 from mkt.api.tests.test_oauth import RestOAuth
+from mkt.site.fixtures import fixture
 from mkt.webapps.api import AppViewSet
+from mkt.webapps.models import Webapp
 
 
 class URLRequestFactory(RequestFactory):
@@ -63,6 +66,66 @@ class TestEncoding(RestOAuth):
         eq_(create_mock.call_args[0][0].DATA['foo'], 'bar')
 
 
+@override_settings(API_ANONYMOUS_CACHE_TIMEOUT=60)
+class TestCacheMixin(RestOAuth):
+    fixtures = fixture('user_2519', 'webapp_337141')
+
+    def setUp(self):
+        super(TestCacheMixin, self).setUp()
+        self.app = Webapp.objects.get(pk=337141)
+        self.url = reverse('app-detail', kwargs={'pk': self.app.pk})
+
+    def get(self, client=None, **kw):
+        # Tells whether the view was called, i.e. the response wasn't cached.
+        with patch.object(AppViewSet, 'retrieve', autospec=True,
+                          side_effect=AppViewSet.retrieve) as retrieve:
+            res = (client or self.anon).get(self.url, **kw)
+        return res, retrieve.called
+
+    def test_cached(self):
+        res, called = self.get()
+        eq_(res.status_code, 200)
+        ok_(called)
+        cached, called = self.get()
+        eq_(cached.status_code, 200)
+        ok_(not called)
+        eq_(cached.content, res.content)
+        eq_(cached['ETag'], res['ETag'])
+        eq_(cached['Access-Control-Allow-Methods'],
+            res['Access-Control-Allow-Methods'])
+
+    def test_not_modified(self):
+        res, _ = self.get()
+        res, called = self.get(HTTP_IF_NONE_MATCH=res['ETag'])
+        eq_(res.status_code, 304)
+        ok_(not called)
+
+    def test_purged_on_save(self):
+        self.get()
+        self.app.save()
+        res, called = self.get()
+        eq_(res.status_code, 200)
+        ok_(called)
+
+    def test_query_string(self):
+        self.get()
+        res, called = self.get(data={'lang': 'fr'})
+        ok_(called)
+
+    def test_authenticated(self):
+        self.get()
+        res, called = self.get(client=self.client)
+        eq_(res.status_code, 200)
+        ok_(called)
+
+    def test_disabled(self):
+        with self.settings(API_ANONYMOUS_CACHE_TIMEOUT=0):
+            self.get()
+            res, called = self.get()
+        ok_(called)
+        ok_(not res.has_header('ETag'))
+
+
 class TestCORSWrapper(TestCase):
     def test_cors(self):
         @cors_api_view(['GET', 'PATCH'])
@@ -1,6 +1,7 @@
 from datetime import datetime
 from functools import partial
 import json
+import time
 import urllib
 import urlparse
 
@@ -9,7 +10,7 @@ from django.contrib.auth.models import User
 from django.test.client import Client, FakePayload
 from django.utils.encoding import smart_str
 
-from nose.tools import eq_
+from nose.tools import eq_, ok_
 from oauthlib import oauth1
 from pyquery import PyQuery as pq
 from test_utils import RequestFactory
@@ -19,7 +20,8 @@ from amo.helpers import absolutify, urlparams
 from amo.urlresolvers import reverse
 
 from mkt.api import authentication
-from mkt.api.models import Access, Token, generate, REQUEST_TOKEN, ACCESS_TOKEN
+from mkt.api.models import (Access, check_nonce, Token, generate,
+                            REQUEST_TOKEN, ACCESS_TOKEN)
 from mkt.api.tests import BaseAPI
 from mkt.site.fixtures import fixture
 
@@ -203,6 +205,23 @@ class Test3LeggedOAuthFlow(TestCase):
         assert auth.is_authenticated(req)
         eq_(req.user, self.user2)
 
+    def test_revoked_access_token(self):
+        t = Token.generate_new(ACCESS_TOKEN, creds=self.access,
+                               user=self.user2)
+        auth = authentication.RestOAuthAuthentication()
+
+        def request():
+            url, auth_header = self._oauth_request_info(
+                absolutify(reverse('app-list')), client_key=self.access.key,
+                client_secret=self.access.secret,
+                resource_owner_key=t.key, resource_owner_secret=t.secret)
+            return RequestFactory().get(url, HTTP_HOST='testserver',
+                                        HTTP_AUTHORIZATION=auth_header)
+
+        assert auth.is_authenticated(request())
+        t.delete()
+        assert not auth.is_authenticated(request())
+
     def test_bad_access_token(self):
         url = absolutify(reverse('app-list'))
         Token.generate_new(ACCESS_TOKEN, creds=self.access, user=self.user2)
@@ -304,3 +323,22 @@ class Test3LeggedOAuthFlow(TestCase):
                               HTTP_AUTHORIZATION=auth_header)
         eq_(res.status_code, 401)
         assert not Token.objects.filter(token_type=REQUEST_TOKEN).exists()
+
+
+class TestNonce(TestCase):
+
+    def check(self, timestamp, nonce='nonce', token=None):
+        return check_nonce(u'client', str(int(timestamp)), nonce, token, 600)
+
+    def test_used_once(self):
+        now = time.time()
+        ok_(self.check(now))
+        ok_(not self.check(now))
+        ok_(self.check(now, nonce='other'))
+        ok_(self.check(now, token='token'))
+
+    def test_too_old(self):
+        ok_(not self.check(time.time() - 601))
+
+    def test_too_far_ahead(self):
+        ok_(not self.check(time.time() + 601))
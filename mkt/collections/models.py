@@ -2,6 +2,7 @@ import os
 
 from django.conf import settings
 from django.db import models
+from django.dispatch import receiver
 
 import amo.models
 import mkt.carriers
@@ -9,6 +10,7 @@ import mkt.regions
 from addons.models import Addon, Category, clean_slug
 from amo.decorators import use_master
 from amo.utils import to_language
+from mkt.api.cache import purge_cache_tags
 from mkt.webapps.models import Webapp
 from mkt.webapps.tasks import index_webapps
 from translations.fields import PurifiedField, save_signal
@@ -185,3 +187,20 @@ models.signals.pre_save.connect(save_signal, sender=Collection,
 # not Webapp, because that's the real model underneath).
 models.signals.post_delete.connect(remove_deleted_apps, sender=Addon,
                                    dispatch_uid='apps_collections_cleanup')
+
+
+@receiver(models.signals.post_save, sender=Collection,
+          dispatch_uid='collection.purge.api.cache')
+@receiver(models.signals.post_delete, sender=Collection,
+          dispatch_uid='collection.delete.purge.api.cache')
+def purge_collection_api_cache(sender, instance, **kw):
+    # Listings are tagged with `collection`, so that new collections show up.
+    purge_cache_tags('collection', 'collection:%s' % instance.pk)
+
+
+@receiver(models.signals.post_save, sender=CollectionMembership,
+          dispatch_uid='collectionmembership.purge.api.cache')
+@receiver(models.signals.post_delete, sender=CollectionMembership,
+          dispatch_uid='collectionmembership.delete.purge.api.cache')
+def purge_collection_membership_api_cache(sender, instance, **kw):
+    purge_cache_tags('collection:%s' % instance.collection_id)
@@ -104,7 +104,7 @@ class CollectionMembershipField(serializers.RelatedField):
         qs = Webapp.from_search(request, region=region)
         filters = {'collection.id': obj.pk}
         if profile:
-            filters.update(**profile.to_kwargs(prefix='features.has_'))
+            filters['features_mask__nobits'] = profile.to_missing_int()
         qs = qs.filter(**filters).order_by({
             'collection.order': {
                 'order': 'asc',
@@ -19,7 +19,8 @@ from mkt.api.authentication import (RestOAuthAuthentication,
                                     RestAnonymousAuthentication,
                                     RestSharedSecretAuthentication)
 
-from mkt.api.base import CORSMixin, MarketplaceView, SlugOrIdMixin
+from mkt.api.base import (CacheMixin, CORSMixin, MarketplaceView,
+                          SlugOrIdMixin)
 from mkt.collections.serializers import DataURLImageField
 from mkt.webapps.models import Webapp
 from users.models import UserProfile
@@ -32,11 +33,12 @@ from .serializers import (CollectionMembershipField, CollectionSerializer,
                           CuratorSerializer)
 
 
-class CollectionViewSet(CORSMixin, SlugOrIdMixin, MarketplaceView,
+class CollectionViewSet(CORSMixin, CacheMixin, SlugOrIdMixin, MarketplaceView,
                         viewsets.ModelViewSet):
     serializer_class = CollectionSerializer
     queryset = Collection.objects.all()
     cors_allowed_methods = ('get', 'post', 'delete', 'patch')
+    cache_tag = 'collection'
     permission_classes = [CanBeHeroAuthorization, CuratorAuthorization]
     authentication_classes = [RestOAuthAuthentication,
                               RestSharedSecretAuthentication,
@@ -54,6 +56,12 @@ class CollectionViewSet(CORSMixin, SlugOrIdMixin, MarketplaceView,
         'app_mismatch': 'All apps in this collection must be included.',
     }
 
+    def get_cache_tags(self, data):
+        tags = super(CollectionViewSet, self).get_cache_tags(data)
+        collections = data['objects'] if 'objects' in data else [data]
+        return tags + ['webapp:%s' % app['id'] for collection in collections
+                       for app in collection.get('apps', [])]
+
     def filter_queryset(self, queryset):
         queryset = super(CollectionViewSet, self).filter_queryset(queryset)
         self.filter_fallback = getattr(queryset, 'filter_fallback', None)
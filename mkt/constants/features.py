@@ -374,6 +374,17 @@ class FeatureProfile(OrderedDict):
             features |= bool(v) << i
         return features
 
+    def to_missing_int(self):
+        """
+        Convert a FeatureProfile object to an integer bitfield of the features
+        it does not support, in the same order as `to_int`. An app requiring
+        any of them is not compatible with the profile.
+
+        >>> profile.to_missing_int() & app.current_version.features.to_int()
+        0
+        """
+        return ~self.to_int() & ((1 << len(self)) - 1)
+
     def to_signature(self):
         """
         Convert a FeatureProfile object to its decimal signature.
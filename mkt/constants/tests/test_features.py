@@ -46,6 +46,12 @@ class TestFeatureProfile(amo.tests.TestCase):
         self.truths = []
         self.test_from_int()
 
+    def test_to_missing_int(self):
+        profile = FeatureProfile.from_int(self.features)
+        missing = profile.to_missing_int()
+        eq_(missing & self.features, 0)
+        eq_(missing | self.features, (1 << len(APP_FEATURES)) - 1)
+
     def test_from_signature(self):
         profile = FeatureProfile.from_signature(self.signature)
         self._test_profile(profile)
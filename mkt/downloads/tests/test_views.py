@@ -3,6 +3,7 @@ from nose import SkipTest
 from nose.tools import eq_
 
 from django.conf import settings
+from django.core.files.storage import default_storage as storage
 
 import amo
 from amo.urlresolvers import reverse
@@ -20,8 +21,15 @@ class TestDownload(BasePackagedAppTest):
         super(TestDownload, self).setup_files()
         self.url = reverse('downloads.file', args=[self.file.pk])
 
-    @mock.patch.object(packaged, 'sign', mock_sign)
+    def sign(self):
+        mock_sign(self.file.version_id)
+
+    def unsign(self):
+        if storage.exists(self.file.signed_file_path):
+            storage.delete(self.file.signed_file_path)
+
     def test_download(self):
+        self.sign()
         if not settings.XSENDFILE:
             raise SkipTest
         res = self.client.get(self.url)
@@ -51,14 +59,14 @@ class TestDownload(BasePackagedAppTest):
         self.file.update(status=amo.STATUS_PENDING)
         eq_(self.client.get(self.url).status_code, 404)
 
-    @mock.patch.object(packaged, 'sign', mock_sign)
     def test_disabled_but_owner(self):
+        self.sign()
         self.client.login(username='steamcube@mozilla.com',
                           password='password')
         eq_(self.client.get(self.url).status_code, 200)
 
-    @mock.patch.object(packaged, 'sign', mock_sign)
     def test_disabled_but_admin(self):
+        self.sign()
         self.client.login(username='admin@mozilla.com',
                           password='password')
         eq_(self.client.get(self.url).status_code, 200)
@@ -67,11 +75,29 @@ class TestDownload(BasePackagedAppTest):
         self.app.update(type=amo.ADDON_EXTENSION)
         eq_(self.client.get(self.url).status_code, 404)
 
-    @mock.patch.object(packaged, 'sign', mock_sign)
     def test_file_blocklisted(self):
         if not settings.XSENDFILE:
             raise SkipTest
+        self.sign()
         self.file.update(status=amo.STATUS_BLOCKED)
         res = self.client.get(self.url)
         eq_(res.status_code, 200)
         assert settings.XSENDFILE_HEADER in res
+
+    @mock.patch.object(packaged, 'presign')
+    def test_not_signed_yet(self, presign):
+        self.unsign()
+        res = self.client.get(self.url)
+        eq_(res.status_code, 503)
+        eq_(res['Retry-After'], str(settings.SIGNED_APPS_RETRY_AFTER))
+        presign.delay.assert_called_with(self.file.version_id)
+
+        # Signing is only queued once in a while.
+        eq_(self.client.get(self.url).status_code, 503)
+        eq_(presign.delay.call_count, 1)
+
+    @mock.patch.object(packaged, 'presign')
+    def test_signed(self, presign):
+        self.sign()
+        self.client.get(self.url)
+        assert not presign.delay.called
@@ -1,4 +1,6 @@
 from django import http
+from django.conf import settings
+from django.core.files.storage import default_storage as storage
 from django.shortcuts import get_object_or_404
 
 import commonware.log
@@ -7,6 +9,7 @@ import amo
 from access import acl
 from amo.utils import HttpResponseSendFile
 from files.models import File
+from lib.crypto import packaged
 from mkt.webapps.models import Webapp
 
 log = commonware.log.getLogger('z.downloads')
@@ -24,7 +27,15 @@ def download_file(request, file_id, type=None):
 
     # We treat blocked files like public files so users get the update.
     if file.status in [amo.STATUS_PUBLIC, amo.STATUS_BLOCKED]:
-        path = webapp.sign_if_packaged(file.version_id)
+        path = file.signed_file_path
+        if not storage.exists(path):
+            # Signing is left to the `signing` queue rather than holding this
+            # request until it's done, the client comes back in a bit.
+            log.info('Package not signed yet: %s from %s' % (webapp.id, path))
+            packaged.queue_presign(file.version_id)
+            response = http.HttpResponse(status=503)
+            response['Retry-After'] = settings.SIGNED_APPS_RETRY_AFTER
+            return response
 
     else:
         # This is someone asking for an unsigned packaged app.
@@ -12,6 +12,7 @@ import amo.tests
 from amo.helpers import absolutify
 from amo.urlresolvers import reverse
 from amo.tests import addon_factory
+from lib.crypto.receipt import invalidate_verified
 from mkt.receipts.utils import create_receipt, get_key
 from mkt.webapps.models import Installed, Webapp
 from users.models import UserProfile
@@ -158,6 +159,22 @@ class TestReceipt(amo.tests.TestCase):
         eq_(create_receipt(ins), 'something-cunning')
         #TODO: more goes here.
 
+    @mock.patch.object(settings, 'SIGNING_SERVER_ACTIVE', True)
+    @mock.patch.object(settings, 'WEBAPPS_RECEIPT_SIGNED_CACHE_TTL', 60)
+    @mock.patch('mkt.receipts.utils.sign')
+    def test_receipt_signed_cached(self, sign):
+        sign.return_value = 'something-cunning'
+        ins = self.create_install(self.user, self.webapp)
+        eq_(create_receipt(ins), 'something-cunning')
+        eq_(create_receipt(ins), 'something-cunning')
+        eq_(sign.call_count, 1)
+
+        # Other installs or purchases get their own.
+        create_receipt(self.create_install(self.other_user, self.webapp))
+        invalidate_verified(self.webapp.pk, [ins.uuid])
+        create_receipt(ins)
+        eq_(sign.call_count, 3)
+
 
 @mock.patch.object(settings, 'WEBAPPS_RECEIPT_KEY',
                    amo.tests.AMOPaths.sample_key() + '.foo')
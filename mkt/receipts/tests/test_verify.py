@@ -17,6 +17,7 @@ from test_utils import RequestFactory
 import amo
 import amo.tests
 from addons.models import Addon
+from lib.crypto.receipt import invalidate_verified
 from services import utils, verify
 from mkt.receipts.utils import create_receipt
 from mkt.site.fixtures import fixture
@@ -352,6 +353,225 @@ class TestVerify(amo.tests.TestCase):
         assert ('Cache-Control', 'no-cache') in hdrs, 'No cache header needed'
 
 
+@mock.patch.object(utils.settings, 'WEBAPPS_RECEIPT_URL', 'http://foo.com')
+@mock.patch.object(utils.settings, 'WEBAPPS_RECEIPT_VERIFY_CACHE', True)
+class TestVerifyCache(amo.tests.TestCase):
+    fixtures = fixture('webapp_337141', 'user_999')
+
+    def setUp(self):
+        self.addon = Addon.objects.get(pk=337141)
+        self.user = UserProfile.objects.get(pk=999)
+        self.user_data = {'user': {'type': 'directed-identifier',
+                                   'value': 'some-uuid'},
+                          'product': {'url': 'http://f.com',
+                                      'storedata': urlencode({'id': 337141})},
+                          'verify': 'https://foo.com/verifyme/',
+                          'exp': calendar.timegm(time.gmtime()) + 1000,
+                          'typ': 'purchase-receipt'}
+        verify.verified_cache.clear()
+        patcher = mock.patch.object(verify, 'decode_receipt')
+        self.decode_receipt = patcher.start()
+        self.decode_receipt.return_value = self.user_data
+        self.addCleanup(patcher.stop)
+
+    def get(self, path='/verifyme/'):
+        v = verify.Verify('receipt', RequestFactory().get(path).META)
+        v.cursor = connection.cursor()
+        return json.loads(v.check_full())
+
+    def make_install(self):
+        install = Installed.objects.create(addon=self.addon, user=self.user)
+        install.update(uuid='some-uuid')
+        return install
+
+    def make_premium(self):
+        self.addon.update(premium_type=amo.ADDON_PREMIUM)
+        self.make_install()
+        AddonPurchase.objects.create(addon=self.addon, user=self.user)
+
+    def test_hit(self):
+        self.make_install()
+        eq_(self.get()['status'], 'ok')
+        eq_(self.decode_receipt.call_count, 1)
+
+        with self.assertNumQueries(0):
+            eq_(self.get()['status'], 'ok')
+        eq_(self.decode_receipt.call_count, 1)
+
+    def test_shared_tier(self):
+        self.make_install()
+        self.get()
+        verify.verified_cache.clear()
+        eq_(self.get()['status'], 'ok')
+        eq_(self.decode_receipt.call_count, 1)
+        assert verify.verified_cache.get(
+            verify.verified_key('receipt')) is not None
+
+    def test_invalid_not_cached(self):
+        eq_(self.get()['status'], 'invalid')
+        self.make_install()
+        eq_(self.get()['status'], 'ok')
+        eq_(self.decode_receipt.call_count, 2)
+
+    def test_url_checked_on_hit(self):
+        self.make_install()
+        self.get()
+        res = self.get(path='/other/')
+        eq_(res['status'], 'invalid')
+        eq_(res['reason'], 'WRONG_PATH')
+
+    def test_expiry_checked_on_hit(self):
+        self.make_install()
+        self.get()
+        with mock.patch('services.verify.gmtime') as gmtime:
+            gmtime.return_value = time.gmtime(time.time() + 2000)
+            eq_(self.get()['status'], 'expired')
+
+    def test_refund_invalidates(self):
+        self.make_premium()
+        eq_(self.get()['status'], 'ok')
+        Contribution.objects.create(addon=self.addon, user=self.user,
+                                    type=amo.CONTRIB_REFUND)
+        eq_(self.get()['status'], 'refunded')
+        eq_(self.decode_receipt.call_count, 2)
+
+    def test_chargeback_invalidates(self):
+        self.make_premium()
+        eq_(self.get()['status'], 'ok')
+        AddonPurchase.objects.get(addon=self.addon, user=self.user).update(
+            type=amo.CONTRIB_CHARGEBACK)
+        eq_(self.get()['status'], 'refunded')
+
+    def test_uninstall_invalidates(self):
+        install = self.make_install()
+        eq_(self.get()['status'], 'ok')
+        install.delete()
+        eq_(self.get()['status'], 'invalid')
+
+    def test_invalidated_while_verifying(self):
+        install = self.make_install()
+        get_install = verify.Verify.get_install
+
+        def racing_get_install(self, uuid):
+            row = get_install(self, uuid)
+            invalidate_verified(install.addon_id, [install.uuid])
+            return row
+
+        with mock.patch.object(verify.Verify, 'get_install',
+                               racing_get_install):
+            eq_(self.get()['status'], 'ok')
+        eq_(self.get()['status'], 'ok')
+        eq_(self.decode_receipt.call_count, 2)
+
+
+@mock.patch.object(utils.settings, 'WEBAPPS_RECEIPT_URL', 'http://foo.com')
+class TestBatchVerify(amo.tests.TestCase):
+    fixtures = fixture('webapp_337141', 'user_999')
+
+    def setUp(self):
+        self.addon = Addon.objects.get(pk=337141)
+        self.user = UserProfile.objects.get(pk=999)
+        self.receipts = {}
+        patcher = mock.patch.object(verify, 'decode_receipt')
+        decode_receipt = patcher.start()
+        decode_receipt.side_effect = self.decode
+        self.addCleanup(patcher.stop)
+
+    def decode(self, receipt):
+        if receipt not in self.receipts:
+            raise ValueError('Not a receipt')
+        return self.receipts[receipt]
+
+    def receipt(self, name, uuid='some-uuid', **kw):
+        data = {'user': {'type': 'directed-identifier', 'value': uuid},
+                'product': {'url': 'http://f.com',
+                            'storedata': urlencode({'id': 337141})},
+                'verify': 'https://foo.com/verify/337141',
+                'exp': calendar.timegm(time.gmtime()) + 1000,
+                'typ': 'purchase-receipt'}
+        data.update(kw)
+        self.receipts[name] = data
+        return name
+
+    def make_install(self, uuid='some-uuid', user=None):
+        install = Installed.objects.create(addon=self.addon,
+                                           user=user or self.user)
+        install.update(uuid=uuid)
+        return install
+
+    def single(self, receipt):
+        v = verify.Verify(receipt,
+                          RequestFactory().post('/verify/337141').META)
+        v.cursor = connection.cursor()
+        return json.loads(v.check_full())
+
+    def batch(self, receipt_list):
+        v = verify.BatchVerify(receipt_list,
+                               RequestFactory().post('/verify/batch/').META)
+        v.cursor = connection.cursor()
+        return v.check_full()
+
+    def test_matches_single(self):
+        self.addon.update(premium_type=amo.ADDON_PREMIUM)
+        other = UserProfile.objects.create(email='other@example.com')
+        self.make_install()
+        self.make_install('refunded-uuid', user=other)
+        AddonPurchase.objects.create(addon=self.addon, user=self.user)
+        AddonPurchase.objects.create(addon=self.addon, user=other,
+                                     type=amo.CONTRIB_REFUND)
+        receipt_list = [
+            self.receipt('ok'),
+            self.receipt('refunded', uuid='refunded-uuid'),
+            self.receipt('expired', exp=calendar.timegm(time.gmtime()) - 1),
+            self.receipt('wrong-user', uuid='nope'),
+            self.receipt('wrong-type', typ='test-receipt'),
+            self.receipt('wrong-domain', verify='https://bar.com/verify/1'),
+            'garbage',
+        ]
+        results = self.batch(receipt_list)
+        eq_([r['status'] for r in results],
+            ['ok', 'refunded', 'expired', 'invalid', 'invalid', 'invalid',
+             'invalid'])
+        eq_(results, [self.single(r) for r in receipt_list])
+
+    def test_num_queries(self):
+        self.make_install()
+        receipt_list = [self.receipt('ok-%s' % i) for i in range(10)]
+        with self.assertNumQueries(2):
+            results = self.batch(receipt_list)
+        eq_(set(r['status'] for r in results), set(['ok']))
+
+    def test_no_queries_for_invalid(self):
+        with self.assertNumQueries(0):
+            eq_(self.batch(['garbage']),
+                [{'status': 'invalid', 'reason': 'ERROR_DECODING'}])
+
+    def request(self, body, method='post'):
+        environ = getattr(RequestFactory(), method)(
+            verify.BATCH_PATH, data=body,
+            content_type='application/json').META
+        start_response = mock.Mock()
+        output = verify.application(environ, start_response)
+        return start_response.call_args[0][0], output
+
+    @mock.patch.object(verify, 'BatchVerify')
+    def test_application(self, BatchVerify):
+        BatchVerify.return_value.check_full.return_value = [{'status': 'ok'}]
+        status, output = self.request(json.dumps({'receipts': ['a']}))
+        eq_(status, '200 OK')
+        eq_(json.loads(output[0]), {'receipts': [{'status': 'ok'}]})
+        eq_(BatchVerify.call_args[0][0], ['a'])
+
+    def test_application_bad_request(self):
+        eq_(self.request('nope')[0], '400 Bad Request')
+        eq_(self.request(json.dumps({'receipts': 'a'}))[0],
+            '400 Bad Request')
+        too_many = ['a'] * (verify.MAX_BATCH_SIZE + 1)
+        eq_(self.request(json.dumps({'receipts': too_many}))[0],
+            '400 Bad Request')
+        eq_(self.request('', method='put')[0], '405 Method Not Allowed')
+
+
 class TestBase(amo.tests.TestCase):
 
     def create(self, data, request=None):
@@ -3,6 +3,7 @@ import time
 from urllib import urlencode
 
 from django.conf import settings
+from django.core.cache import cache
 
 import jwt
 from nose.tools import nottest
@@ -10,10 +11,37 @@ from nose.tools import nottest
 from access import acl
 from amo.helpers import absolutify
 from amo.urlresolvers import reverse
-from lib.crypto.receipt import sign
+from lib.crypto.receipt import purchase_key, sign
+
+
+def signed_key(installed, flavour=None):
+    """
+    Cache key of the receipt last created for `installed`, which changes
+    along with its purchase token.
+    """
+    token = cache.get(purchase_key(installed.addon_id, installed.uuid))
+    return 'receipt:signed:%s:%s:%s' % (installed.pk, flavour, token)
 
 
 def create_receipt(installed, flavour=None):
+    """
+    Creates a signed receipt for `installed`. The same receipt is handed out
+    again for `WEBAPPS_RECEIPT_SIGNED_CACHE_TTL` seconds, so installs which
+    are retried don't each need a receipt signing.
+    """
+    timeout = settings.WEBAPPS_RECEIPT_SIGNED_CACHE_TTL
+    if not timeout:
+        return _create_receipt(installed, flavour)
+
+    key = signed_key(installed, flavour)
+    receipt = cache.get(key)
+    if receipt is None:
+        receipt = _create_receipt(installed, flavour)
+        cache.set(key, receipt, timeout)
+    return receipt
+
+
+def _create_receipt(installed, flavour=None):
     assert flavour in [None, 'developer', 'reviewer'], (
            'Invalid flavour: %s' % flavour)
 
@@ -5,6 +5,7 @@ from django_statsd.clients import statsd
 from lib.geoip import GeoIP
 
 import mkt
+from mkt.regions.utils import remember_user_region
 
 
 class RegionMiddleware(object):
@@ -70,8 +71,10 @@ class RegionMiddleware(object):
         if reg != stored_reg:
             if (getattr(request, 'amo_user', None)
                 and request.amo_user.region != reg):
+                # This is saved later by the `save_user_regions` cron, so
+                # that read requests don't write to the master.
                 request.amo_user.region = reg
-                request.amo_user.save()
+                remember_user_region(request.amo_user.pk, reg)
 
         request.REGION = regions[reg]
         mkt.regions.set_region(reg)
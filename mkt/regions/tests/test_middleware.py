@@ -1,6 +1,7 @@
 import socket
 
 from django.conf import settings
+from django.core.cache import cache
 
 import mock
 from nose.tools import eq_, ok_
@@ -9,6 +10,8 @@ import amo.tests
 from users.models import UserProfile
 
 import mkt
+from mkt.regions.utils import (PENDING_LAST_KEY, PENDING_SAVED_KEY,
+                                save_user_regions)
 from mkt.site.fixtures import fixture
 
 
@@ -151,4 +154,32 @@ class TestRegionMiddlewarePersistence(amo.tests.TestCase):
     def test_save_region(self):
         self.client.login(username='regular@mozilla.com', password='password')
         self.client.get('/api/v1/apps/?region=br')
+        # The region is only saved later on.
+        eq_(UserProfile.objects.get(pk=999).region, None)
+        eq_(save_user_regions(), 1)
         eq_(UserProfile.objects.get(pk=999).region, 'br')
+
+    def test_save_latest_region(self):
+        self.client.login(username='regular@mozilla.com', password='password')
+        self.client.get('/api/v1/apps/?region=br')
+        self.client.get('/api/v1/apps/?region=us')
+        eq_(save_user_regions(), 1)
+        eq_(UserProfile.objects.get(pk=999).region, 'us')
+        # Nothing left to save.
+        eq_(save_user_regions(), 0)
+
+    def test_save_after_counter_evicted(self):
+        # The saved pointer outlived the counter, which starts over.
+        cache.delete(PENDING_LAST_KEY)
+        cache.set(PENDING_SAVED_KEY, 50, 0)
+        self.client.login(username='regular@mozilla.com', password='password')
+        self.client.get('/api/v1/apps/?region=br')
+        eq_(save_user_regions(), 1)
+        eq_(UserProfile.objects.get(pk=999).region, 'br')
+        eq_(cache.get(PENDING_SAVED_KEY), 1)
+
+    def test_no_write_on_request(self):
+        self.client.login(username='regular@mozilla.com', password='password')
+        with mock.patch.object(UserProfile, 'save') as save:
+            self.client.get('/api/v1/apps/?region=br')
+        assert not save.called
@@ -1,6 +1,21 @@
+from django.core.cache import cache
+from django.db import connection
+
 from mkt.constants import regions
 
 
+# Regions seen for users are kept in the cache until `save_user_regions`
+# writes them to the database. Users with a region to save are appended once
+# to a log of numbered slots, which `save_user_regions` reads from where it
+# last stopped.
+USER_REGION_KEY = 'regions:user:%s'
+USER_PENDING_KEY = 'regions:user:%s:pending'
+PENDING_SLOT_KEY = 'regions:pending:%s'
+PENDING_LAST_KEY = 'regions:pending:last'
+PENDING_SAVED_KEY = 'regions:pending:saved'
+PENDING_TIMEOUT = 60 * 60 * 24
+
+
 def parse_region(region):
     """
     Returns a region class definition given a slug, id, or class definition.
@@ -28,3 +43,66 @@ def parse_region(region):
         for region in regions.ALL_REGIONS:
             if unicode(region.name).lower() == region_lower:
                 return region
+
+
+def remember_user_region(user_id, region):
+    """
+    Records `region` as the one the user was last seen in, to be saved to
+    the database by `save_user_regions` later rather than during the request.
+    """
+    cache.set(USER_REGION_KEY % user_id, region, PENDING_TIMEOUT)
+    # Only queue users once between two saves, however much they roam.
+    if cache.add(USER_PENDING_KEY % user_id, 1, PENDING_TIMEOUT):
+        cache.add(PENDING_LAST_KEY, 0, 0)
+        slot = cache.incr(PENDING_LAST_KEY)
+        cache.set(PENDING_SLOT_KEY % slot, user_id, PENDING_TIMEOUT)
+
+
+def save_user_regions():
+    """
+    Saves the regions recorded by `remember_user_region` since the last run,
+    with one UPDATE for all the users whose region actually changed.
+
+    Returns the number of users updated.
+    """
+    from users.models import UserProfile
+
+    saved = cache.get(PENDING_SAVED_KEY) or 0
+    last = cache.get(PENDING_LAST_KEY) or 0
+    if last < saved:
+        # The counter was evicted and restarted from 1: read from there
+        # rather than waiting for it to catch up.
+        saved = 0
+    if last == saved:
+        return 0
+
+    slots = [PENDING_SLOT_KEY % slot for slot in xrange(saved + 1, last + 1)]
+    ids = set(cache.get_many(slots).values())
+    cache.set(PENDING_SAVED_KEY, last, 0)
+    cache.delete_many(slots)
+    # Unmark the users before reading their region, so that any region seen
+    # from now on queues them again instead of being lost.
+    cache.delete_many([USER_PENDING_KEY % pk for pk in ids])
+    seen = cache.get_many([USER_REGION_KEY % pk for pk in ids])
+
+    changed = []
+    for user in UserProfile.objects.no_cache().filter(id__in=ids):
+        region = seen.get(USER_REGION_KEY % user.id)
+        if region and user.region != region:
+            user.region = region
+            changed.append(user)
+    if not changed:
+        return 0
+
+    params = []
+    for user in changed:
+        params.extend([user.id, user.region])
+    params.extend(user.id for user in changed)
+    cursor = connection.cursor()
+    cursor.execute(
+        'UPDATE `users` SET `region` = CASE `id` %s END WHERE `id` IN (%s)' % (
+            ' '.join(['WHEN %s THEN %s'] * len(changed)),
+            ', '.join(['%s'] * len(changed))), params)
+    # All our updates were sql, so invalidate manually.
+    UserProfile.objects.invalidate(*changed)
+    return len(changed)
@@ -12,7 +12,8 @@ import mkt
 from access import acl
 from mkt.api.authentication import (RestSharedSecretAuthentication,
                                     RestOAuthAuthentication)
-from mkt.api.base import CORSMixin, form_errors, MarketplaceView
+from mkt.api.base import (CacheMixin, CORSMixin, form_errors,
+                          MarketplaceView)
 from mkt.collections.constants import (COLLECTIONS_TYPE_BASIC,
                                        COLLECTIONS_TYPE_FEATURED,
                                        COLLECTIONS_TYPE_OPERATOR)
@@ -78,7 +79,7 @@ class SearchView(CORSMixin, MarketplaceView, GenericAPIView):
                             region=self.get_region(request))
         profile = get_feature_profile(request)
         qs = self.apply_filters(request, qs, data=form_data,
-                                profile=profile)
+                                profile=profile).cache()
         page = self.paginate_queryset(qs)
         return self.get_pagination_serializer(page), query
 
@@ -104,7 +105,18 @@ class SearchView(CORSMixin, MarketplaceView, GenericAPIView):
                               profile=profile)
 
 
-class FeaturedSearchView(SearchView):
+class FeaturedSearchView(CacheMixin, SearchView):
+    cache_tag = 'webapp'
+
+    def get_cache_tags(self, data):
+        tags = super(FeaturedSearchView, self).get_cache_tags(data)
+        tags.append('collection')
+        for name in ('collections', 'featured', 'operator'):
+            for collection in data[name]:
+                tags.append('collection:%s' % collection['id'])
+                tags.extend('webapp:%s' % app['id']
+                            for app in collection.get('apps', []))
+        return tags
 
     def collections(self, request, collection_type=None, limit=1):
         filters = request.GET.dict()
@@ -0,0 +1,70 @@
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.client import RequestFactory
+
+import amo
+from mkt.fireplace.api import FireplaceESAppSerializer
+from mkt.regions import REGION_LOOKUP
+from mkt.search.serializers import (ESAppSerializer, SimpleESAppSerializer,
+                                    SuggestionsESAppSerializer)
+from mkt.search.utils import S
+from mkt.webapps.models import WebappIndexer
+
+
+SERIALIZERS = (ESAppSerializer, SimpleESAppSerializer,
+               FireplaceESAppSerializer, SuggestionsESAppSerializer)
+
+
+class Command(BaseCommand):
+    """
+    Compares how long the search serializers take to serialize apps
+    straight from their ES documents and through fake apps, and checks both
+    give the same output.
+
+    Runs against the apps in the local index, as an anonymous user.
+    """
+    option_list = BaseCommand.option_list + (
+        make_option('--apps', action='store', type='int', default=25,
+                    dest='apps', help='Apps per page, default: %default'),
+        make_option('--rounds', action='store', type='int', default=20,
+                    dest='rounds', help='Pages to serialize, default: '
+                                        '%default'),
+        make_option('--region', action='store', default='us',
+                    dest='region', help='Region, default: %default'),
+        make_option('--lang', action='store', default=None,
+                    dest='lang', help='?lang= to pass, if any.'),
+    )
+
+    def handle(self, *args, **options):
+        hits = list(S(WebappIndexer).filter(type=amo.ADDON_WEBAPP)
+                                    [:options['apps']])
+        if not hits:
+            raise CommandError('No apps found in the index.')
+
+        url = '/?lang=%s' % options['lang'] if options['lang'] else '/'
+        request = RequestFactory().get(url)
+        request.REGION = REGION_LOOKUP[options['region']]
+        request.amo_user = None
+
+        for serializer_class in SERIALIZERS:
+            serializer = serializer_class(context={'request': request})
+            fast = self.time(serializer.to_native, hits, options['rounds'])
+            slow = self.time(serializer.fake_app_to_native, hits,
+                             options['rounds'])
+            same = ([serializer.to_native(hit) for hit in hits] ==
+                    [serializer.fake_app_to_native(hit) for hit in hits])
+            self.stdout.write(
+                '%s: %.2fms per page from ES data, %.2fms with fake apps '
+                '(%.1fx), %s output.\n' % (
+                    serializer_class.__name__, fast, slow, slow / fast,
+                    'same' if same else 'DIFFERENT'))
+
+    def time(self, to_native, hits, rounds):
+        """Returns the average time taken to serialize `hits`, in ms."""
+        start = time.time()
+        for i in xrange(rounds):
+            for hit in hits:
+                to_native(hit)
+        return (time.time() - start) * 1000 / rounds
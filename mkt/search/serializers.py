@@ -18,6 +18,106 @@ from mkt.webapps.utils import (
 from mkt.webapps.api import AppSerializer, SimpleAppSerializer
 
 
+class ESObject(object):
+    """A bare object holding the attributes it was created with."""
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class ESPreview(ESObject):
+    # Preview builds its urls from `id`, `modified` and `filetype` only, so
+    # we can borrow its code without making real instances.
+    _image_url = Preview._image_url.im_func
+    file_extension = Preview.file_extension
+    image_url = Preview.image_url
+    thumbnail_url = Preview.thumbnail_url
+
+
+class ESGeodata(ESObject):
+    banner_regions = None
+    banner_regions_slugs = Geodata.banner_regions_slugs.im_func
+
+
+class ESApp(object):
+    """
+    A lightweight stand-in for the app an ES document was built from.
+
+    It holds what ESAppSerializer reads, taken straight from the document,
+    and borrows the Webapp methods it needs that don't hit the database.
+    This is much cheaper than the fake Webapp, Versions, Geodata, Categories
+    and Previews that `ESAppSerializer.create_fake_app` makes.
+    """
+    type = amo.ADDON_WEBAPP
+    icon_type = 'image/png'
+    payment_account = None
+
+    get_absolute_url = Webapp.get_absolute_url.im_func
+    get_url_path = Webapp.get_url_path.im_func
+    get_icon_url = Webapp.get_icon_url.im_func
+    has_premium = Webapp.has_premium.im_func
+    is_premium = Webapp.is_premium.im_func
+
+    def __init__(self, data):
+        self.es_data = data
+        self.id = self.pk = data['id']
+        self.app_slug = data['app_slug']
+        for field_name in ('created', 'modified', 'default_locale',
+                           'is_escalated', 'is_offline', 'manifest_url',
+                           'premium_type', 'regions', 'reviewed', 'status',
+                           'weekly_downloads'):
+            setattr(self, field_name, data.get(field_name))
+        self.app_type = amo.ADDON_WEBAPP_TYPES[data['app_type']]
+        self.is_packaged = data['app_type'] != amo.ADDON_WEBAPP_HOSTED
+        self.public_stats = data['has_public_stats']
+        self.all_categories = [ESObject(slug=cat) for cat in data['category']]
+        self.all_previews = [ESPreview(id=p['id'], modified=p['modified'],
+                                       filetype=p['filetype'])
+                             for p in data['previews']]
+        self.device_types = [DEVICE_TYPES[d] for d in data['device']]
+        region_ids = Webapp.get_region_ids.im_func(
+            self, restofworld=True, excluded=data['region_exclusions'])
+        self.get_regions = (Webapp.get_regions.im_func(self, region_ids)
+                            if region_ids else [])
+
+        for field_name in ('name', 'description', 'homepage', 'support_email',
+                           'support_url'):
+            ESTranslationSerializerField.attach_translations(self, data,
+                                                             field_name)
+        self.geodata = ESGeodata()
+        ESTranslationSerializerField.attach_translations(self.geodata, data,
+                                                         'banner_message')
+
+        # Like Addon.current_version, which returns None for deleted apps.
+        if self.status == amo.STATUS_DELETED:
+            self.current_version = self.developer_name = None
+        else:
+            self.current_version = ESObject(
+                version=data['current_version'],
+                developer_name=data['author'],
+                supported_locales=data['supported_locales'])
+            ESTranslationSerializerField.attach_translations(
+                self.current_version, data, 'release_notes',
+                target_name='releasenotes')
+            self.developer_name = data['author']
+
+    def db_fields(self, request):
+        """
+        Returns the names of the fields that need the database for this app,
+        so can't be serialized from an ESApp.
+        """
+        fields = set()
+        if self.is_premium():
+            fields.update(['payment_account', 'payment_required', 'price',
+                           'price_locale'])
+        if getattr(request, 'amo_user', None):
+            fields.add('user')
+        if not self.get_regions:
+            # Webapp.get_regions() looks them up when given none.
+            fields.add('regions')
+        return fields
+
+
 class ESAppSerializer(AppSerializer):
     # Fields specific to search.
     absolute_url = serializers.SerializerMethodField('get_absolute_url')
@@ -83,7 +183,27 @@ class ESAppSerializer(AppSerializer):
         # little performance by asking elasticutils not to create it.
         return [self.to_native(item) for item in obj.object_list]
 
-    def to_native(self, obj):
+    @classmethod
+    def es_app_fields(cls):
+        """
+        Returns the names of the fields that can be serialized from an ESApp:
+        the ones defined here or on AppSerializer, as long as neither the
+        field nor the method it calls were overridden by a subclass.
+        """
+        if '_es_app_fields' not in cls.__dict__:
+            names = set()
+            for name, field in cls.base_fields.items():
+                if ESAppSerializer.base_fields.get(name) is not field:
+                    continue
+                method = getattr(field, 'method_name', None)
+                if method and (getattr(cls, method).im_func is not
+                               getattr(ESAppSerializer, method).im_func):
+                    continue
+                names.add(name)
+            cls._es_app_fields = names
+        return cls._es_app_fields
+
+    def set_requested_language(self):
         request = self.context['request']
 
         if request and request.method == 'GET' and 'lang' in request.GET:
@@ -92,6 +212,65 @@ class ESAppSerializer(AppSerializer):
             # happens.
             self.requested_language = find_language(request.GET['lang'].lower())
 
+    def to_native(self, obj):
+        """
+        Serializes the ES result `obj`, reading most fields from a cheap
+        ESApp. The fields it can't handle are read from a fake app instead,
+        which is only built when needed.
+
+        The output is the same as `fake_app_to_native`'s: like DRF's
+        `to_native`, it goes through `get_field_key`, the `transform_<field>`
+        methods and sets `ret.fields`.
+        """
+        self.set_requested_language()
+
+        data = obj._source
+        app = ESApp(data)
+        es_fields = self.es_app_fields() - app.db_fields(
+            self.context['request'])
+        fake_app = None
+
+        ret = self._dict_class()
+        ret.fields = self._dict_class()
+        for field_name, field in self.fields.items():
+            field.initialize(parent=self, field_name=field_name)
+            key = self.get_field_key(field_name)
+            if field_name in es_fields:
+                source = app
+                if field_name == 'regions':
+                    value = [self.region_to_native(field, region)
+                             for region in app.get_regions]
+                else:
+                    value = field.field_to_native(app, field_name)
+            else:
+                if fake_app is None:
+                    fake_app = self.create_fake_app(data)
+                source = fake_app
+                value = field.field_to_native(fake_app, field_name)
+            method = getattr(self, 'transform_%s' % field_name, None)
+            if callable(method):
+                value = method(source, value)
+            if not getattr(field, 'write_only', False):
+                ret[key] = value
+            ret.fields[key] = self.augment_field(field, field_name, key,
+                                                 value)
+        return ret
+
+    def region_to_native(self, field, region):
+        # Every app lists most regions, so only serialize each one once.
+        if not hasattr(self, '_regions_native'):
+            self._regions_native = {}
+        if region.id not in self._regions_native:
+            self._regions_native[region.id] = field.to_native(region)
+        return self._regions_native[region.id]
+
+    def fake_app_to_native(self, obj):
+        """
+        Serializes the ES result `obj` through a fake app built from its
+        data, with all of AppSerializer's machinery.
+        """
+        self.set_requested_language()
+
         app = self.create_fake_app(obj._source)
         return super(ESAppSerializer, self).to_native(app)
 
@@ -0,0 +1,73 @@
+import mock
+from nose.tools import eq_
+
+import amo.tests
+from mkt.search.utils import invalidate_search_cache, S
+from mkt.webapps.models import WebappIndexer
+
+
+def response(ids):
+    return {'took': 3, 'hits': {'total': len(ids), 'hits': [
+        {'_id': str(pk), '_type': 'webapp', '_source': {'id': pk},
+         '_explanation': {}} for pk in ids]}}
+
+
+@mock.patch('mkt.search.utils.eu_S.raw')
+class TestSearchCache(amo.tests.TestCase):
+
+    def search(self, **kw):
+        return S(WebappIndexer).filter(**kw).cache(60)
+
+    def test_not_cached(self, raw):
+        raw.return_value = response([1])
+        S(WebappIndexer).raw()
+        S(WebappIndexer).cache(0).raw()
+        eq_(raw.call_count, 2)
+
+    def test_cached(self, raw):
+        raw.return_value = response([1, 2])
+        eq_(self.search(status=4).raw(), response([1, 2]))
+        hits = self.search(status=4).raw()
+        eq_(raw.call_count, 1)
+        eq_([h['_source']['id'] for h in hits['hits']['hits']], [1, 2])
+        # Only what we need from each hit is kept.
+        assert '_explanation' not in hits['hits']['hits'][0]
+
+    def test_keyed_by_query(self, raw):
+        raw.return_value = response([1])
+        self.search(status=4).raw()
+        self.search(status=2).raw()
+        self.search(status=4)[10:20].raw()
+        eq_(raw.call_count, 3)
+
+    def test_cache_kept_on_clone(self, raw):
+        raw.return_value = response([1])
+        self.search(status=4).filter(is_disabled=False).raw()
+        self.search(status=4).filter(is_disabled=False).raw()
+        eq_(raw.call_count, 1)
+
+    def test_invalidate(self, raw):
+        raw.return_value = response([1])
+        self.search(status=4).raw()
+        invalidate_search_cache()
+        self.search(status=4).raw()
+        eq_(raw.call_count, 2)
+
+    @mock.patch('mkt.search.utils.statsd')
+    def test_statsd(self, statsd, raw):
+        raw.return_value = response([1])
+        self.search(status=4).raw()
+        self.search(status=4).raw()
+        eq_([c[0][0] for c in statsd.incr.call_args_list],
+            ['search.cache.miss', 'search.cache.hit'])
+
+
+class TestNoBitsFilter(amo.tests.TestCase):
+
+    def test_filter(self):
+        qs = S(WebappIndexer).filter(features_mask__nobits=0x42)
+        eq_(qs._build_query()['filter'], {'script': {
+            'script': "(doc['features_mask'].value & mask) == 0",
+            'params': {'mask': 0x42},
+            '_cache': True,
+            '_cache_key': 'features_mask__nobits_42'}})
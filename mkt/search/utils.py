@@ -1,11 +1,97 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
 from elasticutils.contrib.django import S as eu_S
 from statsd import statsd
 
 
+# Bumped whenever the index alias is flipped, which changes the keys of all
+# the cached search results.
+CACHE_GENERATION_KEY = 'search:generation'
+
+# What we keep of each hit in cached results.
+CACHED_HIT_KEYS = ('_id', '_type', '_score', '_source', 'fields')
+
+
+def get_cache_generation():
+    generation = cache.get(CACHE_GENERATION_KEY)
+    if generation is None:
+        cache.add(CACHE_GENERATION_KEY, 0, 0)
+        generation = cache.get(CACHE_GENERATION_KEY) or 0
+    return generation
+
+
+def invalidate_search_cache():
+    """Makes every search cached by `S.cache` miss from now on."""
+    cache.add(CACHE_GENERATION_KEY, 0, 0)
+    cache.incr(CACHE_GENERATION_KEY)
+
+
 class S(eu_S):
+    cache_timeout = 0
+
+    def _clone(self, next_step=None):
+        new = super(S, self)._clone(next_step)
+        new.cache_timeout = self.cache_timeout
+        return new
+
+    def cache(self, timeout=None):
+        """
+        Returns a new S whose raw results are cached for `timeout` seconds,
+        `ES_SEARCH_CACHE_TIMEOUT` by default.
+
+        Results are keyed by the query sent to ES, so the same search
+        built from different requests is only run once in a while.
+        """
+        new = self._clone()
+        if timeout is None:
+            timeout = settings.ES_SEARCH_CACHE_TIMEOUT
+        new.cache_timeout = timeout
+        return new
+
+    def cache_key(self):
+        query = json.dumps([self._build_query(), self.get_indexes(),
+                            self.get_doctypes()], sort_keys=True)
+        return 'search:%s:%s' % (get_cache_generation(),
+                                 hashlib.md5(query).hexdigest())
 
     def raw(self):
+        if not self.cache_timeout:
+            return self._raw()
+
+        key = self.cache_key()
+        hits = cache.get(key)
+        if hits is not None:
+            statsd.incr('search.cache.hit')
+            return hits
+
+        statsd.incr('search.cache.miss')
+        hits = self._raw()
+        cached = dict(hits, hits=dict(hits.get('hits', {}), hits=[
+            dict((k, hit[k]) for k in CACHED_HIT_KEYS if k in hit)
+            for hit in hits.get('hits', {}).get('hits', [])]))
+        cache.set(key, cached, self.cache_timeout)
+        return hits
+
+    def _raw(self):
         with statsd.timer('search.raw'):
             hits = super(S, self).raw()
             statsd.timing('search.took', hits['took'])
             return hits
+
+    def process_filter_nobits(self, key, val, action):
+        """
+        Matches documents where none of the bits in `val` are set in the
+        integer field `key`, e.g. `filter(features_mask__nobits=mask)`.
+
+        The filter is cached by ES under a key of its own, so every search
+        with the same mask reuses the same bitsets.
+        """
+        return {'script': {
+            'script': "(doc['%s'].value & mask) == 0" % key,
+            'params': {'mask': val},
+            '_cache': True,
+            '_cache_key': '%s__nobits_%x' % (key, val)}}
@@ -132,6 +132,6 @@ def _filter_search(request, qs, query, filters=None, sorting=None,
 
     if profile:
         # Exclude apps that require any features we don't support.
-        qs = qs.filter(**profile.to_kwargs(prefix='features.has_'))
+        qs = qs.filter(features_mask__nobits=profile.to_missing_int())
 
     return qs
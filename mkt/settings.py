@@ -150,6 +150,9 @@ CELERY_ROUTES.update({
     # Images.
     'mkt.developers.tasks.resize_icon': {'queue': 'images'},
     'mkt.developers.tasks.resize_preview': {'queue': 'images'},
+
+    # Signing.
+    'lib.crypto.packaged.presign': {'queue': 'signing'},
 })
 
 # Paths.
@@ -211,6 +214,11 @@ MINIFY_MOZMARKET = True
 GEOIP_URL = ''
 GEOIP_DEFAULT_VAL = 'restofworld'
 GEOIP_DEFAULT_TIMEOUT = .2
+# Path to a local country database, built with `manage.py build_geoip_db`.
+# When set, it is used instead of the GeoIP server.
+GEOIP_DB_PATH = ''
+# How many recent lookups in the local database to keep in memory.
+GEOIP_CACHE_SIZE = 10000
 
 SENTRY_DSN = None
 
@@ -0,0 +1,28 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from lib.geoip import build_database
+
+
+class Command(BaseCommand):
+    """
+    Builds the local country database used when `GEOIP_DB_PATH` is set,
+    from a MaxMind GeoIP country CSV, i.e. rows like:
+
+        "1.0.0.0","1.0.0.255","16777216","16777471","AU","Australia"
+
+    """
+    args = '<csv file> <database file>'
+    help = 'Build the local GeoIP country database from a CSV file.'
+
+    def handle(self, *args, **kw):
+        if len(args) != 2:
+            raise CommandError('Usage: %s' % self.args)
+        source, path = args
+
+        with open(source, 'rb') as fp:
+            ranges = [(row[2], row[3], row[4]) for row in csv.reader(fp)
+                      if len(row) >= 5]
+        build_database(ranges, path)
+        self.stdout.write('Wrote %s ranges to %s.\n' % (len(ranges), path))
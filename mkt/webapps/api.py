@@ -24,7 +24,8 @@ from mkt.api.authentication import (RestAnonymousAuthentication,
                                     RestSharedSecretAuthentication)
 from mkt.api.authorization import (AllowAppOwner, AllowReadOnlyIfPublic,
                                    AllowReviewerReadOnly, AnyOf)
-from mkt.api.base import CORSMixin, MarketplaceView, SlugOrIdMixin
+from mkt.api.base import (CacheMixin, CORSMixin, MarketplaceView,
+                          SlugOrIdMixin)
 from mkt.api.exceptions import HttpLegallyUnavailable
 from mkt.api.fields import (LargeTextField, ReverseChoiceField,
                             TranslationSerializerField)
@@ -418,11 +419,12 @@ class SimpleAppSerializer(AppSerializer):
                    'supported_locales', 'weekly_downloads', 'upsold', 'tags',]
 
 
-class AppViewSet(CORSMixin, SlugOrIdMixin, MarketplaceView,
+class AppViewSet(CORSMixin, CacheMixin, SlugOrIdMixin, MarketplaceView,
                  viewsets.ModelViewSet):
     serializer_class = AppSerializer
     slug_field = 'app_slug'
     cors_allowed_methods = ('get', 'put', 'post', 'delete')
+    cache_tag = 'webapp'
     permission_classes = [AnyOf(AllowAppOwner, AllowReviewerReadOnly,
                                 AllowReadOnlyIfPublic)]
     authentication_classes = [RestOAuthAuthentication,
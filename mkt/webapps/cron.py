@@ -13,8 +13,9 @@ import amo
 from amo.utils import chunked
 
 from .models import Installed, Webapp
-from .tasks import (dump_user_installs, update_downloads, update_trending,
-                    zip_users)
+from .tasks import (dump_user_installs, flush_indexing_queue,
+                    update_downloads, update_region_install_counts,
+                    update_trending, zip_users)
 
 
 log = commonware.log.getLogger('z.cron')
@@ -33,6 +34,16 @@ def clean_old_signed(seconds=60 * 60):
             shutil.rmtree(full)
 
 
+@cronjobs.register
+def flush_app_indexing_queue():
+    """
+    Index the apps left in the indexing queue, in case the task scheduled
+    when they were queued ran before they were committed.
+    """
+    if settings.ES_INDEXING_QUEUE_ENABLED:
+        flush_indexing_queue()
+
+
 @cronjobs.register
 def update_app_trending():
     """
@@ -54,6 +65,14 @@ def update_app_trending():
         countdown += seconds_between
 
 
+@cronjobs.register
+def update_app_region_install_counts():
+    """Reconcile the per region install counts of all apps."""
+    ids = list(Webapp.with_deleted.values_list('id', flat=True))
+    for chunk in chunked(ids, 100):
+        update_region_install_counts.delay(chunk)
+
+
 @cronjobs.register
 def dump_user_installs_cron():
     """
@@ -0,0 +1,47 @@
+from optparse import make_option
+
+from django.core.files.storage import default_storage as storage
+from django.core.management.base import BaseCommand
+
+import amo
+from files.models import File
+from lib.crypto.packaged import queue_presign
+
+
+HELP = """\
+Queue signing of the public packaged app versions that haven't been signed
+yet, so they don't have to wait for it when first downloaded.
+
+To specify which webapps to sign:
+
+    `--webapps=1234,5678,...9012`
+
+If omitted, all packaged apps are looked at.
+"""
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option('--webapps',
+                    help='Webapp ids to process. Use commas to separate '
+                         'multiple ids.'),
+    )
+
+    help = HELP
+
+    def handle(self, *args, **kw):
+        files = (File.objects.filter(version__addon__type=amo.ADDON_WEBAPP,
+                                     version__addon__is_packaged=True,
+                                     status__in=[amo.STATUS_PUBLIC,
+                                                 amo.STATUS_BLOCKED])
+                 .exclude(version__addon__status=amo.STATUS_DELETED)
+                 .select_related('version'))
+        if kw['webapps']:
+            pks = [int(a.strip()) for a in kw['webapps'].split(',')]
+            files = files.filter(version__addon__in=pks)
+
+        queued = 0
+        for file_ in files.no_cache().iterator():
+            if not storage.exists(file_.signed_file_path):
+                queued += queue_presign(file_.version_id)
+        self.stdout.write('Queued signing of %s versions.\n' % queued)
@@ -12,8 +12,9 @@ from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.files.storage import default_storage as storage
 from django.core.urlresolvers import NoReverseMatch
-from django.db import models
-from django.db.models import Min, Q, signals as dbsignals
+from django.db import IntegrityError, models
+from django.db.models import Q, signals as dbsignals
+from django.db.models.query import prefetch_related_objects
 from django.dispatch import receiver
 
 import commonware.log
@@ -26,9 +27,10 @@ import amo
 import amo.models
 from access.acl import action_allowed, check_reviewer
 from addons import query
-from addons.models import (Addon, AddonDeviceType, AddonUpsell,
+from addons.models import (Addon, AddonDeviceType, AddonUpsell, AddonUser,
                            attach_categories, attach_devices, attach_prices,
-                           attach_tags, attach_translations, Category)
+                           attach_tags, attach_translations, Category,
+                           Preview)
 from addons.signals import version_changed
 from amo.decorators import skip_cache
 from amo.helpers import absolutify
@@ -45,11 +47,13 @@ from translations.fields import PurifiedField, save_signal
 from versions.models import Version
 
 from lib.crypto import packaged
+from lib.crypto.receipt import invalidate_verified
 from lib.iarc.client import get_iarc_client
 from lib.iarc.utils import (get_iarc_app_title, render_xml,
                             REVERSE_DESC_MAPPING, REVERSE_INTERACTIVES_MAPPING)
 
 import mkt
+from mkt.api.cache import purge_cache_tags
 from mkt.constants import APP_FEATURES, apps
 from mkt.regions.utils import parse_region
 from mkt.search.utils import S
@@ -725,8 +729,7 @@ class Webapp(Addon):
 
         Note: free and in-app are not included in this.
         """
-        excluded = set(self.addonexcludedregion
-                           .values_list('region', flat=True))
+        excluded = set(r.region for r in self.addonexcludedregion.all())
 
         if self.is_premium():
             all_regions = set(mkt.regions.ALL_REGION_IDS)
@@ -1478,6 +1481,7 @@ class WebappIndexer(MappingType, Indexable):
                             ('has_%s' % f.lower(), {'type': 'boolean'})
                             for f in APP_FEATURES)
                     },
+                    'features_mask': {'type': 'long'},
                     'has_public_stats': {'type': 'boolean'},
                     'icons': {
                         'type': 'object',
@@ -1606,22 +1610,188 @@ class WebappIndexer(MappingType, Indexable):
         """Extracts the ElasticSearch index document for this instance."""
         if obj is None:
             obj = cls.get_model().objects.no_cache().get(pk=pk)
+        return cls.extract_documents([pk], objs=[obj])[0]
 
+    @classmethod
+    def extract_documents(cls, ids, objs=None):
+        """
+        Extracts the ElasticSearch index documents for the apps in `ids`.
+
+        Everything the documents need is fetched once for all the apps, so
+        the number of queries doesn't grow with the number of apps. Pass
+        `objs` if the apps were already fetched through
+        `Webapp.indexing_transformer`.
+        """
+        from editors.models import EscalationQueue
+        from mkt.collections.models import CollectionMembership
+
+        if objs is None:
+            objs = Webapp.indexing_transformer(
+                Webapp.with_deleted.no_cache().filter(id__in=ids))
+        objs = list(objs)
+        if not objs:
+            return []
+        ids = [obj.id for obj in objs]
+
+        def rollup(rows):
+            """Groups `(app_id, value)` rows into a list of values per app."""
+            grouped = {}
+            for app_id, value in rows:
+                grouped.setdefault(app_id, []).append(value)
+            return grouped
+
+        # Every version, with their files. Current and latest versions also
+        # get their features and release notes.
+        all_versions = list(Version.objects.no_cache().filter(addon__in=ids))
+        versions = dict((v.id, v) for v in all_versions)
+        current_ids = filter(None, [obj._current_version_id for obj in objs])
+        for f in AppFeatures.objects.no_cache().filter(
+                version__in=current_ids):
+            if f.version_id in versions:
+                # Spare the reverse one-to-one lookup in `version.features`.
+                versions[f.version_id]._features_cache = f
+        for obj in objs:
+            for attr in ('_current_version', '_latest_version'):
+                version = versions.get(getattr(obj, attr + '_id'))
+                if version:
+                    version.addon = obj
+                    setattr(obj, attr, version)
+        amo.utils.attach_trans_dict(
+            Version, filter(None, [obj.current_version for obj in objs]))
+        all_versions = rollup((v.addon_id, v) for v in all_versions)
+
+        geodata = dict((g.addon_id, g) for g in
+                       Geodata.objects.no_cache().filter(addon__in=ids))
+        for obj in objs:
+            if obj.id not in geodata:
+                geodata[obj.id] = obj.geodata
+        amo.utils.attach_trans_dict(Geodata, geodata.values())
+
+        prefetch_related_objects(objs, ['addonexcludedregion',
+                                        'content_ratings'])
+        Addon.attach_prices(objs)
+        descriptors = dict(
+            (r.addon_id, r) for r in
+            RatingDescriptors.objects.no_cache().filter(addon__in=ids))
+        interactives = dict(
+            (r.addon_id, r) for r in
+            RatingInteractives.objects.no_cache().filter(addon__in=ids))
+        for obj in objs:
+            # Spare the reverse one-to-one lookups done by `get_descriptors`
+            # and `get_interactives`.
+            if obj.id in descriptors:
+                obj._rating_descriptors_cache = descriptors[obj.id]
+            if obj.id in interactives:
+                obj._rating_interactives_cache = interactives[obj.id]
+
+        escalated = set(EscalationQueue.objects.no_cache()
+                        .filter(addon__in=ids)
+                        .values_list('addon', flat=True))
+        categories = rollup(
+            Category.objects.no_cache().filter(addoncategory__addon__in=ids)
+            .values_list('addoncategory__addon', 'slug'))
+        collections = rollup(
+            (cms.app_id, {'id': cms.collection_id, 'order': cms.order})
+            for cms in CollectionMembership.objects.no_cache()
+                                           .filter(app__in=ids))
+        owners = rollup(
+            AddonUser.objects.no_cache()
+            .filter(addon__in=ids, role=amo.AUTHOR_ROLE_OWNER)
+            .values_list('addon', 'user'))
+        previews = rollup(
+            (p.addon_id, {'filetype': p.filetype, 'modified': p.modified,
+                          'id': p.id})
+            for p in Preview.objects.no_cache().filter(addon__in=ids))
+        price_tiers = dict(AddonPremium.objects.no_cache()
+                           .filter(addon__in=ids)
+                           .values_list('addon', 'price__name'))
+
+        upsells = dict(AddonUpsell.objects.no_cache().filter(free__in=ids)
+                       .values_list('free', 'premium'))
+        upsold = dict(
+            (app.id, app) for app in
+            Webapp.with_deleted.no_cache().filter(id__in=upsells.values()))
+        prefetch_related_objects(upsold.values(), ['addonexcludedregion'])
+        Addon.attach_prices(upsold.values())
+
+        # Installs per app and, to work out regional popularity, per region.
+        installs = dict(Installed.objects.no_cache().filter(addon__in=ids)
+                        .values_list('addon').annotate(models.Count('id')))
+        region_installs = {}
+        for app_id, region, count in (
+                AppRegionInstallCount.objects.filter(addon__in=ids)
+                .values_list('addon', 'region', 'installs')):
+            region_installs.setdefault(app_id, {})[region] = count
+
+        docs = []
+        for obj in objs:
+            d = cls._build_document(obj, geodata[obj.id])
+            app_versions = all_versions.get(obj.id, [])
+            d['category'] = categories.get(obj.id, [])
+            d['collection'] = (collections.get(obj.id, []) if obj.is_public
+                               else [])
+            if obj.id in descriptors:
+                d['content_descriptors'] = obj.get_descriptors(es=True)
+            else:
+                d['content_descriptors'] = []
+            if obj.id in interactives:
+                d['interactive_elements'] = obj.get_interactives(es=True)
+            else:
+                d['interactive_elements'] = []
+            d['is_escalated'] = obj.id in escalated
+            d['owners'] = owners.get(obj.id, [])
+            d['previews'] = previews.get(obj.id, [])
+            d['price_tier'] = price_tiers.get(obj.id)
+            reviewed = [v.reviewed for v in app_versions
+                        if v.reviewed is not None]
+            d['reviewed'] = min(reviewed) if reviewed else None
+            d['versions'] = [dict(version=v.version,
+                                  resource_uri=reverse_version(v))
+                             for v in app_versions]
+
+            upsell_obj = upsold.get(upsells.get(obj.id))
+            if upsell_obj and upsell_obj.is_public():
+                d['upsell'] = {
+                    'id': upsell_obj.id,
+                    'app_slug': upsell_obj.app_slug,
+                    'icon_url': upsell_obj.get_icon_url(128),
+                    # TODO: Store all localizations of upsell.name.
+                    'name': unicode(upsell_obj.name),
+                    'region_exclusions': upsell_obj.get_excluded_region_ids()
+                }
+
+            # Calculate regional popularity for "mature regions"
+            # (installs + reviews/installs from that region).
+            d['popularity'] = d['_boost'] = installs.get(obj.id, 0)
+            counts = region_installs.get(obj.id, {})
+            for region in mkt.regions.ALL_REGION_IDS:
+                cnt = counts.get(region, 0)
+                # Magic number (like all other scores up in this piece).
+                d['popularity_%s' % region] = d['popularity'] + cnt * 10
+                d['_boost'] += cnt * 10
+
+            # Bump the boost if the add-on is public.
+            if obj.status == amo.STATUS_PUBLIC:
+                d['_boost'] = max(d['_boost'], 1) * 4
+
+            docs.append(d)
+        return docs
+
+    @classmethod
+    def _build_document(cls, obj, geodata):
+        """
+        The part of the document that only needs `obj` and its geodata, once
+        `extract_documents` has attached everything else to it.
+        """
         latest_version = obj.latest_version
         version = obj.current_version
-        geodata = obj.geodata
-        features = (version.features.to_dict()
-                    if version else AppFeatures().to_dict())
-        is_escalated = obj.escalationqueue_set.exists()
+        features = version.features if version else AppFeatures()
 
         try:
             status = latest_version.statuses[0][1] if latest_version else None
         except IndexError:
             status = None
 
-        installed_ids = list(Installed.objects.filter(addon=obj)
-                             .values_list('id', flat=True))
-
         attrs = ('app_slug', 'average_daily_users', 'bayesian_rating',
                  'created', 'id', 'is_disabled', 'last_updated', 'modified',
                  'premium_type', 'status', 'type', 'uses_flash',
@@ -1631,25 +1801,17 @@ class WebappIndexer(MappingType, Indexable):
         d['app_type'] = obj.app_type_id
         d['author'] = obj.developer_name
         d['banner_regions'] = geodata.banner_regions_slugs()
-        d['category'] = list(obj.categories.values_list('slug', flat=True))
-        if obj.is_public:
-            d['collection'] = [{'id': cms.collection_id, 'order': cms.order}
-                               for cms in obj.collectionmembership_set.all()]
-        else:
-            d['collection'] = []
         d['content_ratings'] = (obj.get_content_ratings_by_body(es=True) or
                                 None)
-        d['content_descriptors'] = obj.get_descriptors(es=True)
         d['current_version'] = version.version if version else None
         d['default_locale'] = obj.default_locale
         d['description'] = list(
             set(string for _, string in obj.translations[obj.description_id]))
         d['device'] = getattr(obj, 'device_ids', [])
-        d['features'] = features
+        d['features'] = features.to_dict()
+        d['features_mask'] = features.to_int()
         d['has_public_stats'] = obj.public_stats
         d['icons'] = [{'size': icon_size} for icon_size in (16, 48, 64, 128)]
-        d['interactive_elements'] = obj.get_interactives(es=True)
-        d['is_escalated'] = is_escalated
         d['is_offline'] = getattr(obj, 'is_offline', False)
         if latest_version:
             d['latest_version'] = {
@@ -1669,24 +1831,11 @@ class WebappIndexer(MappingType, Indexable):
         d['name'] = list(
             set(string for _, string in obj.translations[obj.name_id]))
         d['name_sort'] = unicode(obj.name).lower()
-        d['owners'] = [au.user.id for au in
-                       obj.addonuser_set.filter(role=amo.AUTHOR_ROLE_OWNER)]
-        d['popularity'] = d['_boost'] = len(installed_ids)
-        d['previews'] = [{'filetype': p.filetype, 'modified': p.modified,
-                          'id': p.id} for p in obj.previews.all()]
-        try:
-            p = obj.addonpremium.price
-            d['price_tier'] = p.name
-        except AddonPremium.DoesNotExist:
-            d['price_tier'] = None
-
         d['ratings'] = {
             'average': obj.average_rating,
             'count': obj.total_reviews,
         }
         d['region_exclusions'] = obj.get_excluded_region_ids()
-        d['reviewed'] = obj.versions.filter(
-            deleted=False).aggregate(Min('reviewed')).get('reviewed__min')
         if version:
             d['supported_locales'] = filter(
                 None, version.supported_locales.split(','))
@@ -1694,20 +1843,6 @@ class WebappIndexer(MappingType, Indexable):
             d['supported_locales'] = []
 
         d['tags'] = getattr(obj, 'tag_list', [])
-        if obj.upsell and obj.upsell.premium.is_public():
-            upsell_obj = obj.upsell.premium
-            d['upsell'] = {
-                'id': upsell_obj.id,
-                'app_slug': upsell_obj.app_slug,
-                'icon_url': upsell_obj.get_icon_url(128),
-                # TODO: Store all localizations of upsell.name.
-                'name': unicode(upsell_obj.name),
-                'region_exclusions': upsell_obj.get_excluded_region_ids()
-            }
-
-        d['versions'] = [dict(version=v.version,
-                              resource_uri=reverse_version(v))
-                         for v in obj.versions.all()]
 
         # Handle our localized fields.
         for field in ('description', 'homepage', 'name', 'support_email',
@@ -1718,37 +1853,17 @@ class WebappIndexer(MappingType, Indexable):
                 in obj.translations[getattr(obj, '%s_id' % field)]
                 if string]
         if version:
-            amo.utils.attach_trans_dict(Version, [version])
             d['release_notes_translations'] = [
                 {'lang': to_language(lang), 'string': string}
                 for lang, string
                 in version.translations[version.releasenotes_id]]
         else:
             d['release_notes_translations'] = None
-        amo.utils.attach_trans_dict(Geodata, [geodata])
         d['banner_message_translations'] = [
             {'lang': to_language(lang), 'string': string}
             for lang, string
             in geodata.translations[geodata.banner_message_id]]
 
-        # Calculate regional popularity for "mature regions"
-        # (installs + reviews/installs from that region).
-        installs = dict(ClientData.objects.filter(installed__in=installed_ids)
-                        .annotate(region_counts=models.Count('region'))
-                        .values_list('region', 'region_counts').distinct())
-        for region in mkt.regions.ALL_REGION_IDS:
-            cnt = installs.get(region, 0)
-            if cnt:
-                # Magic number (like all other scores up in this piece).
-                d['popularity_%s' % region] = d['popularity'] + cnt * 10
-            else:
-                d['popularity_%s' % region] = len(installed_ids)
-            d['_boost'] += cnt * 10
-
-        # Bump the boost if the add-on is public.
-        if obj.status == amo.STATUS_PUBLIC:
-            d['_boost'] = max(d['_boost'], 1) * 4
-
         # Indices for each language. languages is a list of locales we want to
         # index with analyzer if the string's locale matches.
         for analyzer, languages in amo.SEARCH_ANALYZER_MAP.iteritems():
@@ -1791,8 +1906,10 @@ def update_search_index(sender, instance, **kw):
     from . import tasks
     if not kw.get('raw'):
         if instance.upsold and instance.upsold.free_id:
-            tasks.index_webapps.delay([instance.upsold.free_id])
-        tasks.index_webapps.delay([instance.id])
+            tasks.queue_index_webapps([instance.upsold.free_id])
+            purge_cache_tags('webapp:%s' % instance.upsold.free_id)
+        tasks.queue_index_webapps([instance.id])
+        purge_cache_tags('webapp:%s' % instance.id)
 
 
 @receiver(dbsignals.post_save, sender=AddonUpsell,
@@ -1802,9 +1919,17 @@ def update_search_index_upsell(sender, instance, **kw):
     # upsell/upsold properties in ES.
     from . import tasks
     if instance.free:
-        tasks.index_webapps.delay([instance.free.id])
+        tasks.queue_index_webapps([instance.free.id])
     if instance.premium:
-        tasks.index_webapps.delay([instance.premium.id])
+        tasks.queue_index_webapps([instance.premium.id])
+
+
+@receiver(dbsignals.post_save, sender=Category,
+          dispatch_uid='category.purge.api.cache')
+@receiver(dbsignals.post_delete, sender=Category,
+          dispatch_uid='category.delete.purge.api.cache')
+def purge_category_api_cache(sender, instance, **kw):
+    purge_cache_tags('category', 'category:%s' % instance.pk)
 
 
 models.signals.pre_save.connect(save_signal, sender=Webapp,
@@ -1857,6 +1982,81 @@ class Installed(amo.models.ModelBase):
         unique_together = ('addon', 'user', 'install_type', 'client_data')
 
 
+@receiver(models.signals.post_delete, sender=Installed,
+          dispatch_uid='installed_verified_receipts')
+def installed_deleted(sender, instance, **kw):
+    """Receipts of a removed install no longer verify."""
+    invalidate_verified(instance.addon_id, [instance.uuid])
+
+
+class AppRegionInstallCount(models.Model):
+    """
+    How many times an app was installed from each region, as recorded by
+    `ClientData`. Kept up to date as apps get installed and uninstalled, and
+    reconciled with `Installed` by the `update_region_install_counts` cron.
+    """
+    addon = models.ForeignKey('addons.Addon')
+    region = models.PositiveIntegerField()
+    installs = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'app_region_install_counts'
+        unique_together = ('addon', 'region')
+
+    @classmethod
+    def add(cls, addon_id, region, count=1):
+        """Add (or, with a negative `count`, take away) installs."""
+        qs = cls.objects.filter(addon=addon_id, region=region)
+        if count < 0:
+            qs.filter(installs__gte=-count).update(
+                installs=models.F('installs') + count)
+        elif not qs.update(installs=models.F('installs') + count):
+            try:
+                cls.objects.create(addon_id=addon_id, region=region,
+                                   installs=count)
+            except IntegrityError:
+                # Someone else just created it.
+                qs.update(installs=models.F('installs') + count)
+
+
+def installed_region(instance):
+    """The region `instance`, an `Installed`, was installed from, if known."""
+    if instance.client_data_id:
+        try:
+            return instance.client_data.region
+        except ClientData.DoesNotExist:
+            pass
+
+
+@receiver(models.signals.post_save, sender=Installed,
+          dispatch_uid='installed_region_install_counts')
+def installed_saved(sender, instance, created, **kw):
+    if created and not kw.get('raw'):
+        region = installed_region(instance)
+        if region is not None:
+            AppRegionInstallCount.add(instance.addon_id, region)
+
+
+@receiver(models.signals.post_delete, sender=Installed,
+          dispatch_uid='uninstalled_region_install_counts')
+def installed_removed(sender, instance, **kw):
+    region = installed_region(instance)
+    if region is not None:
+        AppRegionInstallCount.add(instance.addon_id, region, -1)
+
+
+class IndexingQueue(models.Model):
+    """
+    Apps that changed and are waiting to be indexed, see
+    `mkt.webapps.tasks.queue_index_webapps`.
+    """
+    addon_id = models.PositiveIntegerField()
+    created = models.DateTimeField(default=datetime.datetime.now)
+
+    class Meta:
+        db_table = 'webapps_indexing_queue'
+
+
 @receiver(models.signals.post_save, sender=Installed)
 def add_uuid(sender, **kw):
     if not kw.get('raw'):
@@ -2116,11 +2316,20 @@ class AppFeatures(amo.models.ModelBase, DynamicBoolFieldsMixin):
             '457eab.23.1'
 
         """
-        profile = ''.join('1' if getattr(self, f) else '0'
-                          for f in self._fields())
-        return '%x.%s.%s' % (int(profile, 2), len(profile),
+        return '%x.%s.%s' % (self.to_int(), len(self._fields()),
                              settings.APP_FEATURES_VERSION)
 
+    def to_int(self):
+        """
+        The flags as an integer bitfield, i.e. the profile part of
+        `to_signature`, which is what we index to filter apps by the features
+        a device supports.
+        """
+        features = 0
+        for f in self._fields():
+            features = features << 1 | bool(getattr(self, f))
+        return features
+
 
 # Add a dynamic field to `AppFeatures` model for each buchet feature.
 for k, v in APP_FEATURES.iteritems():
@@ -9,13 +9,16 @@ import time
 
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
 from django.core.files.storage import default_storage as storage
+from django.db.models import Count
 from django.forms import ValidationError
 from django.template import Context, loader
 
 import pytz
 from celery.exceptions import RetryTaskError
 from celeryutils import task
+from django_statsd.clients import statsd
 from pyelasticsearch.exceptions import ElasticHttpNotFoundError
 from test_utils import RequestFactory
 from tower import ugettext as _
@@ -25,7 +28,8 @@ from addons.models import Addon
 from amo.decorators import write
 from amo.helpers import absolutify
 from amo.urlresolvers import reverse
-from amo.utils import chunked, days_ago, JSONEncoder, send_mail_jinja
+from amo.utils import (chunked, days_ago, JSONEncoder, send_mail_jinja,
+                        update_in_bulk)
 from editors.models import RereviewQueue
 from files.models import FileUpload
 from files.utils import WebAppParser
@@ -35,9 +39,12 @@ from users.models import UserProfile
 from users.utils import get_task_user
 
 import mkt
+from mkt.api.cache import purge_cache_tags
 from mkt.constants.regions import RESTOFWORLD
 from mkt.developers.tasks import _fetch_manifest, fetch_icon, validator
-from mkt.webapps.models import AppManifest, Webapp, WebappIndexer
+from mkt.webapps.models import (AppManifest, AppRegionInstallCount,
+                                IndexingQueue, Installed, Trending, Webapp,
+                                WebappIndexer)
 from mkt.webapps.utils import get_locale_properties
 
 
@@ -302,12 +309,93 @@ def index_webapps(ids, **kw):
     indices = get_indices(index)
 
     es = WebappIndexer.get_es(urls=settings.ES_URLS)
-    qs = Webapp.indexing_transformer(Webapp.with_deleted.no_cache().filter(
-        id__in=ids))
-    for obj in qs:
-        doc = WebappIndexer.extract_document(obj.id, obj)
+    for doc in WebappIndexer.extract_documents(ids):
         for idx in indices:
-            WebappIndexer.index(doc, id_=obj.id, es=es, index=idx)
+            WebappIndexer.index(doc, id_=doc['id'], es=es, index=idx)
+    # The API responses built from ES are only up to date once indexed.
+    purge_cache_tags(*['webapp:%s' % id_ for id_ in ids])
+
+
+@task
+@write
+def update_region_install_counts(ids, **kw):
+    """
+    Bring the `AppRegionInstallCount` of the apps in `ids` back in line with
+    their installs.
+    """
+    task_log.info('Updating region install counts for apps %s-%s. [%s]' %
+                  (ids[0], ids[-1], len(ids)))
+    counts = dict(((app_id, region), count) for app_id, region, count in
+                  Installed.objects.filter(addon__in=ids,
+                                           client_data__region__isnull=False)
+                  .values_list('addon', 'client_data__region')
+                  .annotate(Count('id')))
+
+    for c in AppRegionInstallCount.objects.filter(addon__in=ids):
+        count = counts.pop((c.addon_id, c.region), 0)
+        if not count:
+            c.delete()
+        elif count != c.installs:
+            AppRegionInstallCount.objects.filter(pk=c.pk).update(
+                installs=count)
+
+    AppRegionInstallCount.objects.bulk_create(
+        [AppRegionInstallCount(addon_id=app_id, region=region, installs=n)
+         for (app_id, region), n in counts.items()])
+
+
+def queue_index_webapps(ids):
+    """
+    Index the apps in `ids` soon.
+
+    With `ES_INDEXING_QUEUE_ENABLED`, the apps are queued and indexed in bulk
+    along with every other app changed in the next
+    `ES_INDEXING_QUEUE_WINDOW` seconds, however many times they change.
+    Otherwise they are indexed right away.
+    """
+    if not settings.ES_INDEXING_QUEUE_ENABLED:
+        index_webapps.delay(ids)
+        return
+
+    IndexingQueue.objects.bulk_create(
+        [IndexingQueue(addon_id=id_) for id_ in ids])
+    # Only the first app queued in a window schedules the flush.
+    window = settings.ES_INDEXING_QUEUE_WINDOW
+    if cache.add('webapps:indexing-queue:flush', 1, window):
+        flush_indexing_queue.apply_async(countdown=window)
+
+
+@task(acks_late=True)
+@write
+def flush_indexing_queue(**kw):
+    """Index all the apps waiting in the indexing queue."""
+    queued = list(IndexingQueue.objects.values_list('id', 'addon_id',
+                                                    'created'))
+    statsd.gauge('webapps.indexing_queue.depth', len(queued))
+    if not queued:
+        return
+
+    ids = sorted(set(q[1] for q in queued))
+    lag = datetime.datetime.now() - min(q[2] for q in queued)
+    statsd.timing('webapps.indexing_queue.lag',
+                  lag.days * 86400000 + lag.seconds * 1000 +
+                  lag.microseconds / 1000)
+    task_log.info('Indexing %s queued apps.' % len(ids))
+
+    # Note: If reindexing is currently occurring, `get_indices` will return
+    # more than one index.
+    indices = get_indices(WebappIndexer.get_index())
+    es = WebappIndexer.get_es(urls=settings.ES_URLS)
+    for chunk in chunked(ids, 100):
+        docs = WebappIndexer.extract_documents(chunk)
+        for idx in indices:
+            WebappIndexer.bulk_index(docs, es=es, index=idx)
+
+    # Only delete the rows read above: anything queued while we were
+    # indexing, or committed late by a longer transaction with a lower id,
+    # waits for the next flush.
+    for chunk in chunked([q[0] for q in queued], 1000):
+        IndexingQueue.objects.filter(id__in=chunk).delete()
 
 
 @task(acks_late=True)
@@ -567,53 +655,63 @@ def import_manifests(ids, **kw):
                               '%s: %s' % (app.id, version.id, e))
 
 
-def _get_trending(app_id, region=None):
+def _get_installs(client, ids, start=None, end=None, regions=()):
     """
-    Calculate trending.
-
-    a = installs from 7 days ago to now
-    b = installs from 28 days ago to 8 days ago, averaged per week
-
-    trending = (a - b) / b if a > 100 and b > 1 else 0
+    Returns the installs of each app in `ids` between `start` and `end`, or
+    ever without them, overall and in each of `regions`.
 
+    This is a single Monolith query, with one terms_stats facet per region.
+    The result looks like `{region_id: {app_id: installs}}`, with region 0
+    for the overall installs, or is None if Monolith couldn't be reached.
     """
-    client = get_monolith_client()
+    ids = list(ids)
+    filters = [{'terms': {'app-id': ids}}]
+    if start and end:
+        filters.append({'range': {'date': {'gte': start.isoformat(),
+                                           'lte': end.isoformat()}}})
+
+    def facet(*extra):
+        return {'terms_stats': {'key_field': 'app-id',
+                                'value_field': 'app_installs',
+                                'size': len(ids)},
+                'facet_filter': {'and': filters + list(extra)}}
+
+    facets = {'region-0': facet()}
+    for region in regions:
+        facets['region-%s' % region.id] = facet(
+            {'term': {'region': region.slug}})
+
+    # The monolith client lib doesn't handle this for us so we send a raw ES
+    # query to Monolith.
+    try:
+        resp = client.raw({'query': {'match_all': {}}, 'facets': facets,
+                           'size': 0})
+    except Exception as e:
+        task_log.info('Call to ES failed: {0}'.format(e))
+        return None
 
-    kwargs = {'app-id': app_id}
-    if region:
-        kwargs['region'] = region.slug
+    installs = {}
+    for region_id in [0] + [region.id for region in regions]:
+        terms = (resp.get('facets', {}).get('region-%s' % region_id, {})
+                     .get('terms', []))
+        installs[region_id] = dict((int(t['term']), t['total'])
+                                   for t in terms)
+    return installs
 
-    today = datetime.datetime.today()
 
-    # If we query monolith with interval=week and the past 7 days
-    # crosses a Monday, Monolith splits the counts into two. We want
-    # the sum over the past week so we need to `sum` these.
-    try:
-        count_1 = sum(
-            c['count'] for c in
-            client('app_installs', days_ago(7), today, 'week', **kwargs)
-            if c.get('count'))
-    except ValueError as e:
-        task_log.info('Call to ES failed: {0}'.format(e))
-        count_1 = 0
+def _get_trending(recent, prior):
+    """
+    Calculate trending.
 
-    # If count_1 isn't more than 100, stop here to avoid extra Monolith calls.
-    if not count_1 > 100:
-        return 0.0
+    a = installs from 7 days ago to now (`recent`)
+    b = installs from 28 days ago to 8 days ago (`prior`), averaged per week
 
-    # Get the average installs for the prior 3 weeks. Don't use the `len` of
-    # the returned counts because of week boundaries.
-    try:
-        count_3 = sum(
-            c['count'] for c in
-            client('app_installs', days_ago(28), days_ago(8), 'week', **kwargs)
-            if c.get('count')) / 3
-    except ValueError as e:
-        task_log.info('Call to ES failed: {0}'.format(e))
-        count_3 = 0
+    trending = (a - b) / b if a > 100 and b > 1 else 0
 
-    if count_3 > 1:
-        return (count_1 - count_3) / count_3
+    """
+    prior = prior / 3.0
+    if recent > 100 and prior > 1:
+        return (recent - prior) / prior
     else:
         return 0.0
 
@@ -621,95 +719,76 @@ def _get_trending(app_id, region=None):
 @task
 @write
 def update_trending(ids, **kw):
-    count = 0
-    times = []
-
-    for app in Webapp.objects.filter(id__in=ids).no_transforms():
-
-        count += 1
-        t_start = time.time()
+    t_start = time.time()
+    ids = list(Webapp.objects.filter(id__in=ids)
+                             .values_list('id', flat=True))
+    if not ids:
+        return
 
-        # Calculate global trending, then per-region trending below.
-        value = _get_trending(app.id)
-        if value:
-            trending, created = app.trending.get_or_create(
-                region=0, defaults={'value': value})
-            if not created:
-                trending.update(value=value)
+    # Global trending is stored as region 0, next to per-region trending.
+    client = get_monolith_client()
+    today = datetime.datetime.today()
+    regions = mkt.regions.REGIONS_DICT.values()
+    recent = _get_installs(client, ids, days_ago(7), today, regions)
+    prior = _get_installs(client, ids, days_ago(28), days_ago(8), regions)
+    if recent is None or prior is None:
+        return
 
-        for region in mkt.regions.REGIONS_DICT.values():
-            value = _get_trending(app.id, region)
+    values = {}
+    for region_id, installs in recent.items():
+        for app_id, count in installs.items():
+            value = _get_trending(count, prior[region_id].get(app_id, 0))
             if value:
-                trending, created = app.trending.get_or_create(
-                    region=region.id, defaults={'value': value})
-                if not created:
-                    trending.update(value=value)
+                values[(app_id, region_id)] = value
 
-        times.append(time.time() - t_start)
+    existing = dict(((t.addon_id, t.region), t) for t in
+                    Trending.objects.no_cache().filter(addon__in=ids))
+    changed = [t for key, t in existing.items()
+               if key in values and t.value != values[key]]
+    update_in_bulk(Trending, dict(
+        (t.id, {'value': values[(t.addon_id, t.region)]}) for t in changed))
+    Trending.objects.bulk_create(
+        [Trending(addon_id=key[0], region=key[1], value=values[key])
+         for key in values if key not in existing])
+    # All our updates were sql, so invalidate manually.
+    Trending.objects.invalidate(*changed)
 
-    task_log.info('Trending calculated for %s apps. Avg time overall: '
-                  '%0.2fs' % (count, sum(times) / count))
+    task_log.info('Trending calculated for %s apps in %0.2fs.'
+                  % (len(ids), time.time() - t_start))
 
 
 @task
 @write
 def update_downloads(ids, **kw):
+    apps = list(Webapp.objects.no_cache().filter(id__in=ids).no_transforms())
+    if not apps:
+        return
+
     client = get_monolith_client()
     today = datetime.date.today()
-    count = 0
+    ids = [app.id for app in apps]
+    weekly = _get_installs(client, ids, days_ago(7).date(), today)
+    total = _get_installs(client, ids)
+    if weekly is None or total is None:
+        return
 
-    for app in Webapp.objects.filter(id__in=ids).no_transforms():
+    updates = {}
+    for app in apps:
+        counts = {'weekly_downloads': int(weekly[0].get(app.id, 0)),
+                  'total_downloads': int(total[0].get(app.id, 0))}
+        changed = dict((k, v) for k, v in counts.items()
+                       if getattr(app, k) != v)
+        if changed:
+            updates[app.id] = changed
 
-        kwargs = {'app-id': app.id}
+    update_in_bulk(Webapp, updates)
+    # All our updates were sql, so invalidate manually.
+    Webapp.objects.invalidate(*[app for app in apps if app.id in updates])
 
-        # Get weekly downloads.
-        #
-        # If we query monolith with interval=week and the past 7 days
-        # crosses a Monday, Monolith splits the counts into two. We want
-        # the sum over the past week so we need to `sum` these.
-        try:
-            weekly = sum(
-                c['count'] for c in
-                client('app_installs', days_ago(7).date(), today, 'week',
-                       **kwargs)
-                if c.get('count'))
-        except ValueError as e:
-            task_log.info('Call to ES failed: {0}'.format(e))
-            weekly = 0
-
-        # Get total downloads.
-        #
-        # The monolith client lib doesn't handle this for us so we send a raw
-        # ES query to Monolith.
-        query = {'query': {'match_all': {}},
-                 'facets': {
-                     'installs': {
-                         'statistical': {'field': 'app_installs'},
-                         'facet_filter': {'term': kwargs}}},
-                 'size': 0}
-        try:
-            resp = client.raw(query)
-            total = resp.get('facets', {}).get('installs', {}).get('total', 0)
-        except Exception as e:
-            task_log.info('Call to ES failed: {0}'.format(e))
-            total = 0
-
-        # Update Webapp object, if needed.
-        update = False
-        signal = False
-        if weekly != app.weekly_downloads:
-            update = True
-            signal = True
-        if total != app.total_downloads:
-            update = True
-
-        if update:
-            # Note: Calling `update` will trigger a reindex on the app if
-            # `_signal` is True. Since we only index `weekly_downloads`, we
-            # can skip reindexing if this hasn't changed.
-            count += 1
-            app.update(weekly_downloads=weekly, total_downloads=total,
-                       _signal=signal)
+    # Since we only index `weekly_downloads`, we can skip reindexing the
+    # apps where this hasn't changed.
+    queue_index_webapps([app_id for app_id, data in updates.items()
+                         if 'weekly_downloads' in data])
 
     task_log.info('App downloads updated for %s out of %s apps.'
-                  % (count, len(ids)))
+                  % (len(updates), len(ids)))
@@ -1,6 +1,5 @@
 # -*- coding: utf-8 -*-
 import os
-from datetime import date
 
 from django.conf import settings
 from django.core.files.storage import default_storage as storage
@@ -32,42 +31,29 @@ class TestWeeklyDownloads(amo.tests.TestCase):
 
     def get_mocks(self):
         """
-        Returns 2 mocks as a tuple.
-
-        First is the `client(...)` call to get histogram data for last 7 days.
-        Second is the `client.raw(...)` call to get the totals data.
+        Returns the `client.raw(...)` responses as a tuple, the first for the
+        installs of the last 7 days and the second for the total installs.
         """
-        weekly = [
-            {'count': 122.0, 'date': date(2013, 12, 30)},
-            {'count': 133.0, 'date': date(2014, 1, 6)},
-        ]
-        raw = {
-            'facets': {
-                'installs': {
-                    u'_type': u'statistical',
-                    u'count': 49,
-                    u'max': 224.0,
-                    u'mean': 135.46938775510205,
-                    u'min': 1.0,
-                    u'std_deviation': 67.41619197523309,
-                    u'sum_of_squares': 1121948.0,
-                    u'total': 6638.0,
-                    u'variance': 4544.9429404414832
+        def raw(total):
+            return {
+                'facets': {
+                    'region-0': {
+                        u'_type': u'terms_stats',
+                        u'terms': [{u'term': self.app.pk, u'count': 49,
+                                    u'total': total}],
+                    }
+                },
+                u'hits': {
+                    u'hits': [], u'max_score': 1.0, u'total': 46957
                 }
-            },
-            u'hits': {
-                u'hits': [], u'max_score': 1.0, u'total': 46957
             }
-        }
 
-        return (weekly, raw)
+        return (raw(255.0), raw(6638.0))
 
     @mock.patch('mkt.webapps.tasks.get_monolith_client')
     def test_weekly_downloads(self, _mock):
-        weekly, raw = self.get_mocks()
         client = mock.Mock()
-        client.return_value = weekly
-        client.raw.return_value = raw
+        client.raw.side_effect = self.get_mocks()
         _mock.return_value = client
 
         eq_(self.app.weekly_downloads, 0)
@@ -78,6 +64,19 @@ class TestWeeklyDownloads(amo.tests.TestCase):
         self.app.reload()
         eq_(self.app.weekly_downloads, 255)
         eq_(self.app.total_downloads, 6638)
+        eq_(client.raw.call_count, 2)
+
+    @mock.patch('mkt.webapps.tasks.queue_index_webapps')
+    @mock.patch('mkt.webapps.tasks.get_monolith_client')
+    def test_reindex_changed_only(self, _mock, queue_mock):
+        other = Webapp.objects.create(type=amo.ADDON_WEBAPP,
+                                      status=amo.STATUS_PUBLIC)
+        client = mock.Mock()
+        client.raw.side_effect = self.get_mocks()
+        _mock.return_value = client
+
+        update_downloads([self.app.pk, other.pk])
+        queue_mock.assert_called_with([self.app.pk])
 
     @mock.patch('mkt.webapps.tasks.get_monolith_client')
     def test_monolith_error(self, _mock):
@@ -153,7 +152,15 @@ class TestUpdateTrending(amo.tests.TestCase):
                                          status=amo.STATUS_PUBLIC)
 
     @mock.patch('mkt.webapps.tasks._get_trending')
-    def test_trending_saved(self, _mock):
+    @mock.patch('mkt.webapps.tasks.get_monolith_client')
+    def test_trending_saved(self, client_mock, _mock):
+        client = mock.Mock()
+        client.raw.return_value = {'facets': dict(
+            ('region-%s' % region_id,
+             {'terms': [{'term': self.app.pk, 'total': 255.0}]})
+            for region_id in [0] + mkt.regions.ALL_REGION_IDS)}
+        client_mock.return_value = client
+
         _mock.return_value = 12.0
         update_app_trending()
 
@@ -168,36 +175,21 @@ class TestUpdateTrending(amo.tests.TestCase):
         for region in mkt.regions.REGIONS_DICT.values():
             eq_(self.app.get_trending(region=region), 2.0)
 
-    @mock.patch('mkt.webapps.tasks.get_monolith_client')
-    def test_get_trending(self, _mock):
-        client = mock.Mock()
-        client.return_value = [
-            {'count': 133.0, 'date': date(2013, 8, 26)},
-            {'count': 122.0, 'date': date(2013, 9, 2)},
-        ]
-        _mock.return_value = client
-
-        # 1st week count: 133 + 122 = 255
-        # Prior 3 weeks get averaged: (133 + 122) / 3 = 85
+    def test_get_trending(self):
+        # 1st week count: 255
+        # Prior 3 weeks get averaged: 255 / 3 = 85
         # (255 - 85) / 85 = 2.0
-        eq_(_get_trending(self.app.id), 2.0)
+        eq_(_get_trending(255.0, 255.0), 2.0)
 
-    @mock.patch('mkt.webapps.tasks.get_monolith_client')
-    def test_get_trending_threshold(self, _mock):
-        client = mock.Mock()
-        client.return_value = [
-            {'count': 49.0, 'date': date(2013, 8, 26)},
-            {'count': 50.0, 'date': date(2013, 9, 2)},
-        ]
-        _mock.return_value = client
-
-        # 1st week count: 49 + 50 = 99
+    def test_get_trending_threshold(self):
+        # 1st week count: 99
         # 99 is less than 100 so we return 0.0.
-        eq_(_get_trending(self.app.id), 0.0)
+        eq_(_get_trending(99.0, 255.0), 0.0)
 
     @mock.patch('mkt.webapps.tasks.get_monolith_client')
-    def test_get_trending_monolith_error(self, _mock):
+    def test_trending_monolith_error(self, _mock):
         client = mock.Mock()
-        client.side_effect = ValueError
+        client.raw.side_effect = ValueError
         _mock.return_value = client
-        eq_(_get_trending(self.app.id), 0.0)
+        update_app_trending()
+        eq_(self.app.get_trending(), 0.0)
@@ -12,6 +12,7 @@ from datetime import datetime, timedelta
 from django.conf import settings
 from django.core import mail
 from django.core.files.storage import default_storage as storage
+from django.db import connection, reset_queries
 from django.db.models.signals import post_delete, post_save
 from django.test.utils import override_settings
 from django.utils.translation import ugettext_lazy as _
@@ -37,18 +38,21 @@ from lib.crypto.tests import mock_sign
 from lib.iarc.utils import (DESC_MAPPING, INTERACTIVES_MAPPING,
                             REVERSE_DESC_MAPPING, REVERSE_INTERACTIVES_MAPPING)
 from market.models import AddonPremium, Price
+from stats.models import ClientData
 from users.models import UserProfile
 from versions.models import update_status, Version
 
 import mkt
 from mkt.constants import apps
+from mkt.constants.features import FeatureProfile
 from mkt.developers.models import (AddonPaymentAccount, PaymentAccount,
                                    SolitudeSeller)
 from mkt.site.fixtures import fixture
 from mkt.site.tests import DynamicBoolFieldsTestMixin
 from mkt.submit.tests.test_views import BasePackagedAppTest, BaseWebAppTest
 from mkt.webapps.models import (AddonExcludedRegion, AppFeatures, AppManifest,
-                                ContentRating, Geodata, get_excluded_in,
+                                AppRegionInstallCount, ContentRating,
+                                Geodata, get_excluded_in,
                                 IARCInfo, Installed, RatingDescriptors,
                                 RatingInteractives, Webapp, WebappIndexer)
 
@@ -1699,6 +1703,13 @@ class TestAppFeatures(DynamicBoolFieldsTestMixin, amo.tests.TestCase):
         self.af.set_flags(signature)
         self._check(self.af)
 
+    def test_int_parity(self):
+        self._flag()
+        features = self.app.current_version.features
+        eq_(features.to_int(), int(features.to_signature().split('.')[0], 16))
+        eq_(sorted(FeatureProfile.from_int(features.to_int()).to_list()),
+            sorted(f.lower() for f in self.flags))
+
     def test_bad_data(self):
         self.af.set_flags('foo')
         self.af.set_flags('<script>')
@@ -1788,6 +1799,8 @@ class TestWebappIndexer(amo.tests.TestCase):
         obj, doc = self._get_doc()
         for k, v in doc['features'].iteritems():
             eq_(v, k in enabled)
+        eq_(doc['features_mask'],
+            self.app.current_version.features.to_int())
 
     def test_extract_regions(self):
         self.app.addonexcludedregion.create(region=mkt.regions.BR.id)
@@ -1856,6 +1869,87 @@ class TestWebappIndexer(amo.tests.TestCase):
         eq_(doc['release_notes_translations'][1],
             {'lang': 'fr', 'string': release_notes['fr']})
 
+    def test_extract_popularity(self):
+        user = UserProfile.objects.create(email='f@f.com')
+        client_data = ClientData.objects.create(region=mkt.regions.BR.id)
+        Installed.objects.create(addon=self.app, user=user,
+                                 client_data=client_data)
+        Installed.objects.create(addon=self.app, user=user)
+        obj, doc = self._get_doc()
+        eq_(doc['popularity'], 2)
+        eq_(doc['popularity_%s' % mkt.regions.BR.id], 12)
+        eq_(doc['popularity_%s' % mkt.regions.US.id], 2)
+        eq_(doc['_boost'], 12 * 4)
+
+    def test_extract_documents(self):
+        other = app_factory()
+        EscalationQueue.objects.create(addon=other)
+        docs = dict((doc['id'], doc) for doc in
+                    WebappIndexer.extract_documents([self.app.pk, other.pk]))
+        eq_(sorted(docs), sorted([self.app.pk, other.pk]))
+        eq_(docs[self.app.pk]['is_escalated'], False)
+        eq_(docs[other.pk]['is_escalated'], True)
+        eq_(docs[other.pk]['app_slug'], other.app_slug)
+        eq_(docs[other.pk]['versions'],
+            [{'version': v.version,
+              'resource_uri': reverse('version-detail',
+                                      kwargs={'pk': v.pk})}
+             for v in other.versions.all()])
+
+    def test_extract_documents_num_queries(self):
+        ids = [self.app.pk] + [app_factory().pk for i in range(3)]
+        # Warm up anything the apps set up on first access.
+        WebappIndexer.extract_documents(ids)
+
+        def count(ids):
+            objs = list(Webapp.indexing_transformer(
+                Webapp.with_deleted.no_cache().filter(id__in=ids)))
+            connection.use_debug_cursor = True
+            try:
+                reset_queries()
+                WebappIndexer.extract_documents(ids, objs=objs)
+                return len(connection.queries)
+            finally:
+                connection.use_debug_cursor = None
+
+        eq_(count(ids[:1]), count(ids))
+
+
+class TestAppRegionInstallCount(amo.tests.TestCase):
+
+    def setUp(self):
+        self.app = app_factory()
+        self.user = UserProfile.objects.create(email='f@f.com')
+        self.client_data = ClientData.objects.create(region=mkt.regions.BR.id)
+
+    def installs(self):
+        return dict(AppRegionInstallCount.objects.filter(addon=self.app)
+                    .values_list('region', 'installs'))
+
+    def test_install(self):
+        Installed.objects.create(addon=self.app, user=self.user,
+                                 client_data=self.client_data)
+        eq_(self.installs(), {mkt.regions.BR.id: 1})
+
+        other = UserProfile.objects.create(email='g@g.com')
+        Installed.objects.create(addon=self.app, user=other,
+                                 client_data=self.client_data)
+        eq_(self.installs(), {mkt.regions.BR.id: 2})
+
+    def test_install_no_region(self):
+        Installed.objects.create(addon=self.app, user=self.user)
+        eq_(self.installs(), {})
+
+    def test_uninstall(self):
+        installed = Installed.objects.create(addon=self.app, user=self.user,
+                                             client_data=self.client_data)
+        installed.delete()
+        eq_(self.installs(), {mkt.regions.BR.id: 0})
+
+        # Counts never go below zero.
+        AppRegionInstallCount.add(self.app.pk, mkt.regions.BR.id, -1)
+        eq_(self.installs(), {mkt.regions.BR.id: 0})
+
 
 class TestRatingDescriptors(DynamicBoolFieldsTestMixin, amo.tests.TestCase):
 
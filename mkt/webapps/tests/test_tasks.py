@@ -7,6 +7,7 @@ import stat
 from copy import deepcopy
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.storage import default_storage as storage
 from django.core import mail
 from django.core.management import call_command
@@ -23,13 +24,18 @@ from amo.helpers import absolutify
 from devhub.models import ActivityLog
 from editors.models import RereviewQueue
 from files.models import File, FileUpload
+from stats.models import ClientData
 from users.models import UserProfile
 from versions.models import Version
 
+import mkt
 from mkt.site.fixtures import fixture
-from mkt.webapps.models import Webapp
+from mkt.webapps.models import (AppRegionInstallCount, IndexingQueue,
+                                Installed, Webapp)
 from mkt.webapps.tasks import (dump_app, dump_user_installs,
+                               flush_indexing_queue, queue_index_webapps,
                                update_developer_name,
+                               update_region_install_counts,
                                notify_developers_of_failure, update_manifests,
                                zip_apps)
 
@@ -586,6 +592,89 @@ class TestDumpUserInstalls(amo.tests.TestCase):
         eq_(installed['id'], self.app.id)
 
 
+class TestIndexingQueue(amo.tests.TestCase):
+
+    def setUp(self):
+        self.app = amo.tests.app_factory()
+        IndexingQueue.objects.all().delete()
+        cache.clear()
+
+    @mock.patch('mkt.webapps.tasks.index_webapps.delay')
+    def test_disabled(self, index_webapps):
+        with self.settings(ES_INDEXING_QUEUE_ENABLED=False):
+            queue_index_webapps([self.app.pk])
+        index_webapps.assert_called_with([self.app.pk])
+        eq_(IndexingQueue.objects.count(), 0)
+
+    @mock.patch('mkt.webapps.tasks.flush_indexing_queue.apply_async')
+    @mock.patch('mkt.webapps.tasks.index_webapps.delay')
+    def test_queue(self, index_webapps, flush):
+        with self.settings(ES_INDEXING_QUEUE_ENABLED=True):
+            queue_index_webapps([self.app.pk])
+            queue_index_webapps([self.app.pk, 1234])
+        assert not index_webapps.called
+        eq_(sorted(IndexingQueue.objects.values_list('addon_id', flat=True)),
+            sorted([self.app.pk, self.app.pk, 1234]))
+        # The flush is only scheduled once per window.
+        eq_(flush.call_count, 1)
+
+    @mock.patch('mkt.webapps.tasks.WebappIndexer.bulk_index')
+    @mock.patch('mkt.webapps.tasks.WebappIndexer.extract_documents')
+    def test_flush(self, extract_documents, bulk_index):
+        extract_documents.return_value = [{'id': self.app.pk}]
+        IndexingQueue.objects.create(addon_id=self.app.pk)
+        IndexingQueue.objects.create(addon_id=self.app.pk)
+        flush_indexing_queue()
+        extract_documents.assert_called_with([self.app.pk])
+        eq_(bulk_index.call_args[0][0], [{'id': self.app.pk}])
+        eq_(IndexingQueue.objects.count(), 0)
+
+    @mock.patch('mkt.webapps.tasks.WebappIndexer.bulk_index')
+    @mock.patch('mkt.webapps.tasks.WebappIndexer.extract_documents')
+    def test_flush_keeps_late_commits(self, extract_documents, bulk_index):
+        # A row with a lower id, committed while the queue is indexed by a
+        # transaction which started earlier, waits for the next flush.
+        def late_commit(ids):
+            IndexingQueue.objects.create(id=5, addon_id=1234)
+            return []
+        extract_documents.side_effect = late_commit
+        IndexingQueue.objects.create(id=10, addon_id=self.app.pk)
+        flush_indexing_queue()
+        eq_(list(IndexingQueue.objects.values_list('id', flat=True)), [5])
+
+    @mock.patch('mkt.webapps.tasks.WebappIndexer.bulk_index')
+    def test_flush_empty(self, bulk_index):
+        flush_indexing_queue()
+        assert not bulk_index.called
+
+
+class TestUpdateRegionInstallCounts(amo.tests.TestCase):
+
+    def setUp(self):
+        self.app = amo.tests.app_factory()
+        user = UserProfile.objects.create(email='f@f.com')
+        Installed.objects.create(
+            addon=self.app, user=user,
+            client_data=ClientData.objects.create(region=mkt.regions.BR.id))
+
+    def installs(self):
+        return dict(AppRegionInstallCount.objects.filter(addon=self.app)
+                    .values_list('region', 'installs'))
+
+    def test_reconcile(self):
+        AppRegionInstallCount.objects.filter(addon=self.app).update(
+            installs=5)
+        AppRegionInstallCount.objects.create(
+            addon=self.app, region=mkt.regions.US.id, installs=3)
+        update_region_install_counts([self.app.pk])
+        eq_(self.installs(), {mkt.regions.BR.id: 1})
+
+    def test_missing(self):
+        AppRegionInstallCount.objects.all().delete()
+        update_region_install_counts([self.app.pk])
+        eq_(self.installs(), {mkt.regions.BR.id: 1})
+
+
 class TestUpdateDeveloperName(amo.tests.TestCase):
     fixtures = fixture('webapp_337141')
 
@@ -12,13 +12,16 @@ from test_utils import RequestFactory
 import amo
 import amo.tests
 from addons.models import AddonCategory, AddonDeviceType, Category, Preview
+from amo.utils import JSONEncoder
 from market.models import PriceCurrency
 
 import mkt
 from mkt.constants import ratingsbodies, regions
 from mkt.developers.models import (AddonPaymentAccount, PaymentAccount,
                                    SolitudeSeller)
-from mkt.search.serializers import ESAppSerializer
+from mkt.fireplace.api import FireplaceESAppSerializer
+from mkt.reviewers.api import ReviewersESAppSerializer
+from mkt.search.serializers import ESAppSerializer, SimpleESAppSerializer
 from mkt.site.fixtures import fixture
 from mkt.webapps.api import AppSerializer
 from mkt.webapps.models import Installed, Webapp, WebappIndexer
@@ -760,6 +763,85 @@ class TestESAppToDict(amo.tests.ESTestCase):
         res = self.serialize()
         eq_(res['upsell'], False)
 
+    def check_same_output(self, serializer_class):
+        serializer = serializer_class(context={'request': self.request})
+        eq_(json.loads(json.dumps(serializer.to_native(self.get_obj()),
+                                  cls=JSONEncoder)),
+            json.loads(json.dumps(
+                serializer.fake_app_to_native(self.get_obj()),
+                cls=JSONEncoder)))
+
+    def test_same_output(self):
+        self.request.amo_user = None
+        for serializer_class in (ESAppSerializer, SimpleESAppSerializer,
+                                 FireplaceESAppSerializer):
+            self.check_same_output(serializer_class)
+
+    def test_same_output_with_lang(self):
+        self.request = RequestFactory().get('/?lang=fr')
+        self.request.REGION = mkt.regions.US
+        self.request.amo_user = None
+        self.check_same_output(ESAppSerializer)
+
+    def test_same_output_premium_with_user(self):
+        self.make_premium(self.app)
+        self.app.save()
+        self.refresh('webapp')
+        self.check_same_output(ESAppSerializer)
+
+    def test_same_output_reviewers(self):
+        self.request.amo_user = None
+        self.check_same_output(ReviewersESAppSerializer)
+        res = ReviewersESAppSerializer(
+            instance=self.get_obj(), context={'request': self.request}).data
+        eq_(sorted(res.keys()), sorted(ReviewersESAppSerializer.Meta.fields))
+        eq_(res['latest_version']['has_info_request'], False)
+
+    def test_field_key_and_transform(self):
+        class MySerializer(ESAppSerializer):
+            def get_field_key(self, field_name):
+                return field_name.upper()
+
+            def transform_slug(self, obj, value):
+                return value.upper()
+
+        self.request.amo_user = None
+        serializer = MySerializer(context={'request': self.request})
+        res = serializer.to_native(self.get_obj())
+        eq_(res['SLUG'], self.app.app_slug.upper())
+        ok_('slug' not in res)
+        eq_(res.fields.keys(), res.keys())
+        self.check_same_output(MySerializer)
+
+    def test_no_fake_app(self):
+        self.request.amo_user = None
+        with mock.patch.object(ESAppSerializer, 'create_fake_app') as fake:
+            self.serialize()
+        assert not fake.called
+
+    def test_fake_app_for_db_fields(self):
+        # The user info needs the db, so it goes through a fake app, but
+        # only once per app.
+        create_fake_app = ESAppSerializer.create_fake_app
+        with mock.patch.object(ESAppSerializer, 'create_fake_app',
+                               autospec=True,
+                               side_effect=create_fake_app) as fake:
+            res = self.serialize()
+        eq_(fake.call_count, 1)
+        eq_(res['user'], {'developed': False, 'installed': False,
+                          'purchased': False})
+
+    def test_overridden_fields_use_fake_app(self):
+        class MySerializer(ESAppSerializer):
+            def get_icons(self, app):
+                return app.__class__.__name__
+
+        eq_(MySerializer.es_app_fields() - ESAppSerializer.es_app_fields(),
+            set())
+        ok_('icons' not in MySerializer.es_app_fields())
+        serializer = MySerializer(context={'request': self.request})
+        eq_(serializer.to_native(self.get_obj())['icons'], 'Webapp')
+
 
 class TestSupportedLocales(amo.tests.TestCase):
 
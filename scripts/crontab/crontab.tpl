@@ -6,6 +6,10 @@ HOME=/tmp
 
 # Every minute!
 * * * * * %(z_cron)s fast_current_version
+* * * * * %(z_cron)s flush_app_indexing_queue --settings=settings_local_mkt
+
+# Every 5 minutes.
+*/5 * * * * %(z_cron)s update_user_regions --settings=settings_local_mkt
 
 # Every 30 minutes.
 */30 * * * * %(z_cron)s update_addons_current_version
@@ -18,6 +22,7 @@ HOME=/tmp
 45 * * * * %(z_cron)s update_addon_appsupport
 50 * * * * %(z_cron)s cleanup_extracted_file
 55 * * * * %(z_cron)s unhide_disabled_files
+58 * * * * %(z_cron)s cleanup_update_index_changes
 
 
 #every 3 hours
@@ -41,6 +46,7 @@ HOME=/tmp
 10 8 * * * %(z_cron)s update_monolith_stats `/bin/date -d 'yesterday' +\%%Y-\%%m-\%%d`
 15 8 * * * %(z_cron)s process_iarc_changes --settings=settings_local_mkt
 30 8 * * * %(z_cron)s dump_user_installs_cron --settings=settings_local_mkt
+35 8 * * * %(z_cron)s update_app_region_install_counts --settings=settings_local_mkt
 30 9 * * * %(z_cron)s update_user_ratings
 50 9 * * * %(z_cron)s gc
 45 9 * * * %(z_cron)s mkt_gc --settings=settings_local_mkt
@@ -1,8 +1,10 @@
+import json
 import smtplib
 import sys
 import traceback
 
 from email.Utils import formatdate
+from hashlib import md5
 from email.mime.text import MIMEText
 from time import time
 from urlparse import parse_qsl
@@ -25,16 +27,22 @@ except ImportError:
     from apps.versions.compare import version_int
 
 from constants import applications, base
-from utils import (APP_GUIDS, get_mirror, log_configure, PLATFORMS,
+from update_index import UpdateChangeWatcher, UpdateIndex, UpdateIndexLoader
+from utils import (APP_GUIDS, get_mirror, log_configure, LRUCache, PLATFORMS,
                    STATUSES_PUBLIC)
 
 # Go configure the log.
 log_configure()
 
-good_rdf = """<?xml version="1.0"?>
+rdf_header = """<?xml version="1.0"?>
 <RDF:RDF xmlns:RDF="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
          xmlns:em="http://www.mozilla.org/2004/em-rdf#">
-    <RDF:Description about="urn:mozilla:%(type)s:%(guid)s">
+"""
+
+rdf_footer = """</RDF:RDF>"""
+
+
+good_rdf_body = """    <RDF:Description about="urn:mozilla:%(type)s:%(guid)s">
         <em:updates>
             <RDF:Seq>
                 <RDF:li resource="urn:mozilla:%(type)s:%(guid)s:%(version)s"/>
@@ -55,25 +63,27 @@ good_rdf = """<?xml version="1.0"?>
             </RDF:Description>
         </em:targetApplication>
     </RDF:Description>
-</RDF:RDF>"""
+"""
 
 
-bad_rdf = """<?xml version="1.0"?>
-<RDF:RDF xmlns:RDF="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
-         xmlns:em="http://www.mozilla.org/2004/em-rdf#">
-</RDF:RDF>"""
-
-
-no_updates_rdf = """<?xml version="1.0"?>
-<RDF:RDF xmlns:RDF="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
-         xmlns:em="http://www.mozilla.org/2004/em-rdf#">
-    <RDF:Description about="urn:mozilla:%(type)s:%(guid)s">
+no_updates_rdf_body = """    <RDF:Description about="urn:mozilla:%(type)s:%(guid)s">
         <em:updates>
             <RDF:Seq>
             </RDF:Seq>
         </em:updates>
     </RDF:Description>
-</RDF:RDF>"""
+"""
+
+
+good_rdf = rdf_header + good_rdf_body + rdf_footer
+bad_rdf = rdf_header + rdf_footer
+no_updates_rdf = rdf_header + no_updates_rdf_body + rdf_footer
+
+# The most add-ons a single batch request can ask about.
+MAX_BATCH_SIZE = 100
+# What is read from the body of a batch request, and from each of its items.
+BATCH_FIELDS = ('reqVersion', 'appID', 'appVersion', 'compatMode')
+BATCH_ITEM_FIELDS = ('id', 'version', 'appOS')
 
 
 timing_log = commonware.log.getLogger('z.timer')
@@ -88,11 +98,23 @@ def getconn():
 
 mypool = pool.QueuePool(getconn, max_overflow=10, pool_size=5, recycle=300)
 
+index_loader = UpdateIndexLoader(
+    mypool.connect, check_interval=settings.UPDATE_INDEX_CHECK_INTERVAL,
+    max_age=settings.UPDATE_INDEX_MAX_AGE)
+
+# Rendered responses, keyed on the normalized query; see `get_cached_rdf`.
+response_cache = LRUCache(settings.UPDATE_CACHE_SIZE,
+                          settings.UPDATE_CACHE_TTL)
+change_watcher = UpdateChangeWatcher(
+    mypool.connect, interval=settings.UPDATE_INDEX_CHECK_INTERVAL)
+
 
 class Update(object):
 
-    def __init__(self, data, compat_mode='strict'):
+    def __init__(self, data, compat_mode='strict', index=None):
         self.conn, self.cursor = None, None
+        # When given an `UpdateIndex`, answer from it instead of the db.
+        self.index = index
         self.data = data.copy()
         self.data['row'] = {}
         self.flags = {'use_version': False, 'multiple_status': False}
@@ -103,7 +125,7 @@ class Update(object):
     def is_valid(self):
         # If you accessing this from unit tests, then before calling
         # is valid, you can assign your own cursor.
-        if not self.cursor:
+        if not self.cursor and not self.index:
             self.conn = mypool.connect()
             self.cursor = self.conn.cursor()
 
@@ -118,14 +140,7 @@ class Update(object):
         if not data['app_id']:
             return False
 
-        sql = """SELECT id, status, addontype_id, guid FROM addons
-                 WHERE guid = %(guid)s AND
-                       inactive = 0 AND
-                       status != %(STATUS_DELETED)s
-                 LIMIT 1;"""
-        self.cursor.execute(sql, {'guid': self.data['id'],
-                                  'STATUS_DELETED': base.STATUS_DELETED})
-        result = self.cursor.fetchone()
+        result = self.get_addon()
         if result is None:
             return False
 
@@ -143,6 +158,57 @@ class Update(object):
         self.is_beta_version = base.VERSION_BETA.search(data['version'])
         return True
 
+    def get_cache_key(self):
+        """
+        Normalizes the query, before `is_valid` is called, so that pings
+        which would get the same answer share a cached response.
+        """
+        data = self.data
+        app_os = None
+        if data.get('appOS'):
+            for k, v in PLATFORMS.items():
+                if k in data['appOS']:
+                    app_os = v
+                    break
+        app_version = None
+        if 'appVersion' in data:
+            app_version = version_int(data['appVersion'])
+        return (data.get('id', '').lower(), data.get('version', ''),
+                data.get('appID'), app_version, app_os, self.compat_mode,
+                'reqVersion' in data)
+
+    def get_addon(self):
+        if self.index:
+            addon = self.index.get_addon(self.data['id'])
+            if addon is None:
+                return None
+            return addon.id, addon.status, addon.type, addon.guid
+
+        sql = """SELECT id, status, addontype_id, guid FROM addons
+                 WHERE guid = %(guid)s AND
+                       inactive = 0 AND
+                       status != %(STATUS_DELETED)s
+                 LIMIT 1;"""
+        self.cursor.execute(sql, {'guid': self.data['id'],
+                                  'STATUS_DELETED': base.STATUS_DELETED})
+        return self.cursor.fetchone()
+
+    def get_beta_status(self):
+        """The status of a file of the version the client is running."""
+        if self.index:
+            return self.index.get_beta_status(self.data['id'],
+                                              self.data['version'])
+
+        sql = """
+            SELECT versions.id, status
+            FROM files INNER JOIN versions
+            ON files.version_id = versions.id
+            WHERE versions.addon_id = %(id)s
+                  AND versions.version = %(version)s LIMIT 1;"""
+        self.cursor.execute(sql, self.data)
+        result = self.cursor.fetchone()
+        return result[1] if result is not None else None
+
     def get_beta(self):
         data = self.data
         data['status'] = base.STATUS_PUBLIC
@@ -151,17 +217,9 @@ class Update(object):
             # Beta channel looks at the addon name to see if it's beta.
             if self.is_beta_version:
                 # For beta look at the status of the existing files.
-                sql = """
-                    SELECT versions.id, status
-                    FROM files INNER JOIN versions
-                    ON files.version_id = versions.id
-                    WHERE versions.addon_id = %(id)s
-                          AND versions.version = %(version)s LIMIT 1;"""
-                self.cursor.execute(sql, data)
-                result = self.cursor.fetchone()
+                status = self.get_beta_status()
                 # Only change the status if there are files.
-                if result is not None:
-                    status = result[1]
+                if status is not None:
                     # If it's in Beta or Public, then we should be looking
                     # for similar. If not, find something public.
                     if status in (base.STATUS_BETA, base.STATUS_PUBLIC):
@@ -182,6 +240,12 @@ class Update(object):
         self.get_beta()
         data = self.data
 
+        if self.index:
+            row = self.index.find(data, self.flags, self.compat_mode)
+            if row is None:
+                return False
+            return self.set_row(row)
+
         sql = ["""
             SELECT
                 addons.guid as guid, addons.addontype_id as type,
@@ -271,35 +335,48 @@ class Update(object):
                 'datestatuschanged', 'strict_compat', 'releasenotes',
                 'version', 'premium_type'],
                 list(result)))
-            row['type'] = base.ADDON_SLUGS_UPDATE[row['type']]
-            row['url'] = get_mirror(self.data['addon_status'],
-                                    self.data['id'], row)
-            data['row'] = row
-            return True
+            return self.set_row(row)
 
         return False
 
+    def set_row(self, row):
+        row['type'] = base.ADDON_SLUGS_UPDATE[row['type']]
+        row['url'] = get_mirror(self.data['addon_status'],
+                                self.data['id'], row)
+        self.data['row'] = row
+        return True
+
     def get_bad_rdf(self):
         return bad_rdf
 
     def get_rdf(self):
-        if self.is_valid():
-            if self.get_update():
-                rdf = self.get_good_rdf()
-            else:
-                rdf = self.get_no_updates_rdf()
-        else:
-            rdf = self.get_bad_rdf()
-        self.cursor.close()
+        rdf = rdf_header + self.get_rdf_body() + rdf_footer
+        if self.cursor:
+            self.cursor.close()
         if self.conn:
             self.conn.close()
         return rdf
 
+    def get_rdf_body(self):
+        """The part of the RDF describing this add-on, if any."""
+        if self.is_valid():
+            if self.get_update():
+                return self.get_good_rdf_body()
+            return self.get_no_updates_rdf_body()
+        return ''
+
     def get_no_updates_rdf(self):
+        return rdf_header + self.get_no_updates_rdf_body() + rdf_footer
+
+    def get_no_updates_rdf_body(self):
         name = base.ADDON_SLUGS_UPDATE[self.data['type']]
-        return no_updates_rdf % ({'guid': self.data['guid'], 'type': name})
+        return no_updates_rdf_body % ({'guid': self.data['guid'],
+                                       'type': name})
 
     def get_good_rdf(self):
+        return rdf_header + self.get_good_rdf_body() + rdf_footer
+
+    def get_good_rdf_body(self):
         data = self.data['row']
         data['if_hash'] = ''
         if data['hash']:
@@ -313,17 +390,104 @@ class Update(object):
                                  (settings.SITE_URL, '/versions/updateInfo/',
                                   data['version_id']))
 
-        return good_rdf % data
+        return good_rdf_body % data
+
+    def get_json(self):
+        """The same answer as `get_rdf_body`, for JSON responses."""
+        if not self.data.get('guid'):
+            return {'id': self.data.get('id'), 'valid': False}
+
+        result = {'id': self.data['guid'], 'valid': True, 'updates': []}
+        row = self.data['row']
+        if row:
+            update = {'version': row['version'], 'update_link': row['url'],
+                      'min_version': row['min'], 'max_version': row['max'],
+                      'application': row['appguid']}
+            if row['hash']:
+                update['update_hash'] = row['hash']
+            if row['releasenotes']:
+                update['update_info_url'] = (
+                    '%s/versions/updateInfo/%s/%%APP_LOCALE%%/' %
+                    (settings.SITE_URL, row['version_id']))
+            result['updates'].append(update)
+        return result
 
     def format_date(self, secs):
         return '%s GMT' % formatdate(time() + secs)[:25]
 
-    def get_headers(self, length):
-        return [('Content-Type', 'text/xml'),
-                ('Cache-Control', 'public, max-age=3600'),
-                ('Last-Modified', self.format_date(0)),
-                ('Expires', self.format_date(3600)),
-                ('Content-Length', str(length))]
+    def get_headers(self, length=None, content_type='text/xml', etag=None):
+        headers = [('Content-Type', content_type),
+                   ('Cache-Control', 'public, max-age=3600'),
+                   ('Last-Modified', self.format_date(0)),
+                   ('Expires', self.format_date(3600))]
+        if length is not None:
+            headers.append(('Content-Length', str(length)))
+        if etag is not None:
+            headers.append(('ETag', etag))
+        return headers
+
+
+class BatchUpdate(object):
+    """
+    Answers update pings for many add-ons of one application at once.
+
+    `items` is a list of dicts with `id`, `version` and `appOS` keys, while
+    `data` holds what they have in common (`appID`, `appVersion` and
+    `reqVersion`). Everything is looked up with the same few queries no
+    matter how many items there are, by loading an `UpdateIndex` restricted
+    to those add-ons, unless a full one is passed in.
+    """
+
+    def __init__(self, data, items, compat_mode='strict', index=None):
+        self.data = data
+        self.items = items
+        self.compat_mode = compat_mode
+        self.index = index
+        self.updates = None
+        # As with `Update`, tests can assign their own cursor.
+        self.cursor = None
+
+    def get_updates(self):
+        if self.updates is None:
+            index = self.index or self.load_index()
+            self.updates = []
+            for item in self.items:
+                data = dict(self.data)
+                data.update(item)
+                self.updates.append(Update(data, self.compat_mode,
+                                           index=index))
+        return self.updates
+
+    def load_index(self):
+        guids = set(item['id'] for item in self.items if item.get('id'))
+        app_id = APP_GUIDS.get(self.data.get('appID'))
+        if self.cursor:
+            return UpdateIndex().load(self.cursor, guids=guids, app_id=app_id)
+
+        conn = mypool.connect()
+        cursor = conn.cursor()
+        try:
+            return UpdateIndex().load(cursor, guids=guids, app_id=app_id)
+        finally:
+            cursor.close()
+            conn.close()
+
+    def get_rdf(self):
+        """One RDF document for all items, as a list of chunks."""
+        return ([rdf_header] +
+                [update.get_rdf_body() for update in self.get_updates()] +
+                [rdf_footer])
+
+    def get_json(self):
+        results = []
+        for update in self.get_updates():
+            if update.is_valid():
+                update.get_update()
+            results.append(update.get_json())
+        return json.dumps({'addons': results})
+
+    def get_headers(self, length, content_type='text/xml'):
+        return Update(self.data).get_headers(length, content_type)
 
 
 def mail_exception(data):
@@ -347,17 +511,148 @@ def log_exception(data):
     error_log.error(u'Type: %s, %s. Query: %s' % (typ, value, data))
 
 
+def get_index():
+    if not settings.UPDATE_INDEX_ENABLED:
+        return None
+    try:
+        return index_loader.get()
+    except Exception:
+        # Fall back to querying the database rather than failing the ping.
+        error_log.exception('Unable to load the update index')
+        return None
+
+
 def application(environ, start_response):
     status = '200 OK'
     with statsd.timer('services.update'):
         data = dict(parse_qsl(environ['QUERY_STRING']))
         compat_mode = data.pop('compatMode', 'strict')
         try:
-            update = Update(data, compat_mode)
-            output = update.get_rdf()
-            start_response(status, update.get_headers(len(output)))
+            update = Update(data, compat_mode, index=get_index())
+            output, etag = get_cached_rdf(update)
+            if etag_matches(environ, etag):
+                start_response('304 Not Modified',
+                               update.get_headers(etag=etag))
+                return []
+            start_response(status, update.get_headers(len(output),
+                                                      etag=etag))
         except:
             #mail_exception(data)
             log_exception(data)
             raise
     return [output]
+
+
+def get_etag(output):
+    return '"%s"' % md5(output).hexdigest()
+
+
+def etag_matches(environ, etag):
+    if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return etag in tags or '*' in tags
+
+
+def get_cached_rdf(update):
+    """
+    Returns the RDF for `update` and its ETag, from `response_cache` if
+    it's enabled. Entries are tagged with the add-on's guid, so that the
+    ones of add-ons which changed since the last poll can be evicted.
+    """
+    if not settings.UPDATE_CACHE_ENABLED:
+        rdf = update.get_rdf()
+        return rdf, get_etag(rdf)
+
+    try:
+        for guid in change_watcher.poll():
+            response_cache.delete_tag(guid)
+    except Exception:
+        error_log.exception('Unable to poll update_index_changes')
+
+    key = update.get_cache_key()
+    cached = response_cache.get(key)
+    if cached is not None:
+        statsd.incr('services.update.cache.hit')
+        return cached
+
+    statsd.incr('services.update.cache.miss')
+    rdf = update.get_rdf()
+    cached = rdf, get_etag(rdf)
+    response_cache.set(key, cached, tags=[key[0]])
+    return cached
+
+
+def get_batch_request(environ):
+    """
+    Parses the JSON body of a batch request into the common data and the
+    list of items, or returns None if it isn't valid.
+    """
+    try:
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+        body = json.loads(environ['wsgi.input'].read(length))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    if not isinstance(body, dict) or 'items' not in body:
+        return None
+    items = body.pop('items')
+    if (not isinstance(items, list)
+            or len(items) > MAX_BATCH_SIZE
+            or not all(isinstance(item, dict) for item in items)):
+        return None
+
+    data = dict((k, body[k]) for k in BATCH_FIELDS if k in body)
+    items = [dict((k, item[k]) for k in BATCH_ITEM_FIELDS if k in item)
+             for item in items]
+    # Like the query string of a single update check, only strings are
+    # expected: anything else would fail deep down in the checks.
+    if not all(isinstance(value, basestring)
+               for value in data.values() +
+               [v for item in items for v in item.values()]):
+        return None
+    return data, items
+
+
+def batch_application(environ, start_response):
+    """
+    Update checks for many add-ons in one request.
+
+    Expects a POST with a JSON body like::
+
+        {"appID": "...", "appVersion": "24.0", "reqVersion": "2",
+         "compatMode": "normal",
+         "items": [{"id": "guid", "version": "1.0", "appOS": "Darwin"}]}
+
+    and answers with one RDF document covering all of them, or JSON when
+    `format=json` is in the query string.
+    """
+    with statsd.timer('services.update.batch'):
+        request = None
+        if environ.get('REQUEST_METHOD') == 'POST':
+            request = get_batch_request(environ)
+        if request is None:
+            start_response('400 Bad Request',
+                           [('Content-Type', 'text/plain')])
+            return ['Bad batch request.']
+
+        data, items = request
+        compat_mode = data.pop('compatMode', 'strict')
+        statsd.incr('services.update.batch.items', len(items))
+        try:
+            batch = BatchUpdate(data, items, compat_mode, index=get_index())
+            query = dict(parse_qsl(environ['QUERY_STRING']))
+            if query.get('format') == 'json':
+                output = [batch.get_json()]
+                content_type = 'application/json'
+            else:
+                output = batch.get_rdf()
+                content_type = 'text/xml'
+            length = sum(len(chunk) for chunk in output)
+            start_response('200 OK', batch.get_headers(length, content_type))
+        except:
+            log_exception(data)
+            raise
+    # Each add-on is sent as its own chunk.
+    return output
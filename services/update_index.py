@@ -0,0 +1,379 @@
+"""
+An in-memory index of everything the update service needs to answer an
+update ping without going to the database.
+
+Each WSGI worker keeps one `UpdateIndex` around, built from a handful of
+bulk queries. The `update_index_state` table holds a generation counter
+which is bumped whenever add-ons, versions, files or compat overrides
+change; workers look at it every `UPDATE_INDEX_CHECK_INTERVAL` seconds and
+rebuild when it moves on. The add-ons that changed are logged in
+`update_index_changes`, which `UpdateChangeWatcher` follows to evict cached
+responses.
+"""
+import collections
+import threading
+from time import time
+
+import commonware.log
+
+try:
+    from compare import version_int
+except ImportError:
+    from apps.versions.compare import version_int
+
+from constants import applications, base
+from constants.platforms import PLATFORM_ALL
+
+
+log = commonware.log.getLogger('z.services')
+
+PUBLIC_STATUSES = (base.STATUS_PUBLIC, base.STATUS_LITE,
+                   base.STATUS_LITE_AND_NOMINATED)
+
+Addon = collections.namedtuple(
+    'Addon', 'id status type guid premium_type')
+
+Candidate = collections.namedtuple(
+    'Candidate', 'version_id file_id file_status version version_key '
+                 'appguid min max min_int max_int strict_compat '
+                 'binary_components hash filename datestatuschanged '
+                 'releasenotes')
+
+Override = collections.namedtuple(
+    'Override', 'app_id min max min_int max_int')
+
+
+def _key(value):
+    # MySQL compares guids and version strings case-insensitively, so
+    # the index has to as well.
+    return (value or '').lower()
+
+
+def _le(a, b):
+    # SQL comparisons involving NULL are never true.
+    return a is not None and b is not None and a <= b
+
+
+def current_generation(cursor):
+    cursor.execute('SELECT generation FROM update_index_state LIMIT 1;')
+    result = cursor.fetchone()
+    return result[0] if result else None
+
+
+class UpdateIndex(object):
+    """
+    The compiled data behind `services.update.Update`.
+
+    Candidate files are grouped per (guid, app_id, platform_id), newest
+    version first, carrying the min/max `version_int` of the application
+    they support. Compat override ranges are grouped per version.
+    """
+
+    def __init__(self, generation=None):
+        self.generation = generation
+        self.built = time()
+        self.addons = {}
+        self.candidates = {}
+        self.beta_statuses = {}
+        self.overrides = {}
+        self.d2c_max = dict((app_id, version_int(v)) for app_id, v in
+                            applications.D2C_MAX_VERSIONS.items())
+
+    def load(self, cursor, guids=None, app_id=None):
+        """
+        Loads the whole index, or only what's needed to answer pings for
+        `guids` from `app_id` when those are given.
+        """
+        params = {'STATUS_DELETED': base.STATUS_DELETED,
+                  'STATUS_NULL': base.STATUS_NULL}
+        addon_where, app_where = '', ''
+        if guids is not None:
+            if not guids:
+                return self
+            params['guids'] = tuple(guids)
+            addon_where = ' AND addons.guid IN %(guids)s'
+        if app_id is not None:
+            params['app_id'] = app_id
+            app_where = (' AND applications_versions.application_id = '
+                         '%(app_id)s')
+
+        self.load_addons(cursor, params, addon_where)
+        self.load_candidates(cursor, params, addon_where, app_where)
+        self.load_overrides(cursor, params, addon_where)
+        return self
+
+    def load_addons(self, cursor, params, where):
+        cursor.execute("""
+            SELECT id, status, addontype_id, guid, premium_type FROM addons
+            WHERE addons.guid IS NOT NULL AND
+                  addons.inactive = 0 AND
+                  addons.status != %(STATUS_DELETED)s""" + where, params)
+        for row in cursor.fetchall():
+            addon = Addon(*row)
+            self.addons[_key(addon.guid)] = addon
+
+    def load_candidates(self, cursor, params, addon_where, app_where):
+        cursor.execute("""
+            SELECT
+                addons.guid, applications_versions.application_id,
+                files.platform_id, versions.id, files.id, files.status,
+                versions.version, applications.guid,
+                appmin.version, appmax.version,
+                appmin.version_int, appmax.version_int,
+                files.strict_compatibility, files.binary_components,
+                files.hash, files.filename, files.datestatuschanged,
+                versions.releasenotes
+            FROM versions
+            INNER JOIN addons
+                ON addons.id = versions.addon_id AND
+                   addons.inactive = 0 AND
+                   addons.status != %(STATUS_DELETED)s
+            INNER JOIN applications_versions
+                ON applications_versions.version_id = versions.id
+            INNER JOIN applications
+                ON applications_versions.application_id = applications.id
+            INNER JOIN appversions appmin
+                ON appmin.id = applications_versions.min
+            INNER JOIN appversions appmax
+                ON appmax.id = applications_versions.max
+            INNER JOIN files
+                ON files.version_id = versions.id
+            WHERE files.status > %(STATUS_NULL)s""" + addon_where + app_where,
+            params)
+
+        candidates = collections.defaultdict(list)
+        for row in cursor.fetchall():
+            guid, app_id, platform_id = row[:3]
+            (version_id, file_id, file_status, version, appguid, min_, max_,
+             min_int, max_int, strict, binary, hash_, filename, changed,
+             notes) = row[3:]
+            candidates[(_key(guid), app_id, platform_id)].append(Candidate(
+                version_id, file_id, file_status, version, _key(version),
+                appguid, min_, max_, min_int, max_int, strict, binary, hash_,
+                filename, changed, notes))
+
+        for key, rows in candidates.items():
+            rows.sort(key=lambda c: (c.version_id, c.file_id), reverse=True)
+            self.candidates[key] = tuple(rows)
+
+        # The beta channel looks up the status of files by version string,
+        # but only ever for version strings that look like a beta.
+        cursor.execute("""
+            SELECT versions.addon_id, versions.version, files.status
+            FROM files
+            INNER JOIN versions
+                ON files.version_id = versions.id
+            INNER JOIN addons
+                ON addons.id = versions.addon_id
+            WHERE addons.inactive = 0 AND
+                  addons.status != %(STATUS_DELETED)s""" +
+            addon_where + ' ORDER BY files.id', params)
+        for addon_id, version, status in cursor.fetchall():
+            if version and base.VERSION_BETA.search(version):
+                self.beta_statuses.setdefault((addon_id, _key(version)),
+                                              status)
+
+    def load_overrides(self, cursor, params, where):
+        # Overrides for other applications can still exclude a version (see
+        # `is_overridden`), so they are never filtered by application.
+        cursor.execute("""
+            SELECT iv.version_id, iv.app_id, iv.min_app_version,
+                   iv.max_app_version, iv.min_app_version_int,
+                   iv.max_app_version_int
+            FROM incompatible_versions iv
+            INNER JOIN versions
+                ON versions.id = iv.version_id
+            INNER JOIN addons
+                ON addons.id = versions.addon_id
+            WHERE addons.inactive = 0 AND
+                  addons.status != %(STATUS_DELETED)s""" +
+            where, params)
+        overrides = collections.defaultdict(list)
+        for row in cursor.fetchall():
+            overrides[row[0]].append(Override(*row[1:]))
+        self.overrides = dict(overrides)
+
+    def get_addon(self, guid):
+        return self.addons.get(_key(guid))
+
+    def get_beta_status(self, addon_id, version):
+        return self.beta_statuses.get((addon_id, _key(version)))
+
+    def is_overridden(self, version_id, app_id, version_int):
+        """Mirrors the `incompatible_versions` subquery in `Update`."""
+        for o in self.overrides.get(version_id, ()):
+            # Note the subquery only restricts the first range to the app.
+            if ((o.app_id == app_id and o.min == '0' and
+                 _le(version_int, o.max_int)) or
+                (_le(o.min_int, version_int) and o.max == '*') or
+                (_le(o.min_int, version_int) and
+                 _le(version_int, o.max_int))):
+                return True
+        return False
+
+    def matches(self, candidate, data, flags, compat_mode):
+        c = candidate
+        if flags['use_version']:
+            if not (c.file_status > data['status'] and
+                    c.version_key == _key(data['version'])):
+                return False
+        elif flags['multiple_status']:
+            if c.file_status not in PUBLIC_STATUSES:
+                return False
+        elif c.file_status != data['status']:
+            return False
+
+        vint = data['version_int']
+        if not _le(c.min_int, vint):
+            return False
+
+        if compat_mode == 'ignore':
+            return True
+
+        elif compat_mode == 'normal':
+            if ((c.strict_compat or c.binary_components) and
+                    not _le(vint, c.max_int)):
+                return False
+            d2c_max = self.d2c_max.get(data['app_id'])
+            if d2c_max and not _le(d2c_max, c.max_int):
+                return False
+            return not self.is_overridden(c.version_id, data['app_id'], vint)
+
+        return _le(vint, c.max_int)
+
+    def find(self, data, flags, compat_mode):
+        """
+        Returns the row `Update.get_update` would have selected, or None.
+        """
+        guid = _key(data['guid'])
+        platforms = [PLATFORM_ALL.id]
+        if data.get('appOS'):
+            platforms.append(data['appOS'])
+
+        best = None
+        for platform in platforms:
+            rows = self.candidates.get((guid, data['app_id'], platform), ())
+            for candidate in rows:
+                if self.matches(candidate, data, flags, compat_mode):
+                    if (best is None or (candidate.version_id,
+                                         candidate.file_id) >
+                                        (best.version_id, best.file_id)):
+                        best = candidate
+                    break
+
+        if best is None:
+            return None
+
+        addon = self.addons[guid]
+        return {
+            'guid': addon.guid, 'type': addon.type, 'disabled_by_user': 0,
+            'appguid': best.appguid, 'min': best.min, 'max': best.max,
+            'file_id': best.file_id, 'file_status': best.file_status,
+            'hash': best.hash, 'filename': best.filename,
+            'version_id': best.version_id,
+            'datestatuschanged': best.datestatuschanged,
+            'strict_compat': best.strict_compat,
+            'releasenotes': best.releasenotes, 'version': best.version,
+            'premium_type': addon.premium_type,
+        }
+
+
+class UpdateIndexLoader(object):
+    """
+    Hands out the current `UpdateIndex` for this process, rebuilding it when
+    the generation in `update_index_state` changes or it gets too old.
+
+    Only one thread rebuilds at a time; the others carry on serving the
+    previous index meanwhile.
+    """
+
+    def __init__(self, connect, check_interval=30, max_age=3600):
+        self.connect = connect
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self.index = None
+        self.checked = 0
+        self.lock = threading.Lock()
+
+    def get(self):
+        now = time()
+        if self.index is not None and now - self.checked < self.check_interval:
+            return self.index
+
+        if not self.lock.acquire(self.index is None):
+            return self.index
+        try:
+            if now - self.checked >= self.check_interval or self.index is None:
+                self.refresh(now)
+        finally:
+            self.lock.release()
+        return self.index
+
+    def refresh(self, now):
+        conn = self.connect()
+        cursor = conn.cursor()
+        try:
+            generation = current_generation(cursor)
+            index = self.index
+            if (index is None or index.generation != generation or
+                    now - index.built >= self.max_age):
+                start = time()
+                self.index = UpdateIndex(generation).load(cursor)
+                log.info('Built update index generation %s in %.2fs' %
+                         (generation, time() - start))
+            self.checked = now
+        finally:
+            cursor.close()
+            conn.close()
+
+
+class UpdateChangeWatcher(object):
+    """
+    Tells which add-ons changed since it last looked at the
+    `update_index_changes` log, looking at most every `interval` seconds.
+    """
+
+    def __init__(self, connect, interval=30):
+        self.connect = connect
+        self.interval = interval
+        self.last_id = None
+        self.checked = 0
+        self.lock = threading.Lock()
+
+    def poll(self):
+        """
+        Returns the (lowercased) guids of add-ons changed since the last
+        poll. The first poll only finds out where the log is at.
+        """
+        now = time()
+        if now - self.checked < self.interval or not self.lock.acquire(False):
+            return set()
+        try:
+            conn = self.connect()
+            cursor = conn.cursor()
+            try:
+                guids = self.get_changes(cursor)
+            finally:
+                cursor.close()
+                conn.close()
+            self.checked = now
+            return guids
+        finally:
+            self.lock.release()
+
+    def get_changes(self, cursor):
+        if self.last_id is None:
+            cursor.execute('SELECT MAX(id) FROM update_index_changes;')
+            self.last_id = cursor.fetchone()[0] or 0
+            return set()
+
+        cursor.execute("""
+            SELECT changes.id, addons.guid
+            FROM update_index_changes changes
+            LEFT JOIN addons ON addons.id = changes.addon_id
+            WHERE changes.id > %(last_id)s
+            ORDER BY changes.id;""", {'last_id': self.last_id})
+        rows = cursor.fetchall()
+        if rows:
+            self.last_id = rows[-1][0]
+        return set(_key(guid) for _, guid in rows if guid)
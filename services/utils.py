@@ -15,6 +15,9 @@ if settingmodule.startswith(('zamboni',  # typical git clone destination
 import posixpath
 import re
 import sys
+import threading
+from collections import OrderedDict
+from time import time
 
 from cef import log_cef as _log_cef
 import MySQLdb as mysql
@@ -91,6 +94,79 @@ def get_mirror(status, id, row):
     return posixpath.join(host, str(id), row['filename'])
 
 
+class LRUCache(object):
+    """
+    A bounded, thread-safe, per-process cache that evicts the least
+    recently used entries and expires them after `ttl` seconds.
+
+    Entries can be tagged on `set` so that every entry carrying a tag can be
+    evicted at once with `delete_tag`. Hits and misses are counted.
+    """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.hits = self.misses = 0
+        self.entries = OrderedDict()
+        self.tags = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None or entry[1] < time():
+                if entry is not None:
+                    self._untag(key, entry[2])
+                self.misses += 1
+                return None
+            # Re-inserting moves the entry to the most recently used end.
+            self.entries[key] = entry
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, tags=(), ttl=None):
+        expires = time() + (self.ttl if ttl is None else ttl)
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self._untag(key, old[2])
+            while len(self.entries) >= self.size:
+                old_key, old = self.entries.popitem(last=False)
+                self._untag(old_key, old[2])
+            self.entries[key] = (value, expires, tuple(tags))
+            for tag in tags:
+                self.tags.setdefault(tag, set()).add(key)
+
+    def delete(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self._untag(key, entry[2])
+
+    def delete_tag(self, tag):
+        with self.lock:
+            for key in self.tags.pop(tag, ()):
+                entry = self.entries.pop(key, None)
+                if entry is not None:
+                    self._untag(key, entry[2])
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tags.clear()
+
+    def _untag(self, key, tags):
+        for tag in tags:
+            keys = self.tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[tag]
+
+
 def getconn():
     db = settings.SERVICES_DATABASE
     return mysql.connect(host=db['HOST'], user=db['USER'],
@@ -2,13 +2,14 @@ import calendar
 import json
 
 from datetime import datetime
+from multiprocessing.pool import ThreadPool
 from time import gmtime, time
 from urlparse import parse_qsl, urlparse
 from wsgiref.handlers import format_date_time
 
 from django.core.management import setup_environ
 
-from utils import (log_configure, log_exception, log_info, mypool,
+from utils import (log_configure, log_exception, log_info, LRUCache, mypool,
                    ADDON_PREMIUM, CONTRIB_CHARGEBACK, CONTRIB_NO_CHARGE,
                    CONTRIB_PURCHASE, CONTRIB_REFUND)
 
@@ -19,8 +20,9 @@ setup_environ(settings)
 log_configure()
 
 from browserid.errors import ExpiredSignatureError
+from django.core.cache import cache
 import jwt
-from lib.crypto.receipt import sign
+from lib.crypto.receipt import purchase_key, sign, verified_key
 from lib.cef_loggers import receipt_cef
 
 # This has to be imported after the settings (utils).
@@ -30,11 +32,22 @@ from django_statsd.clients import statsd
 
 status_codes = {
     200: '200 OK',
+    400: '400 Bad Request',
     405: '405 Method Not Allowed',
     500: '500 Internal Server Error',
 }
 
 
+# Where receipts are posted to be verified in bulk, and how many at once.
+BATCH_PATH = '/verify/batch/'
+MAX_BATCH_SIZE = 100
+
+# Receipts which passed verification in this process; the shared cache is
+# used as a second tier. See `Verify.get_cached`.
+verified_cache = LRUCache(settings.WEBAPPS_RECEIPT_VERIFY_CACHE_SIZE,
+                          settings.WEBAPPS_RECEIPT_VERIFY_CACHE_TTL)
+
+
 class VerificationError(Exception):
     pass
 
@@ -61,6 +74,8 @@ class Verify:
         self.addon_id = None
         self.user_id = None
         self.premium = None
+        # The purchase token seen when verifying, see `set_cached`.
+        self.purchase_token = None
         # This is so the unit tests can override the connection.
         self.conn, self.cursor = None, None
 
@@ -75,9 +90,26 @@ class Verify:
         do the entire stack of checks.
         """
         receipt_domain = urlparse(settings.WEBAPPS_RECEIPT_URL).netloc
+        use_cache = settings.WEBAPPS_RECEIPT_VERIFY_CACHE
+        cached = self.get_cached() if use_cache else None
+        if cached:
+            # Decoding and the db lookups are skipped, but the URL of the
+            # receipt still has to match this request.
+            try:
+                self.check_url(receipt_domain)
+            except InvalidReceipt, err:
+                return self.invalid(str(err))
+            if cached == 'refunded':
+                return self.refund()
+            return self.ok_or_expired()
+
         try:
             self.decoded = self.decode()
             self.check_type('purchase-receipt')
+            if use_cache:
+                # Read before the db, so that a purchase or install changing
+                # in the meantime leaves what gets cached here already stale.
+                self.purchase_token = self.get_purchase_token()
             self.check_db()
             self.check_url(receipt_domain)
         except InvalidReceipt, err:
@@ -85,6 +117,8 @@ class Verify:
 
         if self.premium != ADDON_PREMIUM:
             log_info('Valid receipt, not premium')
+            if use_cache:
+                self.set_cached('ok')
             return self.ok_or_expired()
 
         try:
@@ -92,10 +126,74 @@ class Verify:
         except InvalidReceipt, err:
             return self.invalid(str(err))
         except RefundedReceipt:
+            if use_cache:
+                self.set_cached('refunded')
             return self.refund()
 
+        if use_cache:
+            self.set_cached('ok')
         return self.ok_or_expired()
 
+    def get_cached(self):
+        """
+        Looks for an earlier verification of this receipt, first in this
+        process and then in the shared cache. On a hit, fills in what
+        decoding and checking the db would have and returns the purchase
+        status, 'ok' or 'refunded'.
+
+        Entries are only good while the purchase token for the app and user
+        hasn't changed since; see `lib.crypto.receipt.invalidate_verified`.
+        """
+        key = verified_key(self.receipt)
+        entry = verified_cache.get(key)
+        tier = 'local'
+        if entry is None:
+            entry = cache.get(key)
+            tier = 'shared'
+
+        if entry is not None:
+            token = cache.get(purchase_key(entry['addon_id'],
+                                           entry['decoded']['user']['value']))
+            if token != entry['token']:
+                verified_cache.delete(key)
+                cache.delete(key)
+                entry = None
+
+        if entry is None:
+            statsd.incr('services.verify.cache.miss')
+            return None
+
+        statsd.incr('services.verify.cache.hit.%s' % tier)
+        if tier == 'shared':
+            verified_cache.set(key, entry)
+        # `expired` writes to the decoded receipt, so work on a copy.
+        self.decoded = dict(entry['decoded'])
+        self.addon_id = entry['addon_id']
+        self.user_id = entry['user_id']
+        self.premium = entry['premium']
+        return entry['status']
+
+    def purchase_key(self):
+        # In the order of `check_db`, so both raise the same errors.
+        uuid = self.get_uuid()
+        return purchase_key(self.get_addon_id(), uuid)
+
+    def get_purchase_token(self):
+        """
+        The token `lib.crypto.receipt.invalidate_verified` changes for the
+        install and app of the decoded receipt.
+        """
+        return cache.get(self.purchase_key())
+
+    def set_cached(self, status):
+        """Remembers this receipt was verified, see `get_cached`."""
+        key = verified_key(self.receipt)
+        entry = {'decoded': dict(self.decoded), 'addon_id': self.addon_id,
+                 'user_id': self.user_id, 'premium': self.premium,
+                 'status': status, 'token': self.purchase_token}
+        verified_cache.set(key, entry)
+        cache.set(key, entry, settings.WEBAPPS_RECEIPT_VERIFY_CACHE_TTL)
+
     def check_without_purchase(self):
         """
         This is what the developer and reviewer receipts do, we aren't
@@ -189,45 +287,55 @@ class Verify:
 
         self.setup_db()
         # Get the addon and user information from the installed table.
+        uuid = self.get_uuid()
+        self.addon_id = self.get_addon_id()
+        result = self.get_install(uuid)
+        if not result:
+            # We've got no record of this receipt being created.
+            log_info('No entry in users_install for uuid: %s' % uuid)
+            raise InvalidReceipt('WRONG_USER')
+
+        pk, self.user_id, self.premium = result
+
+    def get_uuid(self):
         try:
-            uuid = self.decoded['user']['value']
+            return self.decoded['user']['value']
         except KeyError:
             # If somehow we got a valid receipt without a uuid
             # that's a problem. Log here.
             log_info('No user in receipt')
             raise InvalidReceipt('NO_USER')
 
+    def get_addon_id(self):
         try:
             storedata = self.decoded['product']['storedata']
-            self.addon_id = int(dict(parse_qsl(storedata)).get('id', ''))
+            return int(dict(parse_qsl(storedata)).get('id', ''))
         except:
             # There was some value for storedata but it was invalid.
             log_info('Invalid store data')
             raise InvalidReceipt('WRONG_STOREDATA')
 
+    def get_install(self, uuid):
         sql = """SELECT id, user_id, premium_type FROM users_install
                  WHERE addon_id = %(addon_id)s
                  AND uuid = %(uuid)s LIMIT 1;"""
         self.cursor.execute(sql, {'addon_id': self.addon_id,
                                   'uuid': uuid})
-        result = self.cursor.fetchone()
-        if not result:
-            # We've got no record of this receipt being created.
-            log_info('No entry in users_install for uuid: %s' % uuid)
-            raise InvalidReceipt('WRONG_USER')
+        return self.cursor.fetchone()
 
-        pk, self.user_id, self.premium = result
-
-    def check_purchase(self):
-        """
-        Verifies that the app has been purchased.
-        """
+    def get_purchase(self):
         sql = """SELECT id, type FROM addon_purchase
                  WHERE addon_id = %(addon_id)s
                  AND user_id = %(user_id)s LIMIT 1;"""
         self.cursor.execute(sql, {'addon_id': self.addon_id,
                                   'user_id': self.user_id})
-        result = self.cursor.fetchone()
+        return self.cursor.fetchone()
+
+    def check_purchase(self):
+        """
+        Verifies that the app has been purchased.
+        """
+        result = self.get_purchase()
         if not result:
             log_info('Invalid receipt, no purchase')
             raise InvalidReceipt('NO_PURCHASE')
@@ -289,6 +397,141 @@ class Verify:
         return json.dumps({'status': 'expired'})
 
 
+class BatchItemVerify(Verify):
+    """
+    One receipt of a `BatchVerify`. It's decoded up front and its db rows
+    are looked up for the whole batch, the rest is `Verify.check_full`.
+    """
+
+    def __init__(self, receipt, environ):
+        Verify.__init__(self, receipt, environ)
+        self.cached = None
+        self.error = None
+        self.uuid = None
+        self.installs = {}
+        self.purchases = {}
+        self.tokens = {}
+
+    def prepare(self):
+        """The part of the checks which needs neither the db nor peers."""
+        if settings.WEBAPPS_RECEIPT_VERIFY_CACHE:
+            self.cached = Verify.get_cached(self)
+            if self.cached:
+                return
+        try:
+            self.decoded = Verify.decode(self)
+        except InvalidReceipt, err:
+            self.error = err
+            return
+        try:
+            self.uuid = self.get_uuid()
+            self.addon_id = self.get_addon_id()
+        except InvalidReceipt:
+            # Raised again by `check_db`, once it's this check's turn.
+            pass
+
+    def get_cached(self):
+        return self.cached
+
+    def decode(self):
+        if self.error:
+            raise self.error
+        return self.decoded
+
+    def setup_db(self):
+        pass
+
+    def get_purchase_token(self):
+        return self.tokens.get(self.purchase_key())
+
+    def get_install(self, uuid):
+        row = self.installs.get((self.addon_id, uuid))
+        return row[:3] if row else None
+
+    def get_purchase(self):
+        return self.purchases.get((self.addon_id, self.user_id))
+
+    def check_url(self, domain):
+        # The batch isn't posted to the receipt's own verify URL, so only
+        # the domain can be checked.
+        parsed = urlparse(self.decoded.get('verify', ''))
+        if parsed.netloc != domain:
+            log_info('Receipt had invalid domain')
+            raise InvalidReceipt('WRONG_DOMAIN')
+
+
+class BatchVerify:
+    """
+    Verifies many purchase receipts at once: they are decoded in a pool of
+    threads and their installs and purchases looked up with one query
+    each. Every result is what `Verify.check_full` would have returned.
+    """
+
+    def __init__(self, receipt_list, environ):
+        self.items = [BatchItemVerify(receipt, environ)
+                      for receipt in receipt_list]
+        # This is so the unit tests can override the connection.
+        self.conn, self.cursor = None, None
+
+    def setup_db(self):
+        if not self.cursor:
+            self.conn = mypool.connect()
+            self.cursor = self.conn.cursor()
+
+    def check_full(self):
+        get_decode_pool().map(BatchItemVerify.prepare, self.items)
+        pending = [item for item in self.items
+                   if not item.cached and item.uuid and item.addon_id]
+        if pending:
+            if settings.WEBAPPS_RECEIPT_VERIFY_CACHE:
+                # Read before the db, as `Verify.check_full` does.
+                tokens = cache.get_many([item.purchase_key()
+                                         for item in pending])
+                for item in pending:
+                    item.tokens = tokens
+            self.setup_db()
+            installs = self.get_installs(pending)
+            purchases = self.get_purchases(installs.values())
+            for item in pending:
+                item.installs, item.purchases = installs, purchases
+        return [json.loads(item.check_full()) for item in self.items]
+
+    def get_installs(self, items):
+        sql = """SELECT id, user_id, premium_type, addon_id, uuid
+                 FROM users_install WHERE uuid IN %(uuids)s;"""
+        self.cursor.execute(sql, {'uuids': tuple(set(i.uuid for i in items))})
+        return dict(((row[3], row[4]), row) for row in self.cursor.fetchall())
+
+    def get_purchases(self, installs):
+        if not installs:
+            return {}
+        sql = """SELECT id, type, addon_id, user_id FROM addon_purchase
+                 WHERE user_id IN %(users)s
+                 AND addon_id IN %(addons)s;"""
+        self.cursor.execute(sql, {
+            'users': tuple(set(row[1] for row in installs)),
+            'addons': tuple(set(row[3] for row in installs))})
+        return dict(((addon_id, user_id), (pk, type_))
+                    for pk, type_, addon_id, user_id
+                    in self.cursor.fetchall())
+
+    def close(self):
+        if self.cursor:
+            self.cursor.close()
+        if self.conn:
+            self.conn.close()
+
+
+_decode_pool = None
+
+
+def get_decode_pool():
+    global _decode_pool
+    if _decode_pool is None:
+        _decode_pool = ThreadPool(settings.WEBAPPS_RECEIPT_VERIFY_POOL_SIZE)
+    return _decode_pool
+
+
 def get_headers(length):
     return [('Access-Control-Allow-Origin', '*'),
             ('Access-Control-Allow-Methods', 'POST'),
@@ -352,11 +595,40 @@ def receipt_check(environ):
     return output
 
 
+def batch_receipt_check(environ):
+    with statsd.timer('services.verify.batch'):
+        data = environ['wsgi.input'].read()
+        try:
+            receipt_list = json.loads(data)['receipts']
+        except (KeyError, TypeError, ValueError):
+            return 400, ''
+        if (not isinstance(receipt_list, list) or
+                len(receipt_list) > MAX_BATCH_SIZE or
+                not all(isinstance(r, basestring) for r in receipt_list)):
+            return 400, ''
+
+        statsd.incr('services.verify.batch.receipts', len(receipt_list))
+        verify = BatchVerify([r.encode('utf-8') for r in receipt_list],
+                             environ)
+        try:
+            return 200, json.dumps({'receipts': verify.check_full()})
+        except:
+            log_exception('<batch>')
+            return 500, ''
+        finally:
+            verify.close()
+
+
 def application(environ, start_response):
     body = ''
     path = environ.get('PATH_INFO', '')
     if path == '/services/status/':
         status, body = status_check(environ)
+    elif path == BATCH_PATH:
+        if environ.get('REQUEST_METHOD') != 'POST':
+            status = 405
+        else:
+            status, body = batch_receipt_check(environ)
     else:
         # Only allow POST through as per spec.
         if environ.get('REQUEST_METHOD') != 'POST':
@@ -134,9 +134,14 @@ SQL_RESET_SEQUENCES = False
 GEOIP_URL = ''
 GEOIP_DEFAULT_VAL = 'restofworld'
 GEOIP_DEFAULT_TIMEOUT = .2
+GEOIP_DB_PATH = ''
 
 ES_DEFAULT_NUM_REPLICAS = 0
 ES_DEFAULT_NUM_SHARDS = 3
+ES_SEARCH_CACHE_TIMEOUT = 0
+
+WEBAPPS_RECEIPT_SIGNED_CACHE_TTL = 0
+API_ANONYMOUS_CACHE_TIMEOUT = 0
 
 IARC_MOCK = True
 